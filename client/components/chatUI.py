@@ -1,5 +1,5 @@
 import streamlit as st
-from utils.api import ask_question, get_available_models
+from utils.api import ask_question_stream, iter_sse_events, get_available_models, get_documents
 
 
 def render_chat():
@@ -59,6 +59,23 @@ def render_chat():
             st.session_state.selected_model = None
             st.session_state.temperature = 0.1
 
+        # Limit questions to some of the workspace's documents
+        workspace = st.session_state.get("workspace") or None
+        document_names = []
+        try:
+            documents_response = get_documents(workspace)
+            if documents_response.status_code == 200:
+                document_names = [doc["source"] for doc in documents_response.json().get("documents", [])]
+            else:
+                st.warning("Could not load the workspace's documents from the server.")
+        except Exception as e:
+            st.warning(f"Could not load the workspace's documents from the server: {e}")
+        selected_sources = st.multiselect(
+            "Search only in:",
+            options=document_names,
+            help="Leave empty to search every document in the workspace"
+        )
+
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
@@ -83,32 +100,45 @@ def render_chat():
 
         with st.chat_message("assistant"):
             with st.spinner(f"🤖 Thinking with {spinner_model_name}..."):
-                response = ask_question(user_input, model_name=model_to_request, temperature=temp_to_request)
+                response = ask_question_stream(
+                    user_input, model_name=model_to_request, temperature=temp_to_request,
+                    workspace=workspace, sources=selected_sources
+                )
             
             if response.status_code == 200:
-                data = response.json()
-                answer = data.get("answer", "Sorry, I couldn't find an answer.")
-                sources = data.get("source_documents", [])  # This now contains source filenames as strings
-                actual_model_used = data.get("actual_model_used", "N/A")
-                requested_model = data.get("requested_model", "N/A")
-                status_message = data.get("status_message")
+                status_placeholder = st.empty()
+                answer_placeholder = st.empty()
+                sources = []
+                answer = ""
+                error_msg = None
                 
-                # Display status message from server (e.g., fallback notification)
-                if status_message:
-                    st.info(status_message) # Use st.info, st.warning, or st.success as appropriate
+                # Sources arrive first, then the answer token by token
+                for event, data in iter_sse_events(response):
+                    if event == "sources":
+                        sources = data.get("sources", [])
+                    elif event == "token":
+                        answer += data.get("text", "")
+                        answer_placeholder.markdown(answer + "▌")
+                    elif event == "done":
+                        status_message = data.get("status_message")
+                        # Display status message from server (e.g., fallback notification)
+                        if status_message:
+                            status_placeholder.info(status_message)
+                    elif event == "error":
+                        error_msg = data.get("error", "The answer stream was interrupted.")
                 
-                st.markdown(answer)
+                if not answer and not error_msg:
+                    answer = "Sorry, I couldn't find an answer."
+                answer_placeholder.markdown(answer)
+                if error_msg:
+                    st.error(f"⚠️ Error: {error_msg}")
                 if sources:
                     st.markdown("--- ")
                     st.markdown("📄 **Sources:**")
-                    for source_file in sources:
-                        # sources is now a list of filename strings
+                    for source_file in dict.fromkeys(sources):
                         st.markdown(f"- `{source_file}`")
-                
-                # Optionally, add model info to the message for clarity, if desired
-                # st.caption(f"Answered using: {actual_model_used} (Requested: {requested_model})")
 
-                st.session_state.messages.append({"role": "assistant", "content": answer})
+                st.session_state.messages.append({"role": "assistant", "content": answer if not error_msg else f"{answer}\n\nError: {error_msg}"})
             
             elif response.status_code == 503: # Handle "All models unavailable"
                 data = response.json()
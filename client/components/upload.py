@@ -1,8 +1,51 @@
 import streamlit as st
 import json
-from utils.api import upload_pdfs_api
+import time
+from utils.api import upload_pdfs_api, get_job_status
+
+STAGE_LABELS = {
+    "queued": "⏳ Queued",
+    "saving": "💾 Saving",
+    "extracting": "📖 Extracting text",
+    "ocr": "🔍 OCR page",
+    "splitting": "✂️ Splitting",
+    "embedding": "🧠 Embedding batch",
+    "done": "✅ Done",
+    "failed": "❌ Failed",
+}
+
+
+def describe_file_stage(filename, info):
+    label = STAGE_LABELS.get(info.get("stage"), info.get("stage"))
+    if info.get("total"):
+        label = f"{label} {info.get('current', 0)}/{info['total']}"
+    return f"{filename}: {label}"
+
+
+def poll_job(job_id, progress_bar, status_text, poll_interval=1.0):
+    """Poll an ingestion job until it finishes, rendering its real progress."""
+    while True:
+        response = get_job_status(job_id)
+        if response.status_code != 200:
+            return None
+
+        job = response.json()
+        progress_bar.progress(min(int(job.get("progress", 0) * 100), 100))
+        status_text.text("\n".join(
+            describe_file_stage(name, info) for name, info in job.get("files", {}).items()
+        ))
+
+        if job.get("status") in ("done", "failed"):
+            return job
+        time.sleep(poll_interval)
 
 def render_uploader():
+    st.sidebar.text_input(
+        "🗂️ Workspace",
+        key="workspace",
+        placeholder="default",
+        help="Documents are uploaded to and searched in this workspace only"
+    )
     st.sidebar.header("📄 Upload PDFs")
     uploaded_files = st.sidebar.file_uploader(
         "Upload multiple PDFs", 
@@ -16,6 +59,12 @@ def render_uploader():
         for file in uploaded_files:
             st.sidebar.write(f"• {file.name}")
     
+    upload_tags = st.sidebar.text_input(
+        "Tags (optional)",
+        placeholder="e.g. finance, q3",
+        help="Comma-separated tags, so questions can be limited to tagged documents"
+    )
+    
     if st.sidebar.button("🚀 Upload to DB", disabled=not uploaded_files):
         if uploaded_files:
             with st.sidebar:
@@ -25,26 +74,31 @@ def render_uploader():
                 
                 try:
                     status_text.text("📤 Uploading files...")
-                    progress_bar.progress(25)
                     
-                    response = upload_pdfs_api(uploaded_files)
-                    progress_bar.progress(50)
+                    response = upload_pdfs_api(
+                        uploaded_files,
+                        workspace=st.session_state.get("workspace") or None,
+                        tags=upload_tags or None
+                    )
                     
-                    status_text.text("🔄 Processing documents...")
-                    progress_bar.progress(75)
-                    
-                    if response.status_code == 200:
-                        progress_bar.progress(100)
-                        status_text.text("✅ Upload complete!")
+                    if response.status_code in (200, 202):
+                        result = response.json()
+                        job = poll_job(result["job_id"], progress_bar, status_text)
                         
-                        # Parse and display success message
-                        try:
-                            result = response.json()
-                            st.success(f"✅ {result.get('message', 'Files uploaded successfully')}")
+                        if job is None:
+                            st.error("❌ Lost track of the processing job. Please check the server logs.")
+                        elif job.get("status") == "done":
+                            progress_bar.progress(100)
+                            st.success("✅ Files uploaded and processed successfully!")
                             if 'files_processed' in result:
                                 st.info(f"📋 Processed files: {', '.join(result['files_processed'])}")
-                        except:
-                            st.success("✅ Files uploaded and processed successfully!")
+                        else:
+                            progress_bar.empty()
+                            st.error(f"❌ {job.get('error', 'Processing failed')}")
+                            if 'message' in job:
+                                st.warning(job['message'])
+                            if 'suggestion' in job:
+                                st.info(f"💡 Suggestion: {job['suggestion']}")
                     
                     elif response.status_code == 429:
                         progress_bar.empty()
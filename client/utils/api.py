@@ -1,20 +1,108 @@
+import json
+import uuid
 import requests
 from config import API_URL
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-def upload_pdfs_api(files):
-    files_payload = [("files", (f.name, f.read(), "application/pdf")) for f in files]
-    return requests.post(f"{API_URL}/upload_pdfs/", files=files_payload)
 
+def _stream_multipart(files, boundary, fields=None, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Yield a multipart/form-data body for the files (and any plain form fields) without reading any file whole."""
+    for name, value in (fields or {}).items():
+        yield (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n"
+        ).encode("utf-8")
+    for f in files:
+        f.seek(0)
+        filename = f.name.replace('"', '%22')
+        yield (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            "Content-Type: application/pdf\r\n\r\n"
+        ).encode("utf-8")
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode("utf-8")
 
-def ask_question(question, model_name=None, temperature=0.1):
-    """Ask a question with optional model and temperature selection."""
-    data = {"question": question, "temperature": temperature}
+
+def _scope_fields(workspace=None, sources=None, tags=None):
+    """Form fields selecting a workspace and limiting a question to some documents or tags."""
+    fields = {}
+    if workspace:
+        fields["workspace"] = workspace
+    if sources:
+        fields["sources"] = ",".join(sources)
+    if tags:
+        fields["tags"] = tags if isinstance(tags, str) else ",".join(tags)
+    return fields
+
+
+def upload_pdfs_api(files, workspace=None, tags=None):
+    """Upload PDFs as a chunked multipart stream into a workspace, optionally tagging them."""
+    boundary = uuid.uuid4().hex
+    return requests.post(
+        f"{API_URL}/upload_pdfs/",
+        data=_stream_multipart(files, boundary, fields=_scope_fields(workspace=workspace, tags=tags)),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+
+
+def get_job_status(job_id):
+    """Get the progress of a background ingestion job."""
+    return requests.get(f"{API_URL}/jobs/{job_id}")
+
+
+def get_documents(workspace=None):
+    """List the documents indexed in a workspace."""
+    params = {"workspace": workspace} if workspace else None
+    return requests.get(f"{API_URL}/documents", params=params)
+
+
+def ask_question(question, model_name=None, temperature=0.1, workspace=None, sources=None, tags=None):
+    """Ask a question with optional model and temperature selection, limited to a workspace and documents."""
+    data = {"question": question, "temperature": temperature, **_scope_fields(workspace, sources, tags)}
     if model_name:
         data["model_name"] = model_name
     return requests.post(f"{API_URL}/ask/", data=data)
 
 
+def ask_question_stream(question, model_name=None, temperature=0.1, workspace=None, sources=None, tags=None):
+    """Ask a question on the streaming endpoint; returns the open response (check status_code first)."""
+    data = {"question": question, "temperature": temperature, **_scope_fields(workspace, sources, tags)}
+    if model_name:
+        data["model_name"] = model_name
+    return requests.post(f"{API_URL}/ask/stream", data=data, stream=True)
+
+
+def ask_questions_batch(questions, workspace=None, sources=None, tags=None, concurrency=None):
+    """Ask many questions at once; each item is {"question", "model_name"?, "temperature"?}."""
+    body = {"questions": questions, **_scope_fields(workspace, sources, tags)}
+    if concurrency:
+        body["concurrency"] = concurrency
+    return requests.post(f"{API_URL}/ask/batch", json=body)
+
+
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a Server-Sent Events response as they arrive."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line:
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+            continue
+        if data_lines:
+            yield event, json.loads("\n".join(data_lines))
+        event, data_lines = "message", []
+
+
 def get_available_models():
     """Get available Gemini models from the server."""
     try:
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark /ask/ throughput on a single event loop: the old handler, which called
+chain.invoke() synchronously inside an async endpoint, versus the path /ask/ uses
+now (aquery_with_fallback: async retrieval, then ainvoke on the answer chain).
+
+Uses a local stub LLM that sleeps for a fixed generation time and a deterministic
+fake embedding function, so no API key or network is needed. The sleep stands in
+for waiting on Gemini; a blocking handler holds the whole worker for it.
+
+Run from the server directory:
+    python benchmarks/bench_async_concurrency.py --clients 1 10 50 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from typing import Any, List, Optional
+
+sys.path.append('.')
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.llms import LLM
+from modules import query_handlers
+from modules.llm import build_chain
+from modules.query_handlers import query_chain, aquery_with_fallback
+
+EMBEDDING_SIZE = 768
+COLLECTION = "bench"
+
+
+class SleepingLLM(LLM):
+    """Stub LLM that takes a fixed time to answer, blocking in invoke and yielding in ainvoke."""
+
+    latency: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "sleeping-stub"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        time.sleep(self.latency)
+        return "stub answer"
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        await asyncio.sleep(self.latency)
+        return "stub answer"
+
+
+def populate(persist_dir: str, num_docs: int) -> Chroma:
+    store = Chroma(
+        collection_name=COLLECTION,
+        persist_directory=persist_dir,
+        embedding_function=DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    )
+    docs = [
+        Document(page_content=f"Section {i}: clause {i % 97} of manual {i % 13}", metadata={"source": f"doc{i % 13}.pdf"})
+        for i in range(num_docs)
+    ]
+    for start in range(0, len(docs), 1000):
+        store.add_documents(docs[start:start + 1000])
+    return store
+
+
+async def blocking_handler(chain, question: str):
+    return query_chain(chain, question)
+
+
+async def async_handler(chain, question: str):
+    response, _ = await aquery_with_fallback(chain.retriever.vectorstore, question)
+    return response
+
+
+async def run_clients(handler, chain, clients: int, requests_per_client: int) -> float:
+    """Run concurrent clients that each send their requests back to back; return requests per second."""
+
+    async def client(client_id: int):
+        for i in range(requests_per_client):
+            await handler(chain, f"What does clause {(client_id + i) % 97} say?")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000, help="Chunks in the synthetic collection")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50], help="Concurrent client counts")
+    parser.add_argument("--requests", type=int, default=4, help="Requests sent by each client")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stub LLM takes per answer")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        print(f"📚 Populating {args.docs} synthetic chunks...")
+        vectorstore = populate(persist_dir, args.docs)
+        chain = build_chain(SleepingLLM(latency=args.latency), vectorstore)
+        # Every model answers with the stub chain
+        query_handlers.chain_registry.get_chain = lambda vectorstore, model_name, temperature: chain
+
+        print(f"\n⏱️ Stub generation latency {args.latency * 1000:.0f} ms, {args.requests} requests per client")
+        print(f"{'Clients':>8} {'Blocking (before)':>20} {'Async (after)':>16} {'Speedup':>9}")
+        for clients in args.clients:
+            before = asyncio.run(run_clients(blocking_handler, chain, clients, args.requests))
+            after = asyncio.run(run_clients(async_handler, chain, clients, args.requests))
+            print(f"{clients:>8} {before:>14.1f} req/s {after:>10.1f} req/s {after / before:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
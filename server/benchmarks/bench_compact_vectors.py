@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Recall@k vs. memory vs. latency report for compact vector storage (VECTOR_STORAGE,
+VECTOR_DIMENSIONS, VECTOR_RESCORE_FACTOR).
+
+Builds a synthetic corpus of clustered embeddings whose variance decays across
+dimensions, like real text embeddings where the leading dimensions carry most of
+the signal, and queries it with perturbed corpus vectors. Ground truth is an exact
+float32 cosine search; "memory" is the in-memory scan arrays, to compare with
+float32 vectors (what Chroma's HNSW index holds, before its graph links).
+
+Run from the server directory (needs only numpy):
+    python benchmarks/bench_compact_vectors.py --docs 50000 --queries 200 --k 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append('.')
+
+from modules.compact_vectors import CompactVectorIndex
+
+EMBEDDING_SIZE = 768
+CONFIGS = [
+    # (mode, dimensions, rescore factor; 0 means no rescoring)
+    ("float16", 0, 0),
+    ("float16", 0, 4),
+    ("int8", 0, 0),
+    ("int8", 0, 4),
+    ("int8", 384, 0),
+    ("int8", 384, 4),
+    ("int8", 256, 4),
+    ("int8", 256, 10),
+    ("int8", 128, 4),
+    ("int8", 128, 10),
+]
+
+
+def synthetic_corpus(num_docs: int, num_queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    spectrum = np.arange(1, EMBEDDING_SIZE + 1, dtype=np.float32) ** -0.3
+    centers = rng.standard_normal((max(num_docs // 50, 1), EMBEDDING_SIZE), dtype=np.float32) * spectrum
+    docs = centers[rng.integers(0, len(centers), num_docs)]
+    docs += rng.standard_normal((num_docs, EMBEDDING_SIZE), dtype=np.float32) * spectrum
+    queries = docs[rng.integers(0, num_docs, num_queries)]
+    queries = queries + rng.standard_normal(queries.shape, dtype=np.float32) * spectrum
+    return docs, queries
+
+
+def exact_top_k(docs: np.ndarray, queries: np.ndarray, k: int):
+    normalized = docs / np.linalg.norm(docs, axis=1, keepdims=True)
+    truth, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        scores = normalized @ (query / np.linalg.norm(query))
+        top = np.argpartition(-scores, k - 1)[:k]
+        latencies.append(time.perf_counter() - start)
+        truth.append({str(i) for i in top})
+    return truth, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=50000, help="Vectors in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to measure")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    args = parser.parse_args()
+
+    print(f"📚 Generating {args.docs} synthetic {EMBEDDING_SIZE}-d vectors...")
+    docs, queries = synthetic_corpus(args.docs, args.queries)
+    ids = [str(i) for i in range(args.docs)]
+    truth, exact_latencies = exact_top_k(docs, queries, args.k)
+    float32_mb = docs.nbytes / 2 ** 20
+
+    print(f"\n{'Storage':<10} {'Dims':>5} {'Rescore':>8} {'Recall@' + str(args.k):>9} {'Memory MB':>10} "
+          f"{'vs f32':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    print(f"{'float32':<10} {EMBEDDING_SIZE:>5} {'-':>8} {1.0:>9.3f} {float32_mb:>10.1f} {1.0:>6.2f}x "
+          f"{statistics.median(exact_latencies) * 1000:>7.2f} {np.percentile(exact_latencies, 95) * 1000:>7.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, dimensions, rescore_factor in CONFIGS:
+            path = os.path.join(directory, f"{mode}_{dimensions}_{rescore_factor}.sqlite3")
+            index = CompactVectorIndex(path, mode=mode, dimensions=dimensions, rescore_factor=max(rescore_factor, 1))
+            for start in range(0, args.docs, 5000):
+                index.add(ids[start:start + 5000], docs[start:start + 5000])
+            memory_mb = index.memory_bytes() / 2 ** 20
+
+            hits, latencies = 0, []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                results = index.search(query, k=args.k, rescore=rescore_factor > 0)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {doc_id for doc_id, _ in results})
+            recall = hits / (args.k * len(queries))
+            print(f"{mode:<10} {dimensions or EMBEDDING_SIZE:>5} {(f'{rescore_factor}x' if rescore_factor else 'no'):>8} "
+                  f"{recall:>9.3f} {memory_mb:>10.1f} {memory_mb / float32_mb:>6.2f}x "
+                  f"{statistics.median(latencies) * 1000:>7.2f} {np.percentile(latencies, 95) * 1000:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
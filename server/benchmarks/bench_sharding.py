@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark sharded collections (VECTOR_SHARDS): ingest throughput with one writer
+per shard, and fan-out query latency, as the shard count grows.
+
+Vectors come from a deterministic fake embedding function, so no API key or
+network is needed; ingest time is Chroma's write and HNSW insert cost only
+(the commit step of an upload), and queries embed once and search every shard
+concurrently, as /ask/ does.
+
+Run from the server directory:
+    python benchmarks/bench_sharding.py --docs 20000 --shards 1 2 4 8
+"""
+
+import argparse
+import hashlib
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append('.')
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from modules.shards import ShardedChroma
+
+EMBEDDING_SIZE = 768
+COLLECTION = "bench"
+FILES = 64  # Synthetic source files; chunks of one file share a shard
+WRITE_BATCH = 500
+
+
+def synthetic_chunks(num_docs: int, embedding: DeterministicFakeEmbedding):
+    texts = [f"Section {i}: clause {i % 97} of manual {i % 13}" for i in range(num_docs)]
+    file_hashes = [hashlib.sha256(f"file-{i}".encode()).hexdigest() for i in range(FILES)]
+    ids = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+    metadatas = [{"source": f"doc{i % FILES}.pdf", "file_hash": file_hashes[i % FILES]} for i in range(num_docs)]
+    return ids, embedding.embed_documents(texts), texts, metadatas
+
+
+def ingest(store: ShardedChroma, ids, vectors, texts, metadatas) -> float:
+    """Write every chunk with one writer thread per shard; return chunks per second."""
+    by_shard = {}
+    for position, metadata in enumerate(metadatas):
+        by_shard.setdefault(store.shard_of(metadata["file_hash"]), []).append(position)
+
+    def write(positions):
+        for start in range(0, len(positions), WRITE_BATCH):
+            batch = positions[start:start + WRITE_BATCH]
+            store._collection.upsert(
+                ids=[ids[i] for i in batch],
+                embeddings=[vectors[i] for i in batch],
+                documents=[texts[i] for i in batch],
+                metadatas=[metadatas[i] for i in batch]
+            )
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(by_shard)) as pool:
+        list(pool.map(write, by_shard.values()))
+    return len(ids) / (time.perf_counter() - start)
+
+
+def query_latencies(store: ShardedChroma, queries: int, k: int):
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        store.similarity_search(f"What does clause {i % 97} of manual {i % 13} say?", k=k)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000, help="Chunks in the synthetic collection")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="Shard counts to compare")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time")
+    parser.add_argument("--k", type=int, default=20, help="Results per query")
+    args = parser.parse_args()
+
+    embedding = DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    print(f"📚 Generating {args.docs} synthetic chunks...")
+    chunks = synthetic_chunks(args.docs, embedding)
+
+    print(f"\n{'Shards':>7} {'Ingest chunks/s':>16} {'Query p50 ms':>13} {'Query p95 ms':>13}")
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory() as persist_dir:
+            store = ShardedChroma(COLLECTION, persist_dir, embedding, shard_count=shards)
+            throughput = ingest(store, *chunks)
+            query_latencies(store, 10, args.k)  # Warm up
+            latencies = query_latencies(store, args.queries, args.k)
+            p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+            print(f"{shards:>7} {throughput:>16.0f} {statistics.median(latencies) * 1000:>13.2f} {p95 * 1000:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request vectorstore setup cost: reopening Chroma on every /ask/ (old
+behaviour) versus the shared handle opened once at startup.
+
+Uses a local deterministic fake embedding function, so no API key or network is
+needed and the numbers only reflect setup and retrieval. Real requests also paid
+for constructing a GoogleGenerativeAIEmbeddings client on top of this.
+
+Run from the server directory:
+    python benchmarks/bench_vectorstore_setup.py --docs 2000 --requests 200
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from modules.vectorstore import SharedVectorStore
+
+EMBEDDING_SIZE = 768
+COLLECTION = "bench"
+
+
+class FakeSharedVectorStore(SharedVectorStore):
+    """SharedVectorStore that opens the collection with the fake embedding function."""
+
+    def _open(self) -> Chroma:
+        return Chroma(
+            collection_name=self.collection_name,
+            persist_directory=self.persist_directory,
+            embedding_function=DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+        )
+
+
+def populate(persist_dir: str, num_docs: int):
+    store = Chroma(
+        collection_name=COLLECTION,
+        persist_directory=persist_dir,
+        embedding_function=DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    )
+    docs = [
+        Document(page_content=f"Section {i}: clause {i % 97} of manual {i % 13}", metadata={"source": f"doc{i % 13}.pdf"})
+        for i in range(num_docs)
+    ]
+    for start in range(0, len(docs), 1000):
+        store.add_documents(docs[start:start + 1000])
+
+
+def per_request_open(persist_dir: str, question: str):
+    vectorstore = Chroma(
+        collection_name=COLLECTION,
+        persist_directory=persist_dir,
+        embedding_function=DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    )
+    return vectorstore.similarity_search(question, k=5)
+
+
+def summarize(label: str, timings):
+    timings_ms = sorted(t * 1000 for t in timings)
+    p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(timings_ms):8.2f} ms   p50 {statistics.median(timings_ms):8.2f} ms   p95 {p95:8.2f} ms")
+    return statistics.mean(timings_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000, help="Chunks in the synthetic collection")
+    parser.add_argument("--requests", type=int, default=200, help="Simulated /ask/ requests per mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        print(f"📚 Populating {args.docs} synthetic chunks...")
+        populate(persist_dir, args.docs)
+        questions = [f"What does clause {i % 97} say?" for i in range(args.requests)]
+
+        before = []
+        for question in questions:
+            start = time.perf_counter()
+            per_request_open(persist_dir, question)
+            before.append(time.perf_counter() - start)
+
+        shared = FakeSharedVectorStore(collection_name=COLLECTION, persist_directory=persist_dir)
+        shared.get()  # Opened once, as the lifespan hook does at startup
+        after = []
+        for question in questions:
+            start = time.perf_counter()
+            shared.get().similarity_search(question, k=5)
+            after.append(time.perf_counter() - start)
+
+        print(f"\n⏱️ {args.requests} requests against {args.docs} chunks")
+        before_mean = summarize("Reopen per request (before)", before)
+        after_mean = summarize("Shared handle (after)", after)
+        print(f"\nPer-request setup overhead removed: {before_mean - after_mean:.2f} ms ({before_mean / after_mean:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
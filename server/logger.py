@@ -1,27 +1,146 @@
+import os
+import copy
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()  # "json" or "text"
+# Longer messages and string fields are cut to this many characters (0 keeps everything)
+LOG_MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", "500"))
+# Records waiting for the writer thread; when full, new records are dropped instead of blocking the request
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# Set per HTTP request (or ingestion job) and attached to every record logged while handling it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Stage timings of the current request, filled by modules.metrics.observe_stage
+request_stages_var: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage's duration to the current request's timings (no-op outside a request)."""
+    stages = request_stages_var.get()
+    if stages is not None:
+        stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 2)
+
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> Any:
+    if isinstance(value, str) and limit and len(value) > limit:
+        return f"{value[:limit]}… [{len(value) - limit} more chars]"
+    return value
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request ID while still on the caller's thread, before they are queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request ID, message and any extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "message": truncate(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = truncate(value)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        record.message_text = truncate(record.getMessage())
+        record.request_tag = f" [{record.request_id}]" if getattr(record, "request_id", None) else ""
+        return super().format(record)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops records when the queue is full rather than blocking or raising.
+
+    Dropped records are counted in `dropped`, exported as rag_log_records_dropped_total on /metrics.
+    """
+
+    dropped = 0
+    _dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now (arguments may change once the caller moves on),
+        # but keep the traceback apart from the message so truncation never cuts it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with DroppingQueueHandler._dropped_lock:
+                DroppingQueueHandler.dropped += 1
+
+
+_traceback_formatter = logging.Formatter()
+_listener: Optional[logging.handlers.QueueListener] = None
 
 
 def setup_logger(name="ragbot"):
+    """
+    Configure the app logger to hand records to a queue; a background thread formats and writes them.
 
-    logger=logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+    Request handlers only pay for enqueueing a record, never for stdout I/O.
+    """
+    global _listener
 
-    # Console handler
-    ch=logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
 
-    # formatter
+    if not logger.handlers:
+        stream = logging.StreamHandler()
+        if LOG_FORMAT == "text":
+            stream.setFormatter(TextFormatter("[%(asctime)s] [%(levelname)s]%(request_tag)s -  %(message_text)s"))
+        else:
+            stream.setFormatter(JsonFormatter())
 
-    formatter=logging.Formatter("[%(asctime)s] [%(levelname)s] -  %(message)s ")
-    ch.setFormatter(formatter)
+        handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        handler.addFilter(RequestContextFilter())
+        logger.addHandler(handler)
 
-    if not logger.hasHandlers():
-        logger.addHandler(ch)
+        _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
 
     return logger
 
 
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
-
-logger=setup_logger()
\ No newline at end of file
+logger = setup_logger()
@@ -1,17 +1,57 @@
-from fastapi import FastAPI, UploadFile, File, Form, Request, HTTPException
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, Request, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from modules.load_vectorstore import load_vectorstore, PERSIST_DIR # Import PERSIST_DIR
-from modules.llm import get_llm_chain, get_available_models
-from modules.query_handlers import query_chain
-from logger import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+import json
 import os
-from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import time
+import uuid
+from modules.load_vectorstore import UploadTooLargeError, get_pinned_embedding_model, COLLECTION_NAME
+from modules.embeddings import embedding_registry
+from modules.jobs import create_job, submit_job, get_job, shutdown_workers
+from modules.upload_stream import receive_uploads, UploadFormError
+from modules.vectorstore import vectorstore_pool, workspace_exists
+from modules.documents import open_metadata_store, list_documents, delete_document, find_stored_upload, find_document_tags
+from modules.workspaces import collection_for_workspace, parse_tags, DocumentScope, InvalidWorkspaceError
+from modules.llm import first_available_model, get_available_models, chain_registry, model_breakers
+from modules.query_handlers import aquery_with_fallback, astream_with_fallback, ModelsUnavailableError
+from modules.answer_cache import answer_cache
+from modules.metrics import REQUEST_SECONDS, REQUESTS_IN_FLIGHT, render_metrics, stage_timer
+from modules.lexical_index import identifier_terms
+from modules.single_flight import answer_flights, answer_key
+from modules.snapshots import SNAPSHOT_DIR, export_snapshot, import_startup_snapshots
+from modules.batch import BatchItem, answer_batch, BATCH_CONCURRENCY, BATCH_MAX_QUESTIONS
+from logger import logger, request_id_var, request_stages_var, stop_logging
 
-app = FastAPI(title="RagBot")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A new replica loads its vectors from snapshot files instead of re-embedding every PDF
+    try:
+        imported = await run_in_threadpool(import_startup_snapshots)
+        for summary in imported:
+            logger.info(f"Imported snapshot {summary['path']} ({summary['records']} vectors) into {summary['collection']}")
+    except Exception:
+        logger.exception("Could not import startup snapshots")
+    # Open the default workspace's vectorstore and embedding client once; requests share them
+    try:
+        await run_in_threadpool(vectorstore_pool.get)
+        logger.info("Vectorstore opened at startup")
+    except Exception:
+        logger.exception("Could not open the vectorstore at startup, it will be opened on first use")
+    yield
+    shutdown_workers()
+    chain_registry.clear()
+    answer_cache.clear()
+    vectorstore_pool.close()
+    stop_logging()
+
+
+app = FastAPI(title="RagBot", lifespan=lifespan)
 
 # allow frontend
 app.add_middleware(
@@ -33,81 +73,255 @@ async def catch_exception_middleware(request:Request,call_next):
         logger.exception("UNHANDLED EXCEPTION IN MIDDLEWARE")
         return JSONResponse(status_code=500,content={"error":f"An internal server error occurred: {str(exc)}"})
 
-@app.post("/upload_pdfs/")
-async def upload_pdfs(files:List[UploadFile]=File(...)):
+def unknown_workspace(workspace: Optional[str]) -> JSONResponse:
+    """404 for a valid workspace ID with no collection; read paths never create one."""
+    return JSONResponse(status_code=404, content={"error": f"Unknown workspace: {workspace}"})
+
+
+def route_template(request: Request) -> str:
+    """The matched route's path template, so /documents/{source} is one series rather than one per document."""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    # Streaming responses are timed until their headers are sent; their generation time is a stage of its own
+    route = route_template(request)
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    stages = {}
+    request_stages_var.set(stages)
+    started = time.perf_counter()
+    status = 500
+    with REQUESTS_IN_FLIGHT.track(route=route):
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = request_id
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.observe(elapsed, route=route, status=str(status))
+            if route != "/metrics":
+                logger.info("request", extra={
+                    "method": request.method, "route": route, "status": status,
+                    "duration_ms": round(elapsed * 1000, 2), "stages": stages
+                })
+
+def upload_target(fields: Dict[str, str]) -> Tuple[str, Tuple[str, ...]]:
+    """Collection and tags named by an upload's form fields."""
+    return collection_for_workspace(fields.get("workspace")), parse_tags(fields.get("tags"))
+
+@app.post("/upload_pdfs/", status_code=202, openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["files"],
+            "properties": {
+                "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                "workspace": {"type": "string"},
+                "tags": {"type": "string"}
+            }
+        }}}
+    }
+})
+async def upload_pdfs(request: Request):
+    """
+    Save uploaded PDFs and queue them for background ingestion.
+    
+    The multipart body is parsed as it streams in: each PDF is written straight to
+    UPLOAD_DIR, and a file over MAX_UPLOAD_MB is rejected before the rest of the body
+    is read. If any part is rejected, none of the request's files are kept. Returns immediately with a job ID; poll GET /jobs/{job_id} for progress.
+    
+    Form fields:
+        files: PDF files to index
+        workspace: Optional tenant/workspace ID; each workspace has its own collection
+        tags: Optional comma-separated tags stored on every chunk, for scoped questions
+    """
     try:
-        logger.info(f"Received {len(files)} files for processing")
+        try:
+            fields, stored_files = await receive_uploads(request, check_fields=upload_target)
+            collection_name, parsed_tags = upload_target(fields)
+        except (UploadFormError, InvalidWorkspaceError) as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        logger.info(f"Received {len(stored_files)} files for processing (workspace: {fields.get('workspace') or 'default'})")
         
         # Validate files
-        if not files:
+        if not stored_files:
             return JSONResponse(status_code=400, content={"error": "No files provided"})
         
-        # Check file types
-        invalid_files = [f.filename for f in files if not f.filename.lower().endswith('.pdf')]
-        if invalid_files:
-            return JSONResponse(
-                status_code=400, 
-                content={"error": f"Invalid file types detected. Only PDF files are allowed: {invalid_files}"}
-            )
-        
-        logger.info("Starting vectorstore processing...")
-        load_vectorstore(files)
-        logger.info("Documents successfully added to chroma vectorstore")
+        job_id = create_job([stored.filename for stored in stored_files])
+        submit_job(job_id, stored_files, collection_name=collection_name, tags=parsed_tags)
+        logger.info(f"Queued ingestion job {job_id}")
         
-        return {
-            "message": f"Successfully processed {len(files)} PDF files and updated vectorstore",
-            "files_processed": [f.filename for f in files]
-        }
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": f"Queued {len(stored_files)} PDF files for processing",
+                "job_id": job_id,
+                "files_processed": [stored.filename for stored in stored_files]
+            }
+        )
         
-    except ValueError as ve:
-        # Handle specific validation errors (e.g., no documents loaded, no text extracted)
-        logger.warning(f"Validation error during PDF upload: {ve}")
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected oversized upload: {e}")
         return JSONResponse(
-            status_code=400, 
+            status_code=413,
             content={
-                "error": f"Document processing error: {str(ve)}",
-                "suggestion": "Please ensure your PDFs contain readable text or images with text."
+                "error": str(e),
+                "suggestion": "Split the document into smaller PDFs or ask the administrator to raise MAX_UPLOAD_MB."
             }
         )
         
     except Exception as e:
-        error_msg = str(e)
         logger.exception("Error during PDF upload")
-        
-        # Provide specific guidance for rate limit errors
-        if "429" in error_msg or "Resource has been exhausted" in error_msg or "rate limit" in error_msg.lower():
-            return JSONResponse(
-                status_code=429, 
-                content={
-                    "error": "Rate limit exceeded for Gemini API",
-                    "message": "Please wait a few minutes before uploading more files. The system will automatically retry with alternative models.",
-                    "suggestion": "Consider uploading fewer files at once or wait for the rate limit to reset."
-                }
-            )
-        
-        # Provide specific guidance for API key errors
-        if "api" in error_msg.lower() and ("key" in error_msg.lower() or "authentication" in error_msg.lower()):
-            return JSONResponse(
-                status_code=401, 
-                content={
-                    "error": "API authentication error",
-                    "message": "There was an issue with the Gemini API configuration.",
-                    "suggestion": "Please check that your GEMINI_API_KEY is properly configured."
-                }
-            )
-        
-        # Generic error response
         return JSONResponse(
             status_code=500, 
             content={
-                "error": f"An error occurred while processing the files: {error_msg}",
+                "error": f"An error occurred while saving the files: {str(e)}",
                 "suggestion": "Please try again. If the problem persists, check your files and API configuration."
             }
         )
 
 
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Report overall and per-file progress of an ingestion job."""
+    job = get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job ID: {job_id}"})
+    return job
+
+
+@app.get("/documents")
+async def get_documents(workspace: str = None):
+    """List a workspace's indexed documents with chunk counts, page counts, ingest time, extraction method and tags."""
+    try:
+        collection_name = collection_for_workspace(workspace)
+        if not await run_in_threadpool(workspace_exists, collection_name):
+            return {"documents": [], "total": 0}
+        documents = await run_in_threadpool(lambda: list_documents(open_metadata_store(collection_name)))
+        return {"documents": documents, "total": len(documents)}
+    except InvalidWorkspaceError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.exception("Error listing documents")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.delete("/documents/{source:path}")
+async def remove_document(source: str, workspace: str = None):
+    """Delete every vector of a document by its source filename."""
+    try:
+        collection_name = collection_for_workspace(workspace)
+        exists = await run_in_threadpool(workspace_exists, collection_name)
+        deleted = exists and await run_in_threadpool(lambda: delete_document(open_metadata_store(collection_name), source))
+        if not deleted:
+            return JSONResponse(status_code=404, content={"error": f"Document not found: {source}"})
+        logger.info(f"Deleted {deleted} chunks of '{source}'")
+        return {"message": f"Deleted '{source}'", "chunks_deleted": deleted}
+    except InvalidWorkspaceError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.exception(f"Error deleting document '{source}'")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.post("/documents/{source:path}/reindex", status_code=202)
+async def reindex_document(source: str, workspace: str = None):
+    """Re-extract and re-index a single document in place as a background job, keeping its tags."""
+    try:
+        collection_name = collection_for_workspace(workspace)
+        if not await run_in_threadpool(workspace_exists, collection_name):
+            return JSONResponse(status_code=404, content={"error": f"No stored PDF found for document: {source}"})
+        metadata_store = await run_in_threadpool(open_metadata_store, collection_name)
+        stored_file = await run_in_threadpool(find_stored_upload, metadata_store, source)
+        if stored_file is None:
+            return JSONResponse(status_code=404, content={"error": f"No stored PDF found for document: {source}"})
+        document_tags = await run_in_threadpool(find_document_tags, metadata_store, source)
+        
+        job_id = create_job([source])
+        submit_job(job_id, [stored_file], replace=True, collection_name=collection_name, tags=document_tags)
+        logger.info(f"Queued re-index job {job_id} for '{source}'")
+        return JSONResponse(status_code=202, content={"message": f"Re-indexing '{source}'", "job_id": job_id})
+    except InvalidWorkspaceError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.exception(f"Error re-indexing document '{source}'")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.post("/snapshots", status_code=201)
+async def create_snapshot(workspace: str = None):
+    """Export a workspace's vectors, documents and metadata to a checksummed snapshot file for replicas."""
+    try:
+        collection_name = collection_for_workspace(workspace)
+        if not await run_in_threadpool(workspace_exists, collection_name):
+            return unknown_workspace(workspace)
+        summary = await run_in_threadpool(export_snapshot, collection_name)
+        summary["download"] = f"/snapshots/{os.path.basename(summary['path'])}"
+        return JSONResponse(status_code=201, content=summary)
+    except InvalidWorkspaceError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        logger.exception("Error exporting snapshot")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.get("/snapshots/{filename}")
+async def download_snapshot(filename: str):
+    """Download a snapshot file written by POST /snapshots."""
+    path = os.path.join(SNAPSHOT_DIR, os.path.basename(filename))
+    if not filename.endswith(".ragsnap") or not os.path.isfile(path):
+        return JSONResponse(status_code=404, content={"error": f"Snapshot not found: {filename}"})
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
+
+
+def describe_requested_model(model_name: str) -> str:
+    """Name of the model a request asked for, or of the default model when it asked for none."""
+    if model_name:
+        return model_name
+    available_models_dict = get_available_models() 
+    if not available_models_dict:
+        return "default (config error)"
+    sorted_by_priority = sorted(
+        available_models_dict.items(), 
+        key=lambda item: item[1].get('priority', float('inf'))
+    )
+    return sorted_by_priority[0][0] if sorted_by_priority else "default (unavailable)"
+
+
+def describe_model_choice(model_name: str, actual_model_used: str):
+    """Status message telling the client which model answered, or None when it is the one requested."""
+    if model_name and model_name != actual_model_used:
+        return f"Requested model '{model_name}' was unavailable or encountered issues. Fallback to '{actual_model_used}' was used."
+    if not model_name and actual_model_used: 
+        return f"Using model '{actual_model_used}' by default."
+    return None
+
+
+async def embed_question(vectorstore, question: str, embedding: Optional[List[float]]) -> Optional[List[float]]:
+    """
+    The question embedding shared by the answer cache and retrieval, so an uncached answer costs one embedding call.
+    
+    Reuses the embedding the cache lookup computed, if any. Questions naming identifiers are
+    left unembedded: the cache never embeds them, and retrieval may answer them from exact
+    lexical matches without one.
+    """
+    if embedding is not None or identifier_terms(question):
+        return embedding
+    with stage_timer("retrieval"):
+        return await vectorstore.embeddings.aembed_query(question)
+
+
 @app.post("/ask/")
-async def ask_question(question: str = Form(...), model_name: str = Form(None), temperature: float = Form(0.1)):
+async def ask_question(question: str = Form(...), model_name: str = Form(None), temperature: float = Form(0.1),
+                       workspace: str = Form(None), sources: str = Form(None), tags: str = Form(None)):
     """
     Ask a question with optional model selection and temperature control.
     
@@ -115,65 +329,89 @@ async def ask_question(question: str = Form(...), model_name: str = Form(None),
         question: The question to ask
         model_name: Optional Gemini model to use (defaults to highest priority).
         temperature: Temperature for response generation (0.0-1.0, lower = more precise).
+        workspace: Optional tenant/workspace ID whose documents are searched.
+        sources: Optional comma-separated document filenames to limit the search to.
+        tags: Optional comma-separated tags; documents with any of them are searched too.
     """
     try:
         logger.info(f"User query: '{question}'")
         
-        requested_model_for_response = model_name
-        if not requested_model_for_response:
-            available_models_dict = get_available_models() 
-            if available_models_dict:
-                sorted_by_priority = sorted(
-                    available_models_dict.items(), 
-                    key=lambda item: item[1].get('priority', float('inf'))
-                )
-                if sorted_by_priority:
-                    requested_model_for_response = sorted_by_priority[0][0] 
-                else:
-                    requested_model_for_response = "default (unavailable)"
-            else:
-                requested_model_for_response = "default (config error)"
+        requested_model_for_response = describe_requested_model(model_name)
         
         logger.info(f"Requested Model: '{requested_model_for_response}', Temperature: {temperature}")
         
-        load_dotenv()
-        
-        vectorstore = Chroma(
-            persist_directory=PERSIST_DIR,
-            embedding_function=GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001", 
-                google_api_key=os.environ.get("GEMINI_API_KEY")
-            )
-        )
+        try:
+            collection_name = collection_for_workspace(workspace)
+            scope = DocumentScope.parse(sources, tags)
+        except InvalidWorkspaceError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
         
-        chain, actual_model_used = get_llm_chain(
-            vectorstore, 
-            model_name=model_name, 
-            temperature=temperature
-        )
+        store = await run_in_threadpool(vectorstore_pool.existing_store, collection_name)
+        if store is None:
+            return unknown_workspace(workspace)
+        vectorstore = await run_in_threadpool(store.get)
         
-        if chain is None:
-            logger.error(f"All AI models (requested: {model_name or 'default'}) failed to initialize after retries.")
+        # Models whose circuit breaker is open are skipped without a call
+        expected_model = first_available_model(model_name)
+        if expected_model is None:
+            logger.error(f"All AI models (requested: {model_name or 'default'}) are cooling down after failures.")
             return JSONResponse(
                 status_code=503,
                 content={"error": "All AI models are currently unavailable due to high demand or rate limits. Please try again later."}
             )
         
-        logger.info(f"Successfully initialized chain with model: '{actual_model_used}' (Requested: '{model_name or 'default'}')")
+        # The shared handle's version bumps on every commit, which invalidates cached answers
+        corpus_version = store.version
+        embed = vectorstore.embeddings.embed_query
+        cache_scope = {"collection": collection_name, "scope": scope.key()}
+        
+        async def answer():
+            # Cache lookups may embed the question, so they run off the event loop
+            cached_answer, question_embedding = await run_in_threadpool(
+                answer_cache.lookup, question, expected_model, temperature, corpus_version, embed=embed, **cache_scope
+            )
+            if cached_answer is not None:
+                logger.info("Answer served from cache")
+                return cached_answer, cached_answer.get("model_used", expected_model), True
+            question_embedding = await embed_question(vectorstore, question, question_embedding)
+            response, model_used = await aquery_with_fallback(
+                vectorstore, question, model_name=model_name, temperature=temperature, scope=scope,
+                query_embedding=question_embedding
+            )
+            if response is not None:
+                # Keyed by the model the lookup asked for, so a fallback answer is reused
+                await run_in_threadpool(
+                    answer_cache.store, question, expected_model, temperature, corpus_version,
+                    {**response, "model_used": model_used}, embedding=question_embedding, **cache_scope
+                )
+            return response, model_used, False
         
-        result_data = query_chain(chain, question)
+        # Identical questions arriving while one is being answered wait for that answer instead of calling Gemini again
+        (result_data, actual_model_used, cached), coalesced = await answer_flights.run(
+            answer_key(question, expected_model, temperature, corpus_version, **cache_scope), answer
+        )
+        if coalesced:
+            logger.info("Joined an identical in-flight question")
+        if result_data is None:
+            logger.error(f"All AI models (requested: {model_name or 'default'}) failed to generate an answer.")
+            return JSONResponse(
+                status_code=503,
+                content={"error": "All AI models are currently unavailable due to high demand or rate limits. Please try again later."}
+            )
         
         response_content = {
             "answer": result_data.get("response"),  # Fixed: query_chain returns "response", not "answer"
             "source_documents": result_data.get("sources", []),  # Fixed: query_chain returns "sources", not "source_documents"
             "requested_model": requested_model_for_response, 
-            "actual_model_used": actual_model_used
+            "actual_model_used": actual_model_used,
+            "cached": cached,
+            "coalesced": coalesced,
+            "context": None if cached else result_data.get("context")
         }
 
-        if model_name and model_name != actual_model_used:
-            response_content["status_message"] = f"Requested model '{model_name}' was unavailable or encountered issues. Fallback to '{actual_model_used}' was used."
-        elif not model_name and actual_model_used: 
-            response_content["status_message"] = f"Using model '{actual_model_used}' by default."
+        status_message = describe_model_choice(model_name, actual_model_used)
+        if status_message:
+            response_content["status_message"] = status_message
         
         logger.info(f"Query successful. Model used: '{actual_model_used}'.")
         return JSONResponse(content=response_content)
@@ -185,11 +423,187 @@ async def ask_question(question: str = Form(...), model_name: str = Form(None),
         logger.exception(f"Error processing question in /ask endpoint (Query: '{question}', Model: {model_name})")
         return JSONResponse(status_code=500, content={"error": f"An unexpected server error occurred: {str(e)}"})
 
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(question: str = Form(...), model_name: str = Form(None), temperature: float = Form(0.1),
+                              workspace: str = Form(None), sources: str = Form(None), tags: str = Form(None)):
+    """
+    Ask a question and stream the answer as Server-Sent Events.
+    
+    Emits a "sources" event once retrieval finishes, a "token" event per generated
+    chunk of the answer, then "done" with the model details (or "error").
+    
+    Args:
+        question: The question to ask
+        model_name: Optional Gemini model to use (defaults to highest priority).
+        temperature: Temperature for response generation (0.0-1.0, lower = more precise).
+        workspace, sources, tags: Limit the search as for /ask/.
+    """
+    try:
+        logger.info(f"User query (streaming): '{question}'")
+        requested_model_for_response = describe_requested_model(model_name)
+        
+        try:
+            collection_name = collection_for_workspace(workspace)
+            scope = DocumentScope.parse(sources, tags)
+        except InvalidWorkspaceError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        
+        store = await run_in_threadpool(vectorstore_pool.existing_store, collection_name)
+        if store is None:
+            return unknown_workspace(workspace)
+        vectorstore = await run_in_threadpool(store.get)
+        expected_model = first_available_model(model_name)
+        if expected_model is None:
+            logger.error(f"All AI models (requested: {model_name or 'default'}) are cooling down after failures.")
+            return JSONResponse(
+                status_code=503,
+                content={"error": "All AI models are currently unavailable due to high demand or rate limits. Please try again later."}
+            )
+    except Exception as e:
+        logger.exception(f"Error preparing streamed answer (Query: '{question}', Model: {model_name})")
+        return JSONResponse(status_code=500, content={"error": f"An unexpected server error occurred: {str(e)}"})
+
+    async def events():
+        # Headers are already sent, so failures become an "error" event
+        actual_model_used = expected_model
+        context_stats = None
+        try:
+            corpus_version = store.version
+            embed = vectorstore.embeddings.embed_query
+            cache_scope = {"collection": collection_name, "scope": scope.key()}
+            cached_answer, question_embedding = await run_in_threadpool(
+                answer_cache.lookup, question, expected_model, temperature, corpus_version, embed=embed, **cache_scope
+            )
+            if cached_answer is not None:
+                actual_model_used = cached_answer.get("model_used", expected_model)
+                yield sse_event("sources", {"sources": cached_answer.get("sources", [])})
+                yield sse_event("token", {"text": cached_answer.get("response", "")})
+            else:
+                question_embedding = await embed_question(vectorstore, question, question_embedding)
+                sources, tokens = [], []
+                async for event, data in astream_with_fallback(
+                    vectorstore, question, model_name=model_name, temperature=temperature, scope=scope,
+                    query_embedding=question_embedding
+                ):
+                    if event == "model":
+                        actual_model_used = data["model"]
+                        context_stats = data["context"]
+                        continue
+                    if event == "sources":
+                        sources = data["sources"]
+                    else:
+                        tokens.append(data["text"])
+                    yield sse_event(event, data)
+                await run_in_threadpool(
+                    answer_cache.store, question, expected_model, temperature, corpus_version,
+                    {"response": "".join(tokens), "sources": sources, "context": context_stats, "model_used": actual_model_used},
+                    embedding=question_embedding, **cache_scope
+                )
+            done = {
+                "requested_model": requested_model_for_response,
+                "actual_model_used": actual_model_used,
+                "cached": cached_answer is not None,
+                "context": context_stats
+            }
+            status_message = describe_model_choice(model_name, actual_model_used)
+            if status_message:
+                done["status_message"] = status_message
+            yield sse_event("done", done)
+            logger.info(f"Streamed query successful. Model used: '{actual_model_used}'.")
+        except ModelsUnavailableError as e:
+            logger.error(f"All AI models (requested: {model_name or 'default'}) failed to generate an answer.")
+            yield sse_event("error", {"error": str(e)})
+        except Exception as e:
+            logger.exception(f"Error streaming answer (Query: '{question}', Model: {actual_model_used})")
+            yield sse_event("error", {"error": f"An unexpected server error occurred: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class BatchQuestion(BaseModel):
+    question: str = Field(..., min_length=1)
+    model_name: Optional[str] = None
+    temperature: float = Field(0.1, ge=0.0, le=1.0)
+
+
+class BatchRequest(BaseModel):
+    questions: List[BatchQuestion] = Field(..., min_length=1)
+    workspace: Optional[str] = None
+    sources: Optional[str] = None
+    tags: Optional[str] = None
+    concurrency: int = Field(BATCH_CONCURRENCY, ge=1)
+
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchRequest):
+    """
+    Answer a list of questions in one request.
+    
+    The questions are embedded in one batched call and retrieved together; answers
+    are generated a few at a time, so a large batch does not exhaust the model's
+    rate limit. Results come back in input order; a question that fails carries an
+    "error" instead of failing the whole batch.
+    
+    Body:
+        questions: [{question, model_name?, temperature?}, ...]
+        workspace, sources, tags: Limit the search as for /ask/.
+        concurrency: Answers generated at the same time (capped by BATCH_MAX_CONCURRENCY).
+    """
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"At most {BATCH_MAX_QUESTIONS} questions can be sent in one batch"}
+        )
+    try:
+        collection_name = collection_for_workspace(request.workspace)
+        scope = DocumentScope.parse(request.sources, request.tags)
+    except InvalidWorkspaceError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    try:
+        logger.info(f"Batch of {len(request.questions)} questions, concurrency {request.concurrency}")
+        items = [BatchItem(q.question, q.model_name, q.temperature) for q in request.questions]
+        store = await run_in_threadpool(vectorstore_pool.existing_store, collection_name)
+        if store is None:
+            return unknown_workspace(request.workspace)
+        results = await answer_batch(store, scope, items, request.concurrency)
+        failed = sum(1 for result in results if "error" in result)
+        return JSONResponse(content={
+            "results": results,
+            "total": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed
+        })
+    except Exception as e:
+        logger.exception("Error processing /ask/batch")
+        return JSONResponse(status_code=500, content={"error": f"An unexpected server error occurred: {str(e)}"})
+
 @app.get("/test")
 async def test():
     return {"message": "Testing successful..."}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Stage latency histograms and request, rate-limit, fallback, cache and dropped-log counters in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/cache")
+async def get_cache_stats():
+    """Answer cache size and hit-rate statistics, and how many requests joined an in-flight answer."""
+    return {**answer_cache.stats(), "single_flight": answer_flights.stats()}
+
+
 @app.get("/models")
 async def get_models_endpoint(): # Renamed to avoid conflict with imported get_available_models
     """Get available Gemini models with their capabilities."""
@@ -207,7 +621,10 @@ async def get_models_endpoint(): # Renamed to avoid conflict with imported get_a
         return {
             "available_models": models,
             "default_model": default_model_id, 
-            "recommended_temperature": 0.1
+            "recommended_temperature": 0.1,
+            "embedding_model": get_pinned_embedding_model(COLLECTION_NAME),
+            "embedding_health": embedding_registry.status(),
+            "circuit_breakers": model_breakers.status()
         }
     except Exception as e:
         logger.exception("Error getting models")
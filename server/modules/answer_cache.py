@@ -0,0 +1,180 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from logger import logger
+from .lexical_index import identifier_terms
+from .metrics import CACHE_LOOKUPS
+
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity above which two questions are treated as the same question
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0.95"))
+TEMPERATURE_BUCKET = 0.1
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase and collapse whitespace and trailing punctuation, so trivially different spellings match exactly."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+def temperature_bucket(temperature: float) -> float:
+    return round(round(temperature / TEMPERATURE_BUCKET) * TEMPERATURE_BUCKET, 2)
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of answers keyed by (collection, document scope, model,
+    temperature bucket, corpus version) and question.
+
+    Exact repeats (after normalization) hit without any API call; otherwise the
+    question embedding is compared against cached questions of the same key and
+    a hit is anything above the similarity threshold. Entries from an older
+    version of a collection are never returned and are dropped as soon as a newer
+    one is seen.
+    """
+
+    def __init__(self, max_size: int, ttl: int, similarity: float):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[Tuple[str, str, str, float, int, str], Dict[str, Any]]" = OrderedDict()
+        self._corpus_versions: Dict[str, int] = {}
+        self._hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, collection: str, corpus_version: int):
+        """Drop entries of an older version of the collection and entries past their TTL. Caller holds the lock."""
+        if corpus_version > self._corpus_versions.get(collection, -1):
+            self._corpus_versions[collection] = corpus_version
+            for key in [k for k in self._entries if k[0] == collection]:
+                del self._entries[key]
+        now = time.monotonic()
+        for key in [k for k, entry in self._entries.items() if now - entry["created_at"] > self.ttl]:
+            del self._entries[key]
+
+    def lookup(self, question: str, model_name: str, temperature: float, corpus_version: int,
+               embed=None, collection: str = "", scope: str = "") -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Find a cached answer for the question.
+
+        Args:
+            collection: Collection the answer was retrieved from; corpus_version is that collection's version
+            scope: Key of the DocumentScope retrieval was limited to
+            embed: Optional callable returning the question embedding; only called when
+                there is no exact match but there are candidates to compare against. It gets
+                the question as asked, so the result can be reused for retrieval
+
+        Returns:
+            (cached answer or None, question embedding if one was computed)
+        """
+
+        normalized = normalize_question(question)
+        bucket = temperature_bucket(temperature)
+        exact_key = (collection, scope, model_name, bucket, corpus_version, normalized)
+        if identifier_terms(question):
+            embed = None  # "error E-1042" and "error E-1043" embed almost identically; only exact repeats may hit
+
+        with self._lock:
+            self._expire(collection, corpus_version)
+            entry = self._entries.get(exact_key)
+            if entry is not None:
+                self._entries.move_to_end(exact_key)
+                self._hits += 1
+                CACHE_LOOKUPS.inc(result="hit")
+                return entry["answer"], None
+            candidates = [
+                (key, entry["embedding"]) for key, entry in self._entries.items()
+                if key[:5] == exact_key[:5] and entry["embedding"] is not None
+            ]
+
+        embedding = None
+        if candidates and embed is not None:
+            try:
+                embedding = embed(question)
+            except Exception as e:
+                logger.warning(f"Could not embed question for the answer cache: {e}")
+                candidates = []
+        if candidates and embedding is not None:
+            query = np.asarray(embedding, dtype=np.float32)
+            matrix = np.asarray([vector for _, vector in candidates], dtype=np.float32)
+            scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity:
+                best_key = candidates[best][0]
+                with self._lock:
+                    entry = self._entries.get(best_key)
+                    if entry is not None:
+                        self._entries.move_to_end(best_key)
+                        self._hits += 1
+                        self._semantic_hits += 1
+                        CACHE_LOOKUPS.inc(result="semantic_hit")
+                        return entry["answer"], embedding
+
+        with self._lock:
+            self._misses += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        return None, embedding
+
+    def store(self, question: str, model_name: str, temperature: float, corpus_version: int,
+              answer: Dict[str, Any], embedding: Optional[List[float]] = None, embed=None,
+              collection: str = "", scope: str = ""):
+        """
+        Cache an answer.
+
+        Args:
+            embedding: Question embedding returned by lookup, if any
+            embed: Callable used to embed the question when no embedding is given; without
+                either the answer can only be hit by an exact (normalized) repeat
+            collection, scope: As for lookup
+        """
+
+        normalized = normalize_question(question)
+        key = (collection, scope, model_name, temperature_bucket(temperature), corpus_version, normalized)
+        if identifier_terms(question):
+            embed = None
+        if embedding is None and embed is not None:
+            try:
+                embedding = embed(question)
+            except Exception as e:
+                logger.warning(f"Could not embed question for the answer cache: {e}")
+        with self._lock:
+            self._expire(collection, corpus_version)
+            if corpus_version < self._corpus_versions[collection]:
+                return  # Answered from a corpus that has since changed
+            self._entries[key] = {
+                "answer": answer,
+                "embedding": list(embedding) if embedding is not None else None,
+                "created_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate statistics since startup."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.similarity,
+                "corpus_versions": dict(self._corpus_versions),
+                "hits": self._hits,
+                "semantic_hits": self._semantic_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY)
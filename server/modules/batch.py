@@ -0,0 +1,106 @@
+import os
+import asyncio
+from typing import Any, Dict, List, NamedTuple, Optional
+from logger import logger
+from .answer_cache import answer_cache
+from .llm import build_retriever, first_available_model
+from .query_handlers import aquery_with_fallback
+from .single_flight import answer_flights, answer_key
+from .vectorstore import SharedVectorStore
+from .workspaces import DocumentScope
+
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", "500"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))  # Generations in flight per batch
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "16"))
+
+MODELS_UNAVAILABLE_ERROR = "All AI models are currently unavailable due to high demand or rate limits. Please try again later."
+
+
+class BatchItem(NamedTuple):
+    """One question of a batch, with its own model and temperature."""
+    question: str
+    model_name: Optional[str] = None
+    temperature: float = 0.1
+
+
+def embed_questions(embeddings, questions: List[str]) -> List[List[float]]:
+    """Embed every question in one batched call, as queries when the client supports task types."""
+    try:
+        return embeddings.embed_documents(questions, task_type="RETRIEVAL_QUERY")
+    except TypeError:
+        return embeddings.embed_documents(questions)
+
+
+async def answer_batch(store: SharedVectorStore, scope: DocumentScope, items: List[BatchItem],
+                       concurrency: int = BATCH_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Answer many questions against one workspace collection.
+
+    All questions are embedded in one call and retrieved in one Chroma query; generations
+    then run at most `concurrency` at a time. Models that hit their rate limit open their
+    circuit breaker, so the rest of the batch skips them instead of piling onto them.
+
+    Returns:
+        One result per item, in input order; failed items carry an "error" instead of an answer
+    """
+
+    vectorstore = await asyncio.to_thread(store.get)
+    corpus_version = store.version
+    questions = [item.question for item in items]
+
+    question_embeddings = await asyncio.to_thread(embed_questions, vectorstore.embeddings, questions)
+    retriever = build_retriever(vectorstore).scoped(scope)
+    retrieved = await asyncio.to_thread(retriever.retrieve_batch, questions, question_embeddings)
+    logger.info(f"Batch of {len(items)}: embedded and retrieved in bulk, generating {concurrency} at a time")
+
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    cache_scope = {"collection": store.collection_name, "scope": scope.key()}
+
+    async def answer(index: int, item: BatchItem, docs, embedding) -> Dict[str, Any]:
+        result = {"index": index, "question": item.question}
+        async with semaphore:
+            try:
+                expected_model = first_available_model(item.model_name)
+                if expected_model is None:
+                    return {**result, "error": MODELS_UNAVAILABLE_ERROR}
+
+                async def generate():
+                    cached_answer, _ = answer_cache.lookup(
+                        item.question, expected_model, item.temperature, corpus_version,
+                        embed=lambda _: embedding, **cache_scope
+                    )
+                    if cached_answer is not None:
+                        return cached_answer, cached_answer.get("model_used", expected_model), True
+                    response, model_used = await aquery_with_fallback(
+                        vectorstore, item.question, model_name=item.model_name, temperature=item.temperature,
+                        scope=scope, docs=docs
+                    )
+                    if response is not None:
+                        answer_cache.store(
+                            item.question, expected_model, item.temperature, corpus_version,
+                            {**response, "model_used": model_used}, embedding=embedding, **cache_scope
+                        )
+                    return response, model_used, False
+
+                # Repeated questions, in this batch or from /ask/, share one generation
+                (response, actual_model_used, cached), _ = await answer_flights.run(
+                    answer_key(item.question, expected_model, item.temperature, corpus_version, **cache_scope), generate
+                )
+                if response is None:
+                    return {**result, "error": MODELS_UNAVAILABLE_ERROR}
+                return {
+                    **result,
+                    "answer": response.get("response"),
+                    "source_documents": response.get("sources", []),
+                    "actual_model_used": actual_model_used,
+                    "cached": cached,
+                    "context": None if cached else response.get("context"),
+                }
+            except Exception as e:
+                logger.exception(f"Batch question {index} failed")
+                return {**result, "error": f"An unexpected server error occurred: {str(e)}"}
+
+    return await asyncio.gather(*(
+        answer(index, item, docs, embedding)
+        for index, (item, docs, embedding) in enumerate(zip(items, retrieved, question_embeddings))
+    ))
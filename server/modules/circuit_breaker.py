@@ -0,0 +1,143 @@
+import os
+import re
+import time
+import threading
+from typing import Any, Dict, Iterable, Optional
+import google.api_core.exceptions  # For catching rate limit errors
+
+# Cool-down after a rate limit when the API gives no retry delay; doubles on each re-trip
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = float(os.environ.get("BREAKER_MAX_COOLDOWN", "600"))
+# Consecutive non-rate-limit failures that open a breaker
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "3"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an exception raised by a Gemini call means the model's quota is exhausted."""
+    if isinstance(error, google.api_core.exceptions.ResourceExhausted):
+        return True
+    error_msg = str(error)
+    return "429" in error_msg or "Resource has been exhausted" in error_msg or "rate limit" in error_msg.lower()
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait before retrying, if the error says."""
+    for detail in getattr(error, "details", None) or []:
+        retry_delay = getattr(detail, "retry_delay", None)
+        if retry_delay is not None and hasattr(retry_delay, "seconds"):
+            return retry_delay.seconds + getattr(retry_delay, "nanos", 0) / 1e9
+    match = re.search(r"retry[_ ]?(?:delay|after|in)\D{0,20}?(\d+(?:\.\d+)?)\s*s", str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one model.
+
+    A rate limit opens the breaker at once for the API's retry delay (or an
+    exponentially growing default); other errors open it after
+    BREAKER_FAILURE_THRESHOLD in a row. Once the cool-down has passed, a
+    single trial request is let through: success closes the breaker, failure
+    re-opens it with a longer cool-down.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _cooldown(self, retry_after: Optional[float]) -> float:
+        default = min(BREAKER_COOLDOWN * 2 ** max(self.trips - 1, 0), BREAKER_MAX_COOLDOWN)
+        return max(retry_after, 1.0) if retry_after is not None else default
+
+    def available(self) -> bool:
+        """Whether a request would currently be let through, without claiming the half-open trial."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            return time.monotonic() >= self.open_until and not self._trial_in_flight
+
+    def allow_request(self) -> bool:
+        """Claim permission to call the model; in half-open state only one caller gets it."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if time.monotonic() < self.open_until or self._trial_in_flight:
+                return False
+            self.state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trips = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Exception):
+        """
+        Count a failed call, opening the breaker for rate limits, failed trials or repeated errors.
+
+        Only a closed -> open or half-open -> open transition counts as a trip. Failures
+        landing while the breaker is already open come from calls admitted before it
+        opened (e.g. concurrent requests hitting the same 429); they may only push the
+        cool-down out to a longer retry delay the API asked for.
+        """
+        rate_limited = is_rate_limit_error(error)
+        retry_after = get_retry_after(error) if rate_limited else None
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == OPEN:
+                if retry_after is not None:
+                    self.open_until = max(self.open_until, time.monotonic() + max(retry_after, 1.0))
+            elif rate_limited or self.state == HALF_OPEN or self.failures >= BREAKER_FAILURE_THRESHOLD:
+                self.trips += 1
+                self.state = OPEN
+                self.open_until = time.monotonic() + self._cooldown(retry_after)
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a claimed trial that never reached the model (e.g. the request was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in_seconds": round(max(self.open_until - time.monotonic(), 0.0), 1) if self.state != CLOSED else 0.0,
+                "last_error": self.last_error,
+            }
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per model name, created on first use."""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._breakers: Dict[str, CircuitBreaker] = {name: CircuitBreaker(name) for name in names}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name)
+            return self._breakers[name]
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.status() for breaker in breakers}
@@ -0,0 +1,274 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from logger import logger
+
+COMPACT_INDEX_DIR = "./chroma_store"  # Default when a vectorstore does not say where it persists
+# "float32" keeps Chroma's own HNSW search; "float16" or "int8" search a compact in-memory copy instead
+VECTOR_STORAGE = os.environ.get("VECTOR_STORAGE", "float32").lower()
+# Leading dimensions kept in the compact copy (0 keeps all); the full vectors are only read for rescoring
+VECTOR_DIMENSIONS = int(os.environ.get("VECTOR_DIMENSIONS", "0"))
+# Candidates rescored against full-precision vectors, as a multiple of the number of results wanted
+VECTOR_RESCORE_FACTOR = int(os.environ.get("VECTOR_RESCORE_FACTOR", "4"))
+COMPACT_MODES = ("float16", "int8")
+SCAN_BLOCK_ROWS = 4096  # Rows dequantized at a time while scanning (small enough to stay in cache)
+REBUILD_PAGE_SIZE = 5000
+
+
+def compact_storage_enabled() -> bool:
+    return VECTOR_STORAGE in COMPACT_MODES
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray, mode: str, dimensions: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Truncate vectors to their leading dimensions, L2-normalize and quantize them.
+
+    float16 codes need no scale (scales are all 1); int8 codes use a symmetric
+    per-vector scale, so code * scale approximates the normalized vector.
+
+    Returns:
+        (codes, scales)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions:
+        vectors = vectors[..., :dimensions]
+    vectors = _normalize(vectors)
+    if mode == "float16":
+        return vectors.astype(np.float16), np.ones(vectors.shape[:-1], dtype=np.float32)
+    if mode == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=-1), 1e-12) / 127.0
+        codes = np.round(vectors / scales[..., None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown compact vector mode '{mode}', expected one of {COMPACT_MODES}")
+
+
+class CompactVectorIndex:
+    """
+    Quantized (float16 or int8), optionally truncated copy of a collection's vectors.
+
+    Only the compact codes are held in memory and scanned; the top candidates are
+    then rescored against the full-precision vectors, which stay on disk in the
+    same SQLite file and are read per query. Vectors are stored under the same IDs
+    as in Chroma, so additions and deletions are mirrored one-to-one.
+    """
+
+    def __init__(self, path: str, mode: str = VECTOR_STORAGE, dimensions: int = VECTOR_DIMENSIONS,
+                 rescore_factor: int = VECTOR_RESCORE_FACTOR):
+        if mode not in COMPACT_MODES:
+            raise ValueError(f"Unknown compact vector mode '{mode}', expected one of {COMPACT_MODES}")
+        self.path = path
+        self.mode = mode
+        self.dimensions = dimensions
+        self.rescore_factor = max(1, rescore_factor)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # In-memory scan arrays, loaded on first search and then kept in step with every add and delete.
+        # Changes build new arrays rather than writing into them, so a search scanning the old ones is unaffected.
+        self._ids: Optional[List[str]] = None
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._positions: Dict[str, int] = {}
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors (id TEXT PRIMARY KEY, code BLOB NOT NULL, "
+                "scale REAL NOT NULL, full BLOB NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            stored = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+            settings = {"mode": mode, "dimensions": str(dimensions)}
+            if stored and stored != settings:
+                # Codes written with other settings cannot be scanned together with new ones
+                self._conn.execute("DELETE FROM vectors")
+            self._conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", settings.items())
+
+    def add(self, ids: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        """Store vectors, replacing any already stored under the same IDs."""
+        if not len(ids):
+            return
+        full = np.asarray(embeddings, dtype=np.float32)
+        codes, scales = quantize(full, self.mode, self.dimensions)
+        rows = [
+            (doc_id, code.tobytes(), float(scale), vector.tobytes())
+            for doc_id, code, scale, vector in zip(ids, codes, scales, full)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (id, code, scale, full) VALUES (?, ?, ?, ?)", rows)
+            if self._ids is not None:
+                self._add_loaded_locked(list(ids), codes, scales)
+
+    def delete(self, ids: Sequence[str]):
+        with self._lock, self._conn:
+            for start in range(0, len(ids), 500):
+                batch = list(ids[start:start + 500])
+                self._conn.execute(f"DELETE FROM vectors WHERE id IN ({','.join('?' * len(batch))})", batch)
+            if self._ids is not None:
+                self._delete_loaded_locked(ids)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _load_locked(self):
+        rows = self._conn.execute("SELECT id, code, scale FROM vectors").fetchall()
+        dtype = np.float16 if self.mode == "float16" else np.int8
+        self._ids = [row[0] for row in rows]
+        self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+        self._scales = np.array([row[2] for row in rows], dtype=np.float32)
+        self._codes = (
+            np.frombuffer(b"".join(row[1] for row in rows), dtype=dtype).reshape(len(rows), -1)
+            if rows else np.zeros((0, 0), dtype=dtype)
+        )
+
+    def _add_loaded_locked(self, ids: List[str], codes: np.ndarray, scales: np.ndarray):
+        # The last vector wins when an ID is repeated, as with INSERT OR REPLACE
+        latest = {doc_id: row for row, doc_id in enumerate(ids)}
+        replaced = [(self._positions[doc_id], row) for doc_id, row in latest.items() if doc_id in self._positions]
+        appended = [row for doc_id, row in latest.items() if doc_id not in self._positions]
+        new_codes, new_scales = self._codes, self._scales
+        if replaced:
+            targets, sources = (np.array(column) for column in zip(*replaced))
+            new_codes, new_scales = new_codes.copy(), new_scales.copy()
+            new_codes[targets] = codes[sources]
+            new_scales[targets] = scales[sources]
+        new_ids = self._ids
+        if appended:
+            new_ids = self._ids + [ids[row] for row in appended]
+            new_codes = np.concatenate([new_codes, codes[appended]]) if len(self._ids) else codes[appended]
+            new_scales = np.concatenate([new_scales, scales[appended]])
+            for position, row in enumerate(appended, start=len(self._ids)):
+                self._positions[ids[row]] = position
+        self._ids, self._codes, self._scales = new_ids, new_codes, new_scales
+
+    def _delete_loaded_locked(self, ids: Sequence[str]):
+        removed = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+        if not removed:
+            return
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[list(removed)] = False
+        self._ids = [doc_id for doc_id, kept in zip(self._ids, keep) if kept]
+        self._codes = self._codes[keep]
+        self._scales = self._scales[keep]
+        self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+
+    def _arrays(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        ids, codes, scales, _ = self._snapshot()
+        return ids, codes, scales
+
+    def _snapshot(self) -> Tuple[List[str], np.ndarray, np.ndarray, Dict[str, int]]:
+        """
+        The scan arrays and the id -> row index. Adds only append to the index and deletes
+        replace it, so rows past the snapshot's length are the only entries to ignore.
+        """
+        with self._lock:
+            if self._ids is None:
+                self._load_locked()
+            return self._ids, self._codes, self._scales, self._positions
+
+    def memory_bytes(self) -> int:
+        """Size of the in-memory scan arrays (codes and scales)."""
+        _, codes, scales = self._arrays()
+        return codes.nbytes + scales.nbytes
+
+    def _full_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, full FROM vectors WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {doc_id: np.frombuffer(full, dtype=np.float32) for doc_id, full in rows}
+
+    def search(self, embedding: Sequence[float], k: int = 5, allowed_ids: Optional[Set[str]] = None,
+               rescore: bool = True) -> List[Tuple[str, float]]:
+        """
+        Return up to k (id, cosine similarity) pairs, best first.
+
+        Scans the compact codes for k * rescore_factor candidates, then ranks them by
+        their full-precision vectors (unless rescore is False). allowed_ids limits the
+        search to those IDs.
+        """
+        ids, codes, scales, positions = self._snapshot()
+        if not ids or k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        compact_query = _normalize(query[:self.dimensions] if self.dimensions else query)
+
+        scores = np.empty(len(ids), dtype=np.float32)
+        for start in range(0, len(ids), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = (block @ compact_query) * scales[start:start + len(block)]
+        if allowed_ids is not None:
+            rows = [positions.get(doc_id, -1) for doc_id in allowed_ids]
+            rows = np.fromiter((row for row in rows if 0 <= row < len(ids)), dtype=np.int64)
+            mask = np.zeros(len(ids), dtype=bool)
+            mask[rows] = True
+            scores[~mask] = -np.inf
+
+        wanted = min(k * self.rescore_factor if rescore else k, len(ids))
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.isfinite(scores[top])]
+        top = top[np.argsort(-scores[top])]
+        if not rescore:
+            return [(ids[i], float(scores[i])) for i in top]
+
+        candidates = [ids[i] for i in top]
+        if not candidates:
+            return []
+        full = self._full_vectors(candidates)
+        query = _normalize(query)
+        rescored = [
+            (doc_id, float(_normalize(full[doc_id]) @ query))
+            for doc_id in candidates if doc_id in full
+        ]
+        rescored.sort(key=lambda item: item[1], reverse=True)
+        return rescored[:k]
+
+    def rebuild_from(self, vectorstore) -> int:
+        """Copy every vector of a Chroma collection (used once when compact storage is switched on)."""
+        stored = 0
+        offset = 0
+        while True:
+            data = vectorstore._collection.get(limit=REBUILD_PAGE_SIZE, offset=offset, include=["embeddings"])
+            if len(data["ids"]):
+                self.add(data["ids"], data["embeddings"])
+                stored += len(data["ids"])
+            if len(data["ids"]) < REBUILD_PAGE_SIZE:
+                return stored
+            offset += REBUILD_PAGE_SIZE
+
+
+_indexes: Dict[Tuple[str, str], CompactVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_compact_index(collection_name: str, directory: str = COMPACT_INDEX_DIR) -> CompactVectorIndex:
+    """Return the process-wide compact vector index of a collection, stored next to its Chroma data."""
+    key = (os.path.abspath(directory), collection_name)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = CompactVectorIndex(os.path.join(directory, f"compact_{collection_name}.sqlite3"))
+        return _indexes[key]
+
+
+def compact_index_for(vectorstore) -> Optional[CompactVectorIndex]:
+    """The compact vector index of a Chroma vectorstore's collection, or None when compact storage is off."""
+    if not compact_storage_enabled():
+        return None
+    directory = getattr(vectorstore, "_persist_directory", None) or COMPACT_INDEX_DIR
+    return get_compact_index(vectorstore._collection.name, directory)
+
+
+def ensure_compact_index(vectorstore) -> Optional[CompactVectorIndex]:
+    """Return the collection's compact index, backfilling it from Chroma if it is empty but the collection is not."""
+    index = compact_index_for(vectorstore)
+    if index is not None and index.count() == 0 and vectorstore._collection.count() > 0:
+        stored = index.rebuild_from(vectorstore)
+        logger.info(f"Built {index.mode} vector index for {vectorstore._collection.name} ({stored} vectors)")
+    return index
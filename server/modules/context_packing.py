@@ -0,0 +1,97 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+
+# Chunks scoring below this fraction of the best chunk's retrieval score are left out (0 keeps every chunk).
+# Off by default: retrieval scores are RRF scores, so when the best chunk was found by both
+# retrievers, chunks found by only one score about half of it and 0.5 would drop them all.
+CONTEXT_MIN_RELATIVE_SCORE = float(os.environ.get("CONTEXT_MIN_RELATIVE_SCORE", "0"))
+# Word-shingle Jaccard similarity at which a chunk counts as a near-duplicate of one already packed
+CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+DEFAULT_CONTEXT_TOKEN_BUDGET = 3000
+MIN_TRUNCATED_TOKENS = 64  # A chunk is cut to fit the budget only if at least this much of it survives
+CHARS_PER_TOKEN = 4  # Rough estimate for English text; avoids a count_tokens API call per chunk
+SHINGLE_SIZE = 3
+
+WORD_RE = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _shingles(text: str) -> set:
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_context(docs: List[Document], token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+                 min_relative_score: float = CONTEXT_MIN_RELATIVE_SCORE,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    Choose which retrieved chunks go into a "stuff" prompt.
+
+    Chunks are taken best first (by the "retrieval_score" metadata set by the
+    retriever, else in retrieval order). If min_relative_score is set, packing stops at
+    the first chunk scoring below that fraction of the best one; near-duplicates of packed chunks are
+    skipped; the chunk that crosses token_budget is truncated or left out.
+
+    Returns:
+        (packed documents, stats with token estimates and what was dropped and why)
+    """
+
+    retrieved_tokens = sum(estimate_tokens(doc.page_content) for doc in docs)
+    ranked = sorted(
+        enumerate(docs),
+        key=lambda item: (-(item[1].metadata.get("retrieval_score") or 0.0), item[0])
+    )
+    best_score: Optional[float] = ranked[0][1].metadata.get("retrieval_score") if ranked else None
+
+    packed: List[Document] = []
+    packed_shingles: List[set] = []
+    used_tokens = 0
+    dropped = {"duplicate": 0, "low_relevance": 0, "over_budget": 0}
+
+    for position, (_, doc) in enumerate(ranked):
+        score = doc.metadata.get("retrieval_score")
+        if min_relative_score > 0 and best_score and score is not None and score < best_score * min_relative_score:
+            dropped["low_relevance"] += len(ranked) - position  # Everything after is ranked lower still
+            break
+
+        shingles = _shingles(doc.page_content)
+        if any(_jaccard(shingles, other) >= dedup_threshold for other in packed_shingles):
+            dropped["duplicate"] += 1
+            continue
+
+        tokens = estimate_tokens(doc.page_content)
+        remaining = token_budget - used_tokens
+        if tokens > remaining:
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                doc = Document(page_content=doc.page_content[:remaining * CHARS_PER_TOKEN], metadata=doc.metadata)
+                packed.append(doc)
+                used_tokens += remaining
+            dropped["over_budget"] += len(ranked) - position - (1 if remaining >= MIN_TRUNCATED_TOKENS else 0)
+            break
+
+        packed.append(doc)
+        packed_shingles.append(shingles)
+        used_tokens += tokens
+
+    stats = {
+        "chunks_retrieved": len(docs),
+        "chunks_used": len(packed),
+        "dropped": dropped,
+        "token_budget": token_budget,
+        "context_tokens": used_tokens,
+        "prompt_tokens_saved": retrieved_tokens - used_tokens,
+    }
+    return packed, stats
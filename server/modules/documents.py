@@ -0,0 +1,132 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_chroma import Chroma
+from .lexical_index import lexical_index_for
+from .compact_vectors import compact_index_for
+from .shards import open_vectorstore
+from .workspaces import tags_from_metadata
+from .load_vectorstore import PERSIST_DIR, COLLECTION_NAME, UPLOAD_DIR, COMMIT_BATCH_SIZE, STAGING_PREFIX, StoredUpload, notify_commit
+
+
+def open_metadata_store(collection_name: str = COLLECTION_NAME) -> Chroma:
+    """Open a live collection for metadata-only operations (listing and deleting need no embeddings)."""
+    return open_vectorstore(collection_name, PERSIST_DIR)
+
+
+def _iter_metadatas(vectorstore: Chroma, where: Optional[Dict[str, Any]] = None):
+    """Yield (id, metadata) pairs for the collection in pages, without loading documents or embeddings."""
+    offset = 0
+    while True:
+        data = vectorstore.get(where=where, limit=COMMIT_BATCH_SIZE, offset=offset, include=["metadatas"])
+        for doc_id, metadata in zip(data["ids"], data["metadatas"]):
+            yield doc_id, metadata or {}
+        if len(data["ids"]) < COMMIT_BATCH_SIZE:
+            return
+        offset += COMMIT_BATCH_SIZE
+
+
+def list_documents(vectorstore: Chroma) -> List[Dict[str, Any]]:
+    """
+    Summarize indexed documents grouped by their source metadata.
+
+    Returns:
+        One entry per source with chunk count, page count, ingest time, extraction methods and tags
+    """
+
+    documents: Dict[str, Dict[str, Any]] = {}
+    for _, metadata in _iter_metadatas(vectorstore):
+        source = metadata.get("source", "")
+        entry = documents.setdefault(source, {
+            "source": source,
+            "file_hash": metadata.get("file_hash"),
+            "chunks": 0,
+            "pages": set(),
+            "ingested_at": metadata.get("ingested_at"),
+            "extraction_methods": set(),
+            "tags": set(),
+        })
+        entry["chunks"] += 1
+        if "page" in metadata:
+            entry["pages"].add(metadata["page"])
+        entry["tags"].update(tags_from_metadata(metadata))
+        if metadata.get("extraction_method"):
+            entry["extraction_methods"].add(metadata["extraction_method"])
+        if metadata.get("ingested_at") and (entry["ingested_at"] or "") < metadata["ingested_at"]:
+            entry["ingested_at"] = metadata["ingested_at"]
+            entry["file_hash"] = metadata.get("file_hash")
+
+    return [
+        {
+            **entry,
+            "pages": len(entry["pages"]),
+            "extraction_methods": sorted(entry["extraction_methods"]),
+            "tags": sorted(entry["tags"]),
+        }
+        for entry in sorted(documents.values(), key=lambda item: item["source"])
+    ]
+
+
+def _is_hash_referenced(vectorstore: Chroma, file_hash: str) -> bool:
+    """Whether any workspace collection still has chunks of a stored PDF (uploads are shared across workspaces)."""
+    for collection in vectorstore._client.list_collections():
+        name = getattr(collection, "name", collection)
+        if name.startswith(STAGING_PREFIX):
+            continue
+        if vectorstore._client.get_collection(name).get(where={"file_hash": file_hash}, limit=1, include=[])["ids"]:
+            return True
+    return False
+
+
+def delete_document(vectorstore: Chroma, source: str) -> int:
+    """
+    Delete every chunk whose source metadata matches, and the stored PDF once nothing references it.
+
+    Returns:
+        Number of chunks deleted (0 if the source is not indexed)
+    """
+
+    file_hashes = set()
+    ids = []
+    for doc_id, metadata in _iter_metadatas(vectorstore, where={"source": source}):
+        ids.append(doc_id)
+        if metadata.get("file_hash"):
+            file_hashes.add(metadata["file_hash"])
+
+    for start in range(0, len(ids), COMMIT_BATCH_SIZE):
+        vectorstore.delete(ids=ids[start:start + COMMIT_BATCH_SIZE])
+    lexical_index_for(vectorstore).delete(ids)
+    compact_index = compact_index_for(vectorstore)
+    if compact_index is not None:
+        compact_index.delete(ids)
+    if ids:
+        notify_commit(vectorstore._collection.name)
+
+    for file_hash in file_hashes:
+        stored_path = Path(UPLOAD_DIR) / f"{file_hash}.pdf"
+        if not _is_hash_referenced(vectorstore, file_hash) and stored_path.exists():
+            os.remove(stored_path)
+
+    return len(ids)
+
+
+def find_stored_upload(vectorstore: Chroma, source: str) -> Optional[StoredUpload]:
+    """Locate the stored PDF of the most recent ingest of a source, for re-indexing."""
+    latest = None
+    for _, metadata in _iter_metadatas(vectorstore, where={"source": source}):
+        if latest is None or (metadata.get("ingested_at") or "") > (latest.get("ingested_at") or ""):
+            latest = metadata
+
+    if latest is None or not latest.get("file_hash"):
+        return None
+
+    stored_path = Path(UPLOAD_DIR) / f"{latest['file_hash']}.pdf"
+    if not stored_path.exists():
+        return None
+    return StoredUpload(source, str(stored_path), latest["file_hash"])
+
+
+def find_document_tags(vectorstore: Chroma, source: str) -> Tuple[str, ...]:
+    """Tags of an indexed document, so re-indexing keeps them."""
+    metadatas = vectorstore.get(where={"source": source}, limit=1, include=["metadatas"])["metadatas"]
+    return tags_from_metadata(metadatas[0] or {}) if metadatas else ()
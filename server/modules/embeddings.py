@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from dotenv import load_dotenv
+import google.api_core.exceptions  # For catching rate limit errors
+from logger import logger
+
+load_dotenv()
+
+# Available embedding models in order of preference/fallback
+EMBEDDING_MODELS = [
+    "models/embedding-001",  # Stable embedding model
+    "models/text-embedding-004",  # Alternative if available
+    "models/gemini-embedding-exp-03-07"  # Experimental model (original)
+]
+
+# Seconds a model's health check stays valid before it is re-probed in the background
+EMBEDDING_HEALTH_TTL = int(os.environ.get("EMBEDDING_HEALTH_TTL", "300"))
+
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide cache of embedding clients and their health.
+
+    Each model is probed once; afterwards callers get the cached client immediately
+    and stale health checks are refreshed on a background thread.
+    """
+
+    def __init__(self, models: List[str], ttl: int):
+        self.models = models
+        self.ttl = ttl
+        self._clients: Dict[str, GoogleGenerativeAIEmbeddings] = {}
+        self._healthy: Dict[str, bool] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _probe(self, model_name: str) -> bool:
+        """Embed a short text with the model and record whether it is usable."""
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is not set")
+
+        client = self._clients.get(model_name) or GoogleGenerativeAIEmbeddings(
+            model=model_name,
+            google_api_key=api_key
+        )
+        try:
+            healthy = bool(client.embed_query("test"))
+            if healthy:
+                logger.info(f"Embedding model {model_name} is healthy")
+        except google.api_core.exceptions.ResourceExhausted as e:
+            # The model exists and the key works; batch-level backoff deals with the quota
+            logger.warning(f"Rate limit hit while probing {model_name}, keeping it selectable: {e}")
+            healthy = True
+        except Exception as e:
+            logger.error(f"Embedding model {model_name} is unavailable: {e}")
+            healthy = False
+
+        with self._lock:
+            self._clients[model_name] = client
+            self._healthy[model_name] = healthy
+            self._checked_at[model_name] = time.monotonic()
+        return healthy
+
+    def _refresh_in_background(self, model_name: str):
+        with self._lock:
+            if model_name in self._refreshing:
+                return
+            self._refreshing.add(model_name)
+
+        def refresh():
+            try:
+                self._probe(model_name)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(model_name)
+
+        threading.Thread(target=refresh, name=f"embedding-health-{model_name}", daemon=True).start()
+
+    def get_embeddings(self, required_model: Optional[str] = None) -> GoogleGenerativeAIEmbeddings:
+        """
+        Return a healthy embedding client, probing synchronously only for models never checked before.
+
+        Args:
+            required_model: Model the collection is pinned to. When given, no other model
+                is used, since vectors from different models are not comparable.
+
+        Returns:
+            GoogleGenerativeAIEmbeddings instance
+
+        Raises:
+            Exception: If no candidate model is healthy
+        """
+
+        candidates = [required_model] if required_model else self.models
+        for model_name in candidates:
+            with self._lock:
+                checked_at = self._checked_at.get(model_name)
+                healthy = self._healthy.get(model_name)
+            stale = checked_at is None or time.monotonic() - checked_at > self.ttl
+
+            if checked_at is not None and healthy:
+                if stale:
+                    self._refresh_in_background(model_name)
+                return self._clients[model_name]
+            if checked_at is not None and not stale:
+                continue  # Known to be unhealthy, skip without calling the API
+            if self._probe(model_name):
+                return self._clients[model_name]
+
+        if required_model:
+            raise Exception(
+                f"Embedding model {required_model} used by the existing vectorstore is unavailable. "
+                "Please check your API quota and try again later."
+            )
+        raise Exception("All embedding models failed. Please check your API quota and try again later.")
+
+    def status(self) -> Dict[str, Dict[str, object]]:
+        """Health of every model probed so far."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                model_name: {
+                    "healthy": self._healthy[model_name],
+                    "checked_seconds_ago": round(now - self._checked_at[model_name], 1),
+                }
+                for model_name in self._checked_at
+            }
+
+
+embedding_registry = EmbeddingModelRegistry(EMBEDDING_MODELS, EMBEDDING_HEALTH_TTL)
@@ -1,12 +1,94 @@
 import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List
+from typing import Callable, List, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import tempfile
 from PIL import Image
+from logger import logger
+from .metrics import observe_stage
+
+
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+# Number of Tesseract worker processes
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages rasterized at once by each worker; peak memory is roughly OCR_WORKERS * OCR_WINDOW_SIZE page images
+OCR_WINDOW_SIZE = int(os.environ.get("OCR_WINDOW_SIZE", "4"))
+# Pages with less extractable text than this are OCR'd
+OCR_MIN_PAGE_CHARS = int(os.environ.get("OCR_MIN_PAGE_CHARS", "50"))
+
+
+def _ocr_page_window(file_path: str, first_page: int, last_page: int, dpi: int) -> List[Tuple[str, float]]:
+    """
+    Rasterize pages first_page..last_page (1-indexed, inclusive) and OCR them. Runs in a worker process.
+
+    Returns (text, seconds) per page, where seconds includes the page's share of rasterization.
+    """
+    started = time.perf_counter()
+    images = convert_from_path(file_path, dpi=dpi, first_page=first_page, last_page=last_page)
+    rasterize_share = (time.perf_counter() - started) / max(len(images), 1)
+    pages = []
+    for image in images:
+        started = time.perf_counter()
+        text = pytesseract.image_to_string(image, lang='eng')
+        pages.append((text, rasterize_share + time.perf_counter() - started))
+        image.close()
+    return pages
+
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    The process pool shared by every OCR run, started on first use.
+
+    Workers are spawned (not forked) to avoid copying a process that already runs
+    gRPC and server threads. Spawned workers re-import this module before their
+    first page, so they are kept for the life of the server rather than per file.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=max(1, OCR_WORKERS), mp_context=multiprocessing.get_context("spawn"))
+        return _ocr_pool
+
+
+def _discard_ocr_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool (e.g. a worker was killed) so the next OCR run starts a fresh one."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_ocr_pool():
+    """Stop the OCR worker processes; called with the ingestion workers at shutdown."""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        pool, _ocr_pool = _ocr_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_windows(page_numbers: List[int], window_size: int) -> List[Tuple[int, int]]:
+    """Group sorted 1-indexed page numbers into contiguous (first, last) ranges of at most window_size pages."""
+    windows = []
+    for page_num in page_numbers:
+        if windows and page_num == windows[-1][1] + 1 and page_num - windows[-1][0] < window_size:
+            windows[-1] = (windows[-1][0], page_num)
+        else:
+            windows.append((page_num, page_num))
+    return windows
 
 
 class EnhancedPDFLoader:
@@ -15,68 +97,136 @@ class EnhancedPDFLoader:
     Uses PyPDFLoader for text extraction and OCR (Tesseract) for scanned documents.
     """
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, progress: Optional[Callable[[str, int, int], None]] = None):
         self.file_path = file_path
+        # Optional callback invoked as progress(stage, current, total)
+        self.progress = progress
+    
+    def _report(self, stage: str, current: int = 0, total: int = 0):
+        if self.progress:
+            self.progress(stage, current, total)
     
     def load(self) -> List[Document]:
-        """Load and extract text from PDF using text extraction and OCR fallback."""
+        """
+        Load and extract text from PDF, page by page.
+        
+        Pages with enough extractable text are taken from PyPDFLoader; only the
+        remaining pages are rasterized and OCR'd.
+        """
         
         # First, try standard text extraction
         try:
             loader = PyPDFLoader(self.file_path)
             docs = loader.load()
-            
-            # Check if we got meaningful text content
-            total_text_length = sum(len(doc.page_content.strip()) for doc in docs)
-            
-            if total_text_length > 50:  # If we have substantial text content
-                print(f"✓ Extracted text from PDF using standard method: {total_text_length} characters")
-                return docs
-            else:
-                print("⚠ Standard text extraction yielded minimal content, trying OCR...")
-                return self._load_with_ocr()
-                
         except Exception as e:
-            print(f"⚠ Standard text extraction failed: {e}, trying OCR...")
+            logger.warning(f"Standard text extraction failed: {e}, trying OCR...")
+            return self._load_with_ocr()
+        
+        text_pages = {}
+        ocr_page_numbers = []
+        for page_index, doc in enumerate(docs):
+            page = doc.metadata.get("page", page_index)
+            doc.metadata["extraction_method"] = "text"
+            text_pages[page] = doc
+            if len(doc.page_content.strip()) < OCR_MIN_PAGE_CHARS:
+                ocr_page_numbers.append(page + 1)
+        
+        if not docs:
+            logger.warning("Standard text extraction found no pages, trying OCR...")
             return self._load_with_ocr()
+        
+        if not ocr_page_numbers:
+            total_text_length = sum(len(doc.page_content.strip()) for doc in docs)
+            logger.info(f"Extracted text from PDF using standard method: {total_text_length} characters")
+            return docs
+        
+        logger.warning(f"{len(ocr_page_numbers)}/{len(docs)} pages have minimal text, running OCR on them...")
+        try:
+            ocr_docs = self._ocr_pages(ocr_page_numbers)
+        except Exception as e:
+            logger.error(f"OCR extraction failed: {e}, keeping text-extracted pages only")
+            ocr_docs = []
+        
+        # OCR'd pages replace their text-extracted versions; pages where OCR found nothing keep what text there was
+        for doc in ocr_docs:
+            text_pages[doc.metadata["page"]] = doc
+        
+        documents = [
+            doc for _, doc in sorted(text_pages.items())
+            if doc.page_content.strip()
+        ]
+        logger.info(f"Hybrid extraction completed: {len(documents) - len(ocr_docs)} text pages, {len(ocr_docs)} OCR pages")
+        return documents
     
-    def _load_with_ocr(self) -> List[Document]:
-        """Extract text using OCR (Optical Character Recognition)."""
+    def _ocr_pages(self, page_numbers: List[int]) -> List[Document]:
+        """
+        OCR the given 1-indexed pages, returning one document per page that produced text.
+        
+        Pages are rasterized in windows of up to OCR_WINDOW_SIZE contiguous pages inside
+        a pool of OCR_WORKERS processes, so only a few page images are in memory at a time.
+        """
         
+        windows = _page_windows(sorted(page_numbers), OCR_WINDOW_SIZE)
+        logger.info(f"Running OCR on {len(page_numbers)} pages with {OCR_WORKERS} workers...")
+        
+        documents = []
+        pages_done = 0
+        
+        pool = _get_ocr_pool()
+        futures = []
         try:
-            # Convert PDF pages to images
-            print("📄 Converting PDF pages to images...")
-            pages = convert_from_path(self.file_path, dpi=300)
-            
-            documents = []
+            futures = [
+                pool.submit(_ocr_page_window, self.file_path, first, last, OCR_DPI)
+                for first, last in windows
+            ]
             
-            for page_num, page_image in enumerate(pages, 1):
-                print(f"🔍 Processing page {page_num}/{len(pages)} with OCR...")
-                
-                # Use Tesseract to extract text from the image
-                text = pytesseract.image_to_string(page_image, lang='eng')
-                
-                # Create a document for this page
-                if text.strip():  # Only add if there's actual text
-                    doc = Document(
-                        page_content=text,
-                        metadata={
-                            "source": self.file_path,
-                            "page": page_num - 1,  # 0-indexed like PyPDFLoader
-                            "extraction_method": "ocr"
-                        }
-                    )
-                    documents.append(doc)
-                else:
-                    print(f"⚠ No text found on page {page_num}")
+            # Collect windows in submission order to preserve page order
+            for (first_page, _), future in zip(windows, futures):
+                for page_num, (text, seconds) in enumerate(future.result(), first_page):
+                    # Timed in the worker process; metrics live in this one
+                    observe_stage("ocr_page", seconds)
+                    pages_done += 1
+                    logger.debug(f"Processed page {page_num} ({pages_done}/{len(page_numbers)}) with OCR")
+                    self._report("ocr", pages_done, len(page_numbers))
+                    
+                    # Create a document for this page
+                    if text.strip():  # Only add if there's actual text
+                        doc = Document(
+                            page_content=text,
+                            metadata={
+                                "source": self.file_path,
+                                "page": page_num - 1,  # 0-indexed like PyPDFLoader
+                                "extraction_method": "ocr"
+                            }
+                        )
+                        documents.append(doc)
+                    else:
+                        logger.warning(f"No text found on page {page_num}")
+        except BrokenProcessPool:
+            _discard_ocr_pool(pool)
+            raise
+        except BaseException:
+            # The pool outlives this file; don't leave its remaining windows queued
+            for future in futures:
+                future.cancel()
+            raise
+        
+        return documents
+    
+    def _load_with_ocr(self) -> List[Document]:
+        """Extract text from every page using OCR (Optical Character Recognition)."""
+        
+        try:
+            page_count = pdfinfo_from_path(self.file_path)["Pages"]
+            documents = self._ocr_pages(list(range(1, page_count + 1)))
             
             total_text_length = sum(len(doc.page_content) for doc in documents)
-            print(f"✓ OCR extraction completed: {len(documents)} pages, {total_text_length} characters")
+            logger.info(f"OCR extraction completed: {len(documents)} pages, {total_text_length} characters")
             
             return documents
             
         except Exception as e:
-            print(f"❌ OCR extraction failed: {e}")
+            logger.error(f"OCR extraction failed: {e}")
             # Return empty document rather than failing completely
             return [Document(
                 page_content=f"Failed to extract text from {os.path.basename(self.file_path)}. Error: {str(e)}",
@@ -0,0 +1,166 @@
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from logger import logger, request_id_var
+from .load_vectorstore import index_stored_files, StoredUpload, COLLECTION_NAME
+from .enhanced_pdf_loader import shutdown_ocr_pool
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+MAX_TRACKED_JOBS = 200
+
+# Fraction of a file's progress reached when it enters each stage.
+# Stages with a (current, total) counter fill the gap up to the next stage.
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "saving": 0.02,
+    "extracting": 0.05,
+    "ocr": 0.1,
+    "splitting": 0.5,
+    "embedding": 0.55,
+    "done": 1.0,
+    "failed": 1.0,
+}
+STAGE_SPAN = {
+    "ocr": 0.4,
+    "embedding": 0.45,
+}
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def describe_ingest_error(error: Exception) -> Dict[str, str]:
+    """Turn an ingestion exception into the error payload reported to clients."""
+    error_msg = str(error)
+
+    if isinstance(error, ValueError):
+        return {
+            "error": f"Document processing error: {error_msg}",
+            "suggestion": "Please ensure your PDFs contain readable text or images with text."
+        }
+
+    if "429" in error_msg or "Resource has been exhausted" in error_msg or "rate limit" in error_msg.lower():
+        return {
+            "error": "Rate limit exceeded for Gemini API",
+            "message": "Please wait a few minutes before uploading more files. The system will automatically retry with alternative models.",
+            "suggestion": "Consider uploading fewer files at once or wait for the rate limit to reset."
+        }
+
+    if "api" in error_msg.lower() and ("key" in error_msg.lower() or "authentication" in error_msg.lower()):
+        return {
+            "error": "API authentication error",
+            "message": "There was an issue with the Gemini API configuration.",
+            "suggestion": "Please check that your GEMINI_API_KEY is properly configured."
+        }
+
+    return {
+        "error": f"An error occurred while processing the files: {error_msg}",
+        "suggestion": "Please try again. If the problem persists, check your files and API configuration."
+    }
+
+
+def create_job(filenames: List[str]) -> str:
+    """Register a new ingestion job for the given files and return its ID."""
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "created_at": _now(),
+        "updated_at": _now(),
+        "progress": 0.0,
+        "files": {
+            name: {"stage": "queued", "current": 0, "total": 0, "progress": 0.0}
+            for name in filenames
+        },
+    }
+
+    with _lock:
+        _jobs[job_id] = job
+        # Forget the oldest finished jobs once the registry is full
+        for old_id in list(_jobs.keys()):
+            if len(_jobs) <= MAX_TRACKED_JOBS:
+                break
+            if _jobs[old_id]["status"] in ("done", "failed"):
+                del _jobs[old_id]
+
+    return job_id
+
+
+def update_file_stage(job_id: str, filename: str, stage: str, current: int = 0, total: int = 0):
+    """Record the current stage of one file in a job."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+
+        file_progress = STAGE_PROGRESS.get(stage, 0.0)
+        if total and stage in STAGE_SPAN:
+            file_progress += STAGE_SPAN[stage] * min(current, total) / total
+
+        job["files"][filename] = {
+            "stage": stage,
+            "current": current,
+            "total": total,
+            "progress": round(file_progress, 3),
+        }
+        files = job["files"].values()
+        job["progress"] = round(sum(f["progress"] for f in files) / max(len(files), 1), 3)
+        job["updated_at"] = _now()
+
+
+def _set_status(job_id: str, status: str, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["status"] = status
+        job["updated_at"] = _now()
+        job.update(fields)
+
+
+def _run_job(job_id: str, stored_files: List[StoredUpload], replace: bool, collection_name: str, tags: Tuple[str, ...]):
+    request_id_var.set(job_id)  # Worker threads are reused; every record of this job carries its ID
+    _set_status(job_id, "running")
+    try:
+        index_stored_files(
+            stored_files,
+            progress=lambda filename, stage, current, total: update_file_stage(job_id, filename, stage, current, total),
+            replace=replace,
+            collection_name=collection_name,
+            tags=tags
+        )
+        _set_status(job_id, "done", progress=1.0)
+        logger.info(f"Ingestion job {job_id} completed")
+    except Exception as e:
+        logger.exception(f"Ingestion job {job_id} failed")
+        _set_status(job_id, "failed", **describe_ingest_error(e))
+
+
+def submit_job(job_id: str, stored_files: List[StoredUpload], replace: bool = False,
+               collection_name: str = COLLECTION_NAME, tags: Tuple[str, ...] = ()):
+    """Queue saved uploads for ingestion (or re-indexing, with replace=True) into a workspace's collection on the bounded worker pool."""
+    _executor.submit(_run_job, job_id, stored_files, replace, collection_name, tags)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Return a snapshot of a job's status, or None if the job is unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {**job, "files": {name: dict(info) for name, info in job["files"].items()}}
+
+
+def shutdown_workers():
+    """Stop accepting ingestion jobs; queued jobs are cancelled, running ones finish in the background."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+    shutdown_ocr_pool()
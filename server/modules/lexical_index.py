@@ -0,0 +1,346 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+from logger import logger
+
+LEXICAL_INDEX_DIR = "./chroma_store"  # Default when a vectorstore does not say where it persists
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # Reciprocal rank fusion constant
+HYBRID_FETCH_K = int(os.environ.get("HYBRID_FETCH_K", "20"))  # Candidates taken from each retriever before fusion
+REBUILD_PAGE_SIZE = 5000
+
+# Words, numbers and identifiers such as "E-1042", "4.2.1" or "AB_12/7" (kept whole and also split into parts)
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+IDENTIFIER_SEPARATORS = re.compile(r"[-_./:]")
+# Numbers, decimals, ordinals and short units, which contain digits but name nothing
+NUMBER_LIKE_RE = re.compile(r"\d+(?:\.\d+)?[a-z]{0,2}")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what when "
+    "where which who why will with does do did can".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text; compound identifiers yield both the whole token and its parts."""
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        parts = [part for part in IDENTIFIER_SEPARATORS.split(token) if part]
+        if len(parts) > 1:
+            tokens.append(token)
+        tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    """
+    Whether a lowercased token is a part number, clause ID or error code ("e-1042", "4.2.1", "ab12", "v2").
+
+    It must mix digits with letters or separators; plain counts and measurements
+    ("3", "2024", "2.5", "3rd", "10x") are ordinary words.
+    """
+    if not any(ch.isdigit() for ch in token) or NUMBER_LIKE_RE.fullmatch(token):
+        return False
+    return any(ch.isalpha() for ch in token) or bool(IDENTIFIER_SEPARATORS.search(token))
+
+
+def identifier_terms(text: str) -> List[str]:
+    """Query terms that look like part numbers, clause IDs or error codes."""
+    return [token for token in (match.group(0) for match in TOKEN_RE.finditer(text.lower())) if is_identifier(token)]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index of a collection's chunks, persisted in SQLite and updated incrementally.
+
+    Chunks are stored under the same IDs as in Chroma, so additions and
+    deletions can be mirrored one-to-one and hits fused with vector results.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._stats: Optional[Tuple[int, float]] = None
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER NOT NULL, "
+                "document TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+                "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+
+    def _delete_locked(self, ids: Sequence[str]):
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", batch)
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Optional[Dict[str, Any]]]):
+        """Index chunks, replacing any already indexed under the same IDs."""
+        rows, postings = [], []
+        for doc_id, text, metadata in zip(ids, documents, metadatas):
+            terms = Counter(tokenize(text or ""))
+            rows.append((doc_id, sum(terms.values()), text or "", json.dumps(metadata or {})))
+            postings.extend((term, doc_id, tf) for term, tf in terms.items())
+
+        with self._lock, self._conn:
+            self._delete_locked(ids)
+            self._conn.executemany("INSERT INTO docs (id, length, document, metadata) VALUES (?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", postings)
+            self._stats = None
+
+    def delete(self, ids: Sequence[str]):
+        with self._lock, self._conn:
+            self._delete_locked(ids)
+            self._stats = None
+
+    def count(self) -> int:
+        return self._get_stats()[0]
+
+    def _get_stats(self) -> Tuple[int, float]:
+        with self._lock:
+            if self._stats is None:
+                count, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+                self._stats = (count, avg_length or 0.0)
+            return self._stats
+
+    def search(self, query: str, k: int = 5,
+               where: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Tuple[Document, float]]:
+        """Return up to k (document, BM25 score) pairs, best first, keeping only chunks whose metadata passes where."""
+        terms = set(tokenize(query))
+        total, avg_length = self._get_stats()
+        if not terms or not total:
+            return []
+
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+            results = []
+            for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                document, metadata = self._conn.execute(
+                    "SELECT document, metadata FROM docs WHERE id = ?", (doc_id,)
+                ).fetchone()
+                metadata = json.loads(metadata)
+                if where is not None and not where(metadata):
+                    continue
+                results.append((Document(id=doc_id, page_content=document, metadata=metadata), score))
+                if len(results) >= k:
+                    break
+        return results
+
+    def rebuild_from(self, vectorstore) -> int:
+        """Index every chunk of a Chroma collection (used once for collections created before the index existed)."""
+        indexed = 0
+        offset = 0
+        while True:
+            data = vectorstore._collection.get(limit=REBUILD_PAGE_SIZE, offset=offset, include=["documents", "metadatas"])
+            if data["ids"]:
+                self.add(data["ids"], data["documents"], data["metadatas"])
+                indexed += len(data["ids"])
+            if len(data["ids"]) < REBUILD_PAGE_SIZE:
+                return indexed
+            offset += REBUILD_PAGE_SIZE
+
+
+_indexes: Dict[Tuple[str, str], LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(collection_name: str, directory: str = LEXICAL_INDEX_DIR) -> LexicalIndex:
+    """Return the process-wide lexical index of a collection, stored next to its Chroma data."""
+    key = (os.path.abspath(directory), collection_name)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = LexicalIndex(os.path.join(directory, f"lexical_{collection_name}.sqlite3"))
+        return _indexes[key]
+
+
+def lexical_index_for(vectorstore) -> LexicalIndex:
+    """The lexical index of a Chroma vectorstore's collection."""
+    directory = getattr(vectorstore, "_persist_directory", None) or LEXICAL_INDEX_DIR
+    return get_lexical_index(vectorstore._collection.name, directory)
+
+
+def ensure_lexical_index(vectorstore) -> LexicalIndex:
+    """Return the collection's lexical index, backfilling it from Chroma if it is empty but the collection is not."""
+    index = lexical_index_for(vectorstore)
+    if index.count() == 0 and vectorstore._collection.count() > 0:
+        indexed = index.rebuild_from(vectorstore)
+        logger.info(f"Built lexical index for {vectorstore._collection.name} ({indexed} chunks)")
+    return index
+
+
+def _doc_key(doc: Document):
+    # Chunk IDs are derived from (source, text), so this identifies a chunk whichever retriever found it
+    return doc.metadata.get("source", ""), doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int) -> List[Document]:
+    """Merge ranked lists by summing 1 / (RRF_K + rank) per document, recorded as its "retrieval_score"."""
+    scores: Dict[Any, float] = {}
+    docs: Dict[Any, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            docs.setdefault(key, doc)
+    fused = []
+    for key, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]:
+        docs[key].metadata["retrieval_score"] = score
+        fused.append(docs[key])
+    return fused
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses BM25 hits from the lexical index with Chroma similarity hits by reciprocal rank fusion.
+
+    When the question names identifiers (part numbers, clause IDs, error codes) and
+    lexical hits contain all of them, those hits are returned directly and the
+    question is never embedded. Every returned chunk carries its "retrieval_score".
+    A DocumentScope restricts both searches to the chosen sources or tags. With a
+    compact vector index, vector search scans it instead of Chroma's HNSW index.
+    """
+
+    vectorstore: Any
+    lexical_index: Any
+    compact_index: Optional[Any] = None
+    k: int = 5
+    fetch_k: int = HYBRID_FETCH_K
+    scope: Optional[Any] = None
+    query_embedding: Optional[List[float]] = None
+
+    def scoped(self, scope) -> "HybridRetriever":
+        """A copy of this retriever restricted to a DocumentScope (returns self for an empty scope)."""
+        if scope is None or scope.is_empty():
+            return self
+        return self.model_copy(update={"scope": scope})
+
+    def with_query_embedding(self, embedding: Optional[List[float]]) -> "HybridRetriever":
+        """A copy of this retriever that searches with an already computed question embedding (self if None)."""
+        if embedding is None:
+            return self
+        return self.model_copy(update={"query_embedding": embedding})
+
+    def _lexical_search(self, query: str) -> List[Tuple[Document, float]]:
+        where = self.scope.matches if self.scope is not None else None
+        return self.lexical_index.search(query, k=self.fetch_k, where=where)
+
+    def _vector_filter(self) -> Optional[Dict[str, Any]]:
+        return self.scope.chroma_where() if self.scope is not None else None
+
+    def _compact_search(self, embedding: List[float]) -> List[Document]:
+        """Vector hits from the compact index, with text and metadata read from Chroma."""
+        where = self._vector_filter()
+        allowed = set(self.vectorstore._collection.get(where=where, include=[])["ids"]) if where else None
+        hits = self.compact_index.search(embedding, k=self.fetch_k, allowed_ids=allowed)
+        if not hits:
+            return []
+        data = self.vectorstore._collection.get(ids=[doc_id for doc_id, _ in hits], include=["documents", "metadatas"])
+        found = {
+            doc_id: Document(id=doc_id, page_content=text, metadata=metadata or {})
+            for doc_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+        }
+        return [found[doc_id] for doc_id, _ in hits if doc_id in found]
+
+    def _vector_search(self, query: str) -> List[Document]:
+        embedding = self.query_embedding
+        if self.compact_index is not None:
+            return self._compact_search(embedding or self.vectorstore.embeddings.embed_query(query))
+        if embedding is not None:
+            return self.vectorstore.similarity_search_by_vector(embedding, k=self.fetch_k, filter=self._vector_filter())
+        return self.vectorstore.similarity_search(query, k=self.fetch_k, filter=self._vector_filter())
+
+    async def _avector_search(self, query: str) -> List[Document]:
+        embedding = self.query_embedding
+        if self.compact_index is not None:
+            embedding = embedding or await self.vectorstore.embeddings.aembed_query(query)
+            return await run_in_executor(None, self._compact_search, embedding)
+        if embedding is not None:
+            return await self.vectorstore.asimilarity_search_by_vector(embedding, k=self.fetch_k, filter=self._vector_filter())
+        return await self.vectorstore.asimilarity_search(query, k=self.fetch_k, filter=self._vector_filter())
+
+    def _exact_matches(self, query: str, lexical_hits: List[Tuple[Document, float]]) -> List[Document]:
+        identifiers = identifier_terms(query)
+        if not identifiers:
+            return []
+        exact = []
+        for doc, score in lexical_hits:
+            # Whole tokens only: "e-104" must not match a chunk about "E-1042"
+            if set(identifiers) <= set(tokenize(doc.page_content)):
+                doc.metadata["retrieval_score"] = score
+                exact.append(doc)
+        return exact[:self.k]
+
+    def retrieve_batch(self, queries: List[str], embeddings: List[List[float]]) -> List[List[Document]]:
+        """
+        Retrieve for many questions at once from their precomputed embeddings.
+
+        Questions that need vector search go to Chroma in a single query call.
+        """
+        lexical_hits = [self._lexical_search(query) for query in queries]
+        results: List[Optional[List[Document]]] = [self._exact_matches(query, hits) or None for query, hits in zip(queries, lexical_hits)]
+        pending = [i for i, docs in enumerate(results) if docs is None]
+        if pending and self.compact_index is not None:
+            for i in pending:
+                results[i] = reciprocal_rank_fusion(
+                    [self._compact_search(embeddings[i]), [doc for doc, _ in lexical_hits[i]]], self.k
+                )
+        elif pending:
+            data = self.vectorstore._collection.query(
+                query_embeddings=[embeddings[i] for i in pending],
+                n_results=self.fetch_k,
+                where=self._vector_filter(),
+                include=["documents", "metadatas"]
+            )
+            for row, i in enumerate(pending):
+                vector_docs = [
+                    Document(id=doc_id, page_content=text, metadata=metadata or {})
+                    for doc_id, text, metadata in zip(data["ids"][row], data["documents"][row], data["metadatas"][row])
+                ]
+                results[i] = reciprocal_rank_fusion([vector_docs, [doc for doc, _ in lexical_hits[i]]], self.k)
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical_hits = self._lexical_search(query)
+        exact = self._exact_matches(query, lexical_hits)
+        if exact:
+            return exact
+        vector_docs = self._vector_search(query)
+        return reciprocal_rank_fusion([vector_docs, [doc for doc, _ in lexical_hits]], self.k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        lexical_hits = await run_in_executor(None, self._lexical_search, query)
+        exact = self._exact_matches(query, lexical_hits)
+        if exact:
+            return exact
+        vector_docs = await self._avector_search(query)
+        return reciprocal_rank_fusion([vector_docs, [doc for doc, _ in lexical_hits]], self.k)
@@ -2,14 +2,22 @@ import os
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import RetrievalQA
-from typing import Optional, Tuple, Dict, Any
-import time
-import google.api_core.exceptions # For catching rate limit errors
+from typing import Optional, Tuple, Dict, Any, List
+from collections import OrderedDict
+from functools import lru_cache
+import threading
+from logger import logger
+from .circuit_breaker import BreakerRegistry
+from .lexical_index import HybridRetriever, lexical_index_for
+from .compact_vectors import compact_index_for
 
 load_dotenv()
 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
+# Number of (model, temperature) LLM clients and chains kept alive for reuse
+LLM_CACHE_SIZE = int(os.environ.get("LLM_CACHE_SIZE", "16"))
+
 # Latest Gemini models with their capabilities and priority (lower is higher)
 AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
     "gemini-2.5-pro": { # Corrected model name
@@ -17,6 +25,7 @@ AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
         "description": "Next-generation model with highest quota and latest features",
         "temperature_range": (0.0, 2.0),
         "max_tokens": 8192,
+        "context_token_budget": 4000, # Retrieved context packed into each prompt
         "best_for": ["complex_reasoning", "coding", "multimodal", "high_volume"],
         "performance": "🚀 Top Tier",
         "release": "2025-06",
@@ -27,6 +36,7 @@ AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
         "description": "Latest stable version of Gemini 1.5 Pro with improved capabilities",
         "temperature_range": (0.0, 2.0),
         "max_tokens": 8192,
+        "context_token_budget": 4000,
         "best_for": ["general", "reliable", "production"],
         "performance": "🛡️ Most Stable",
         "release": "2024-12",
@@ -37,6 +47,7 @@ AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
         "description": "Latest stable version of Gemini 1.5 Flash with enhanced speed",
         "temperature_range": (0.0, 2.0),
         "max_tokens": 8192,
+        "context_token_budget": 2500,
         "best_for": ["speed", "efficiency", "quick_tasks"],
         "performance": "⚡ Speed Optimized",
         "release": "2025-06",
@@ -47,6 +58,7 @@ AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
         "description": "Stable high-performance model with proven reliability",
         "temperature_range": (0.0, 2.0),
         "max_tokens": 8192,
+        "context_token_budget": 2500,
         "best_for": ["general", "reliable", "production"],
         "performance": "🛡️ Stable",
         "release": "2024-12",
@@ -57,13 +69,17 @@ AVAILABLE_MODELS: Dict[str, Dict[str, Any]] = {
 # Sorted model list by priority for fallback
 SORTED_MODELS_BY_PRIORITY = sorted(AVAILABLE_MODELS.items(), key=lambda item: item[1]["priority"])
 
+def clamp_temperature(model_name: str, temperature: float) -> float:
+    """Clamp a temperature to the model's supported range, rounded so near-identical values share a cache entry."""
+    min_temp, max_temp = AVAILABLE_MODELS[model_name]["temperature_range"]
+    return round(max(min_temp, min(max_temp, temperature)), 2)
+
 def get_llm_instance(model_name: str, temperature: float) -> ChatGoogleGenerativeAI:
     """Helper function to create an LLM instance."""
     model_info = AVAILABLE_MODELS[model_name]
-    min_temp, max_temp = model_info["temperature_range"]
-    actual_temperature = max(min_temp, min(max_temp, temperature))
+    actual_temperature = clamp_temperature(model_name, temperature)
 
-    print(f"🤖 Attempting to use {model_info['name']} (temperature: {actual_temperature})")
+    logger.info(f"Creating {model_info['name']} client (temperature: {actual_temperature})")
     
     return ChatGoogleGenerativeAI(
         google_api_key=GEMINI_API_KEY,
@@ -72,91 +88,104 @@ def get_llm_instance(model_name: str, temperature: float) -> ChatGoogleGenerativ
         max_tokens=model_info["max_tokens"],
         top_p=0.8,
         top_k=40,
+        max_retries=1, # Fail fast on rate limits; the circuit breakers fall back to another model instead
+    )
+
+def build_retriever(vectorstore) -> HybridRetriever:
+    """Hybrid retriever over the vectorstore: BM25 and vector hits fused; questions naming exact identifiers skip the embedding call."""
+    return HybridRetriever(
+        vectorstore=vectorstore,
+        lexical_index=lexical_index_for(vectorstore),
+        compact_index=compact_index_for(vectorstore),
+        k=5
     )
 
-def get_llm_chain(vectorstore, model_name: Optional[str] = None, temperature: float = 0.1, retry_count: int = 0) -> Tuple[Optional[RetrievalQA], Optional[str]]:
+def build_chain(llm: ChatGoogleGenerativeAI, vectorstore) -> RetrievalQA:
+    """Build a "stuff" RetrievalQA chain over the vectorstore (with hybrid retrieval) and the custom prompt."""
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=build_retriever(vectorstore),
+        return_source_documents=True,
+        chain_type_kwargs={"prompt": get_custom_prompt_template()}
+    )
+
+
+class ChainRegistry:
     """
-    Create LLM chain with specified model, enhanced precision, and rate limit fallback.
-    
-    Args:
-        vectorstore: The vector store for retrieval
-        model_name: Gemini model to use (defaults to highest priority)
-        temperature: Temperature for response generation
-        retry_count: Internal counter for retries to prevent infinite loops
-        
-    Returns:
-        A tuple containing the RetrievalQA chain and the name of the model used, or (None, None) if all fail.
+    Bounded LRU cache of LLM clients and RetrievalQA chains keyed by (model, clamped temperature).
+
+    A cached chain is rebuilt around the same LLM client when the shared vectorstore
+    handle has been swapped, so clients survive ingestion and only retrieval and
+    generation run per question.
     """
-    
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[Tuple[str, float], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_chain(self, vectorstore, model_name: str, temperature: float) -> RetrievalQA:
+        """Return the cached chain for the model and temperature, creating it (or its LLM client) if needed."""
+        key = (model_name, clamp_temperature(model_name, temperature))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry["vectorstore"] is vectorstore:
+                    return entry["chain"]
+                llm = entry["llm"]
+            else:
+                llm = None
+
+        # Construct outside the lock; a concurrent miss for the same key just builds a duplicate
+        if llm is None:
+            llm = get_llm_instance(model_name, temperature)
+        chain = build_chain(llm, vectorstore)
+
+        with self._lock:
+            self._entries[key] = {"llm": llm, "chain": chain, "vectorstore": vectorstore}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.info(f"Evicted cached chain for {evicted[0]} (temperature: {evicted[1]})")
+        return chain
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+chain_registry = ChainRegistry(LLM_CACHE_SIZE)
+model_breakers = BreakerRegistry(AVAILABLE_MODELS)
+
+def get_models_to_try(model_name: Optional[str]) -> List[str]:
+    """The requested (or default) model first, then every other model by priority."""
     if model_name is None:
         # Default to the highest priority model if none is specified
         model_name = SORTED_MODELS_BY_PRIORITY[0][0]
     
     # Validate model if a specific one is requested
     if model_name not in AVAILABLE_MODELS:
-        print(f"⚠️ Model {model_name} not found. Falling back to highest priority: {SORTED_MODELS_BY_PRIORITY[0][0]}")
+        logger.warning(f"Model {model_name} not found. Falling back to highest priority: {SORTED_MODELS_BY_PRIORITY[0][0]}")
         model_name = SORTED_MODELS_BY_PRIORITY[0][0]
 
-    current_model_index = -1
-    for i, (m_name, _) in enumerate(SORTED_MODELS_BY_PRIORITY):
-        if m_name == model_name:
-            current_model_index = i
-            break
-    
-    if current_model_index == -1: # Should not happen if model_name is validated
-        print(f"Error: Could not find {model_name} in sorted list. Using highest priority.")
-        current_model_index = 0
-        model_name = SORTED_MODELS_BY_PRIORITY[0][0]
+    current_model_index = [m_name for m_name, _ in SORTED_MODELS_BY_PRIORITY].index(model_name)
 
     # Iterate through models starting from the requested/default one, then by priority on error
-    models_to_try = [m[0] for m in SORTED_MODELS_BY_PRIORITY[current_model_index:]] + \
-                    [m[0] for m in SORTED_MODELS_BY_PRIORITY[:current_model_index]]
-
-
-    for attempt_model_name in models_to_try:
-        if retry_count >= len(AVAILABLE_MODELS) * 2: # Limit total retries to avoid deep loops
-            print("❌ Maximum retry attempts reached. Aborting.")
-            return None, None
-
-        try:
-            llm = get_llm_instance(attempt_model_name, temperature)
-            
-            retriever = vectorstore.as_retriever(
-                search_kwargs={"k": 5}
-            )
-            
-            chain = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=retriever,
-                return_source_documents=True,
-                chain_type_kwargs={"prompt": get_custom_prompt_template()}
-            )
-            print(f"✅ Successfully created chain with {AVAILABLE_MODELS[attempt_model_name]['name']}")
-            return chain, attempt_model_name
-
-        except google.api_core.exceptions.ResourceExhausted as e:
-            print(f"Rate limit hit for {AVAILABLE_MODELS[attempt_model_name]['name']}: {e}")
-            retry_delay = 5 # Default retry delay
-            if e.retry and hasattr(e.retry, 'delay'): # Check if retry info is available
-                 retry_delay = e.retry.delay.total_seconds() if hasattr(e.retry.delay, 'total_seconds') else 5
-            
-            print(f"⏳ Retrying with next available model after {retry_delay} seconds...")
-            time.sleep(retry_delay)
-            # The loop will try the next model. We increment retry_count here.
-            # No recursive call needed, the loop handles fallback.
-        
-        except Exception as e:
-            print(f"❌ Error creating LLM chain with {AVAILABLE_MODELS[attempt_model_name]['name']}: {e}")
-            # For other errors, also try the next model
-            print("⏳ Trying next available model...")
-            # No sleep for general errors, just try next model quickly.
-
-    print("❌ All models failed after trying. No chain created.")
-    return None, None
+    return [m[0] for m in SORTED_MODELS_BY_PRIORITY[current_model_index:]] + \
+           [m[0] for m in SORTED_MODELS_BY_PRIORITY[:current_model_index]]
+
+def first_available_model(model_name: Optional[str] = None) -> Optional[str]:
+    """The model a question would be answered with right now: the first candidate whose breaker is not open."""
+    for candidate in get_models_to_try(model_name):
+        if model_breakers.get(candidate).available():
+            return candidate
+    return None
 
+@lru_cache(maxsize=None)
 def get_custom_prompt_template():
-    """Enhanced prompt template for better precision and accuracy."""
+    """Enhanced prompt template for better precision and accuracy (built once and shared by all chains)."""
     from langchain.prompts import PromptTemplate
     
     template = """You are an intelligent assistant that answers questions based on the provided context with high precision and accuracy.
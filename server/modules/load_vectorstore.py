@@ -1,172 +1,525 @@
 import os
 import time
+import hashlib
+import tempfile
+import threading
+import uuid
+import json
+import contextvars
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
+from logger import logger
 from .enhanced_pdf_loader import EnhancedPDFLoader
+from .embeddings import EMBEDDING_MODELS, embedding_registry
+from .lexical_index import lexical_index_for
+from .compact_vectors import compact_index_for
+from .shards import open_vectorstore, partition_for_ingest
+from .metrics import RATE_LIMIT_HITS, observe_stage, stage_timer
+from .workspaces import DEFAULT_COLLECTION, tag_metadata
 import google.api_core.exceptions  # For catching rate limit errors
-from typing import List
+from typing import Callable, List, NamedTuple, Optional, Tuple
 
 load_dotenv()
 
 
 
 PERSIST_DIR="./chroma_store"
+COLLECTION_NAME=DEFAULT_COLLECTION  # Collection of the default workspace
+STAGING_PREFIX="staging-"
+COMMIT_BATCH_SIZE=5000  # Below Chroma's default SQLite max batch size
 UPLOAD_DIR="./uploaded_pdfs"
+EMBEDDING_CACHE_DIR="./embedding_cache"
+EMBED_BATCH_SIZE=100
+EMBED_MIN_BATCH_SIZE=8
+EMBED_MAX_BATCH_SIZE=250
+UPLOAD_CHUNK_SIZE=1024 * 1024
+MAX_UPLOAD_BYTES=int(os.environ.get("MAX_UPLOAD_MB", "200")) * 1024 * 1024
 os.makedirs(UPLOAD_DIR,exist_ok=True)
 
-# Available embedding models in order of preference/fallback
-EMBEDDING_MODELS = [
-    "models/embedding-001",  # Stable embedding model
-    "models/text-embedding-004",  # Alternative if available
-    "models/gemini-embedding-exp-03-07"  # Experimental model (original)
-]
+# Called as progress(filename, stage, current, total) while files are ingested
+ProgressCallback = Callable[[str, str, int, int], None]
 
-def create_embeddings_with_retry(api_key: str, max_retries: int = 3) -> GoogleGenerativeAIEmbeddings:
+class UploadTooLargeError(ValueError):
+    """Raised when an uploaded file exceeds MAX_UPLOAD_BYTES."""
+
+class StoredUpload(NamedTuple):
+    """An uploaded file saved under UPLOAD_DIR by content hash."""
+    filename: str
+    path: str
+    file_hash: str
+
+# Called as listener(collection_name) whenever ingestion changes a live collection
+_commit_listeners: List[Callable[[str], None]] = []
+
+def add_commit_listener(listener: Callable[[str], None]):
+    """Register a callback to run after new data is committed to (or removed from) a collection."""
+    _commit_listeners.append(listener)
+
+def notify_commit(collection_name: str = COLLECTION_NAME):
+    """Tell commit listeners that a collection changed."""
+    for listener in _commit_listeners:
+        try:
+            listener(collection_name)
+        except Exception as e:
+            logger.warning(f"Commit listener failed: {e}")
+
+EMBEDDING_PIN_FILE=os.path.join(PERSIST_DIR, "embedding_models.json")
+_pin_lock = threading.Lock()
+
+def get_pinned_embedding_model(collection_name: str = COLLECTION_NAME) -> Optional[str]:
+    """Return the embedding model a collection was built with, or None for a collection that has none yet."""
+    with _pin_lock:
+        if not os.path.exists(EMBEDDING_PIN_FILE):
+            return None
+        with open(EMBEDDING_PIN_FILE) as f:
+            return json.load(f).get(collection_name)
+
+def pin_embedding_model(model_name: str, collection_name: str = COLLECTION_NAME):
+    """Record the embedding model used for a collection so later uploads and queries stay in the same vector space."""
+    with _pin_lock:
+        pins = {}
+        if os.path.exists(EMBEDDING_PIN_FILE):
+            with open(EMBEDDING_PIN_FILE) as f:
+                pins = json.load(f)
+        pins[collection_name] = model_name
+        os.makedirs(PERSIST_DIR, exist_ok=True)
+        with open(EMBEDDING_PIN_FILE, "w") as f:
+            json.dump(pins, f, indent=2)
+
+def get_collection_embeddings(collection_name: str = COLLECTION_NAME) -> GoogleGenerativeAIEmbeddings:
     """
-    Create embeddings with retry logic and model fallback for rate limits.
+    Return the cached embedding client for a collection, pinning the model on first use.
+    
+    Collections indexed before pinning existed were always queried with the first
+    entry of EMBEDDING_MODELS, so that model is pinned for them.
+    
+    Raises:
+        Exception: If the pinned model (or, for a new collection, every model) is unavailable
+    """
+    
+    pinned = get_pinned_embedding_model(collection_name)
+    if pinned is None:
+        existing = open_vectorstore(collection_name, PERSIST_DIR)
+        if existing._collection.count() > 0:
+            pinned = EMBEDDING_MODELS[0]
+            pin_embedding_model(pinned, collection_name)
+    
+    embeddings = embedding_registry.get_embeddings(required_model=pinned)
+    if pinned is None:
+        pin_embedding_model(embeddings.model, collection_name)
+        logger.info(f"Pinned embedding model {embeddings.model} for collection {collection_name}")
+    return embeddings
+
+def create_cached_embeddings(embeddings: GoogleGenerativeAIEmbeddings) -> CacheBackedEmbeddings:
+    """
+    Wrap embeddings in a persistent cache keyed by (embedding model, chunk text hash).
+    
+    Only chunks that were never embedded with this model reach the Gemini API;
+    everything else is served from EMBEDDING_CACHE_DIR.
     
     Args:
-        api_key: Gemini API key
-        max_retries: Maximum number of retry attempts per model
+        embeddings: Embeddings instance returned by get_collection_embeddings
     
     Returns:
-        GoogleGenerativeAIEmbeddings instance
+        CacheBackedEmbeddings instance wrapping the given embeddings
+    """
     
-    Raises:
-        Exception: If all models and retries are exhausted
+    store = LocalFileStore(EMBEDDING_CACHE_DIR)
+    return CacheBackedEmbeddings.from_bytes_store(
+        embeddings,
+        store,
+        namespace=embeddings.model
+    )
+
+class UploadWriter:
     """
+    Write one upload to disk as its bytes arrive, hashing it on the way.
+    
+    Bytes go to a temporary file in UPLOAD_DIR that finish() renames to the
+    content hash, so an upload is written once and never held in memory.
+    MAX_UPLOAD_BYTES is enforced on every write, before the rest of the file is read.
+    """
+    
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self._started = time.perf_counter()
+        self._hasher = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
     
-    for model_name in EMBEDDING_MODELS:
-        print(f"🔄 Attempting to use embedding model: {model_name}")
+    def write(self, chunk: bytes):
+        """
+        Append a chunk of the upload.
         
-        for attempt in range(max_retries):
-            try:
-                embeddings = GoogleGenerativeAIEmbeddings(
-                    model=model_name,
-                    google_api_key=api_key
-                )
-                
-                # Test the embedding with a small text to verify it works
-                test_result = embeddings.embed_query("test")
-                if test_result:
-                    print(f"✅ Successfully initialized embedding model: {model_name}")
-                    return embeddings
-                    
-            except google.api_core.exceptions.ResourceExhausted as e:
-                retry_delay = min(2 ** attempt, 30)  # Exponential backoff, max 30 seconds
-                print(f"⚠️ Rate limit hit for {model_name} (attempt {attempt + 1}/{max_retries}): {e}")
-                
-                if attempt < max_retries - 1:
-                    print(f"⏳ Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    print(f"❌ Max retries reached for {model_name}, trying next model...")
-                    break
-                    
-            except Exception as e:
-                print(f"❌ Error with embedding model {model_name} (attempt {attempt + 1}/{max_retries}): {e}")
-                
-                if attempt < max_retries - 1:
-                    retry_delay = min(2 ** attempt, 10)  # Shorter delay for general errors
-                    print(f"⏳ Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    print(f"❌ Max retries reached for {model_name}, trying next model...")
-                    break
+        Raises:
+            UploadTooLargeError: If the upload grows beyond MAX_UPLOAD_BYTES
+        """
+        self.size += len(chunk)
+        if self.size > MAX_UPLOAD_BYTES:
+            raise UploadTooLargeError(
+                f"{self.filename} exceeds the maximum upload size of {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+            )
+        self._hasher.update(chunk)
+        self._file.write(chunk)
     
-    raise Exception("All embedding models failed after multiple retries. Please check your API quota and try again later.")
+    def close(self):
+        """Finish writing the upload without publishing it yet (finish() or discard() decides its fate)."""
+        self._file.close()
+    
+    def finish(self) -> StoredUpload:
+        """Move the complete upload to its content-hash path (or drop it if identical content is stored)."""
+        self.close()
+        file_hash = self._hasher.hexdigest()
+        save_path = Path(UPLOAD_DIR) / f"{file_hash}.pdf"
+        try:
+            if save_path.exists():
+                logger.info(f"{self.filename} already stored as {save_path.name}")
+                os.remove(self._tmp_path)
+            else:
+                os.replace(self._tmp_path, save_path)
+        except BaseException:
+            self.discard()
+            raise
+        observe_stage("save", time.perf_counter() - self._started)
+        return StoredUpload(self.filename, str(save_path), file_hash)
+    
+    def discard(self):
+        """Remove the partial (or closed but unpublished) upload after a failure."""
+        self.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
 
-def add_documents_with_retry(vectorstore: Chroma, texts: List, max_retries: int = 3):
+def save_upload(file) -> StoredUpload:
     """
-    Add documents to vectorstore with retry logic for rate limits.
+    Save an uploaded file object under its content hash.
+    
+    The file is copied to disk in UPLOAD_CHUNK_SIZE pieces while it is hashed,
+    so memory use does not depend on the file size.
+    
+    Args:
+        file: Uploaded file object
+    
+    Returns:
+        StoredUpload with the original filename, saved path and sha256 hex digest
+    
+    Raises:
+        UploadTooLargeError: If the file is larger than MAX_UPLOAD_BYTES
+    """
+    
+    writer = UploadWriter(file.filename)
+    try:
+        while True:
+            chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.finish()
+
+def chunk_id(source: str, text: str) -> str:
+    """Deterministic vectorstore ID for a chunk of text from the given source document."""
+    return hashlib.sha256(f"{source}\n{text}".encode("utf-8")).hexdigest()
+
+def filter_indexed_chunks(vectorstore: Chroma, texts: List, ids: List[str]) -> Tuple[List, List[str]]:
+    """
+    Drop chunks whose IDs are already present in the vectorstore (or repeated within the batch).
+    
+    Args:
+        vectorstore: Chroma vectorstore instance
+        texts: List of chunked documents
+        ids: Chunk IDs matching texts
+    
+    Returns:
+        A tuple of (new documents, their IDs)
+    """
+    
+    existing = set(vectorstore.get(ids=ids, include=[])["ids"]) if ids else set()
+    new_texts, new_ids = [], []
+    for text, doc_id in zip(texts, ids):
+        if doc_id in existing:
+            continue
+        existing.add(doc_id)
+        new_texts.append(text)
+        new_ids.append(doc_id)
+    return new_texts, new_ids
+
+def is_file_indexed(vectorstore: Chroma, file_hash: str) -> bool:
+    """Return True if chunks from a file with this content hash are already in the vectorstore."""
+    return bool(vectorstore.get(where={"file_hash": file_hash}, limit=1, include=[])["ids"])
+
+def retry_after_seconds(error: Exception, default: float) -> float:
+    """Return the retry delay suggested by a Google API error, or default if it has none."""
+    for detail in getattr(error, "details", None) or []:
+        retry_delay = getattr(detail, "retry_delay", None)
+        if retry_delay is not None and hasattr(retry_delay, "seconds"):
+            return retry_delay.seconds + getattr(retry_delay, "nanos", 0) / 1e9
+    return default
+
+class AdaptiveBatchSize:
+    """
+    Embedding batch size that halves on rate limits and grows again after a run of successes.
+    
+    Shared by all ingestion jobs, since they draw from the same API quota.
+    """
+    
+    def __init__(self, initial: int, minimum: int, maximum: int, grow_after: int = 3):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.grow_after = grow_after
+        self._size = initial
+        self._successes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def size(self) -> int:
+        return self._size
+    
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.grow_after:
+                self._size = min(self.maximum, self._size + max(1, self._size // 4))
+                self._successes = 0
+    
+    def on_rate_limit(self):
+        with self._lock:
+            self._size = max(self.minimum, self._size // 2)
+            self._successes = 0
+
+embed_batch_size = AdaptiveBatchSize(EMBED_BATCH_SIZE, EMBED_MIN_BATCH_SIZE, EMBED_MAX_BATCH_SIZE)
+
+def add_documents_in_batches(vectorstore: Chroma, texts: List, ids: List[str], max_retries: int = 5,
+                             on_batch: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Embed and add documents in adaptively sized batches.
+    
+    Every successful batch is written to the vectorstore immediately; on a rate limit
+    only the failed batch is retried, with a smaller batch size and backoff.
     
     Args:
         vectorstore: Chroma vectorstore instance
         texts: List of document texts to add
-        max_retries: Maximum number of retry attempts
+        ids: Chunk IDs matching texts
+        max_retries: Maximum consecutive failed attempts before giving up
+        on_batch: Optional callback invoked as on_batch(batch_number, estimated_total_batches)
+    
+    Returns:
+        Number of documents added
+    
+    Raises:
+        Exception: If a batch still fails after max_retries attempts
     """
     
-    for attempt in range(max_retries):
+    position = 0
+    batch_num = 0
+    attempt = 0
+    
+    while position < len(texts):
+        size = embed_batch_size.size
+        end = position + size
+        remaining_batches = (len(texts) - position + size - 1) // size
+        if on_batch:
+            on_batch(batch_num + 1, batch_num + remaining_batches)
+        
         try:
-            print(f"📄 Adding {len(texts)} documents to vectorstore (attempt {attempt + 1}/{max_retries})")
-            vectorstore.add_documents(texts)
-            print("✅ Documents successfully added to vectorstore")
-            return
+            logger.info(f"Adding documents {position + 1}-{min(end, len(texts))}/{len(texts)} to vectorstore (batch size {size})")
+            with stage_timer("embed_batch"):
+                vectorstore.add_documents(texts[position:end], ids=ids[position:end])
+            embed_batch_size.on_success()
+            position = end
+            batch_num += 1
+            attempt = 0
             
         except google.api_core.exceptions.ResourceExhausted as e:
-            retry_delay = min(2 ** attempt * 5, 60)  # Exponential backoff, max 60 seconds
-            print(f"⚠️ Rate limit hit while adding documents (attempt {attempt + 1}/{max_retries}): {e}")
+            attempt += 1
+            embed_batch_size.on_rate_limit()
+            RATE_LIMIT_HITS.inc(model=getattr(getattr(vectorstore.embeddings, "underlying_embeddings", vectorstore.embeddings), "model", "embedding"))
+            retry_delay = retry_after_seconds(e, min(2 ** attempt * 5, 60))  # Exponential backoff, max 60 seconds
+            logger.warning(f"Rate limit hit while adding documents (attempt {attempt}/{max_retries}): {e}")
             
-            if attempt < max_retries - 1:
-                print(f"⏳ Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception("Failed to add documents after multiple retries due to rate limits. Please try again later.")
+            if attempt >= max_retries:
+                raise Exception(f"Failed to add documents after multiple retries due to rate limits ({position}/{len(texts)} added). Please try again later.")
+            logger.info(f"Retrying with batch size {embed_batch_size.size} in {retry_delay} seconds...")
+            time.sleep(retry_delay)
                 
         except Exception as e:
-            print(f"❌ Error adding documents (attempt {attempt + 1}/{max_retries}): {e}")
+            attempt += 1
+            logger.error(f"Error adding documents (attempt {attempt}/{max_retries}): {e}")
             
-            if attempt < max_retries - 1:
-                retry_delay = min(2 ** attempt * 2, 20)  # Shorter delay for general errors
-                print(f"⏳ Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to add documents after multiple retries: {e}")
+            if attempt >= max_retries:
+                raise Exception(f"Failed to add documents after multiple retries ({position}/{len(texts)} added): {e}")
+            retry_delay = min(2 ** attempt * 2, 20)  # Shorter delay for general errors
+            logger.info(f"Retrying in {retry_delay} seconds...")
+            time.sleep(retry_delay)
+    
+    logger.info(f"{len(texts)} documents successfully added to vectorstore in {batch_num} batches")
+    return len(texts)
+
+_active_staging = set()
+_active_staging_lock = threading.Lock()
+# Recorded on each staging collection, so workers sharing PERSIST_DIR only discard staging left by dead processes
+STAGING_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+def open_staging_store(embeddings, ingest_id: str) -> Chroma:
+    """Open a private staging collection for one ingest; nothing written there is visible to queries."""
+    name = f"{STAGING_PREFIX}{ingest_id}"
+    with _active_staging_lock:
+        _active_staging.add(name)
+    return Chroma(
+        collection_name=name,
+        persist_directory=PERSIST_DIR,
+        embedding_function=embeddings,
+        collection_metadata={"owner": STAGING_OWNER}
+    )
+
+def _release_staging(staging: Chroma):
+    with _active_staging_lock:
+        _active_staging.discard(staging._collection.name)
+    staging.delete_collection()
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, but belongs to another user
+    return True
+
+def _is_orphaned_staging(name: str, owner: Optional[str]) -> bool:
+    """Whether a staging collection's ingest can no longer finish: its process is gone (or is us and forgot it)."""
+    if owner == STAGING_OWNER:
+        return name not in _active_staging
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        # Staging from before owners were recorded, or from another host sharing the directory: leave it
+        return not owner
+    return not _process_alive(int(pid))
+
+def discard_orphaned_staging(vectorstore: Chroma):
+    """
+    Drop staging collections left behind by ingests that were interrupted (e.g. by a server restart).
+
+    Staging collections of other live worker processes sharing PERSIST_DIR are kept.
+    """
+    client = vectorstore._client
+    with _active_staging_lock:
+        for collection in client.list_collections():
+            name = getattr(collection, "name", collection)
+            if not name.startswith(STAGING_PREFIX):
+                continue
+            owner = (client.get_collection(name).metadata or {}).get("owner")
+            if _is_orphaned_staging(name, owner):
+                client.delete_collection(name)
+                logger.info(f"Removed orphaned staging collection {name}")
 
-def create_vectorstore_with_retry(texts: List, embeddings: GoogleGenerativeAIEmbeddings, max_retries: int = 3) -> Chroma:
+def commit_staging(staging: Chroma, vectorstore: Chroma) -> int:
     """
-    Create vectorstore from documents with retry logic for rate limits.
+    Copy every vector from a staging collection into the live collection, then drop the staging collection.
+    
+    Vectors are copied with their stored embeddings, so committing makes no embedding API calls.
+    The chunks are added to the collection's lexical index (and compact vector index, if enabled) at the same time.
+    Large files are copied in pages of COMMIT_BATCH_SIZE; if a page fails, the pages already copied are
+    removed again, so the file is never left half published.
     
     Args:
-        texts: List of document texts
-        embeddings: Embeddings instance
-        max_retries: Maximum number of retry attempts
+        staging: Staging collection returned by open_staging_store
+        vectorstore: Live Chroma vectorstore instance
     
     Returns:
-        Chroma vectorstore instance
+        Number of vectors committed
     """
     
-    for attempt in range(max_retries):
-        try:
-            print(f"🏗️ Creating new vectorstore with {len(texts)} documents (attempt {attempt + 1}/{max_retries})")
-            vectorstore = Chroma.from_documents(
-                documents=texts,
-                embedding=embeddings,
-                persist_directory=PERSIST_DIR
-            )
-            print("✅ Vectorstore successfully created")
-            return vectorstore
-            
-        except google.api_core.exceptions.ResourceExhausted as e:
-            retry_delay = min(2 ** attempt * 10, 120)  # Exponential backoff, max 2 minutes
-            print(f"⚠️ Rate limit hit while creating vectorstore (attempt {attempt + 1}/{max_retries}): {e}")
-            
-            if attempt < max_retries - 1:
-                print(f"⏳ Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception("Failed to create vectorstore after multiple retries due to rate limits. Please try again later.")
-                
-        except Exception as e:
-            print(f"❌ Error creating vectorstore (attempt {attempt + 1}/{max_retries}): {e}")
-            
-            if attempt < max_retries - 1:
-                retry_delay = min(2 ** attempt * 5, 30)  # Shorter delay for general errors
-                print(f"⏳ Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to create vectorstore after multiple retries: {e}")
+    data = staging._collection.get(include=["embeddings", "documents", "metadatas"])
+    total = len(data["ids"])
+    lexical_index = lexical_index_for(vectorstore)
+    compact_index = compact_index_for(vectorstore)
+    committed_ids = []
+    try:
+        for start in range(0, total, COMMIT_BATCH_SIZE):
+            end = start + COMMIT_BATCH_SIZE
+            page_ids = data["ids"][start:end]
+            # Recorded before the upsert, which may have written part of the page when it raises
+            committed_ids.extend(page_ids)
+            with stage_timer("chroma_write"):
+                vectorstore._collection.upsert(
+                    ids=page_ids,
+                    embeddings=data["embeddings"][start:end],
+                    documents=data["documents"][start:end],
+                    metadatas=data["metadatas"][start:end]
+                )
+            lexical_index.add(page_ids, data["documents"][start:end], data["metadatas"][start:end])
+            if compact_index is not None:
+                compact_index.add(page_ids, data["embeddings"][start:end])
+    except BaseException:
+        _rollback_commit(vectorstore, committed_ids)
+        raise
+    _release_staging(staging)
+    return total
+
+def _rollback_commit(vectorstore: Chroma, ids: List[str]):
+    """
+    Remove chunks a failed commit_staging already wrote to the live collection and its indexes.
+    
+    Staged chunks are only ones the collection did not have (see filter_indexed_chunks), so deleting
+    them by ID restores the previous state. Deleting by ingest_id is not used: one ingest_id covers
+    every file of a job, including files already committed.
+    """
+    if not ids:
+        return
+    try:
+        for start in range(0, len(ids), COMMIT_BATCH_SIZE):
+            vectorstore._collection.delete(ids=ids[start:start + COMMIT_BATCH_SIZE])
+        lexical_index_for(vectorstore).delete(ids)
+        compact_index = compact_index_for(vectorstore)
+        if compact_index is not None:
+            compact_index.delete(ids)
+        logger.info(f"Rolled back {len(ids)} chunks of the failed commit")
+    except Exception:
+        logger.exception(f"Could not roll back {len(ids)} chunks of a failed commit")
 
+def prune_source(vectorstore: Chroma, source: str, keep_ids: set) -> int:
+    """Delete a source's chunks that are not in keep_ids, e.g. chunks that disappeared on re-indexing."""
+    existing = vectorstore.get(where={"source": source}, include=[])["ids"]
+    stale = [doc_id for doc_id in existing if doc_id not in keep_ids]
+    for start in range(0, len(stale), COMMIT_BATCH_SIZE):
+        with stage_timer("chroma_write"):
+            vectorstore.delete(ids=stale[start:start + COMMIT_BATCH_SIZE])
+    lexical_index_for(vectorstore).delete(stale)
+    compact_index = compact_index_for(vectorstore)
+    if compact_index is not None:
+        compact_index.delete(stale)
+    return len(stale)
 
-def load_vectorstore(uploaded_files):
+def discard_staging(staging: Chroma):
+    """Roll back an ingest by dropping its staging collection; the live collection is untouched."""
+    try:
+        _release_staging(staging)
+        logger.info("Discarded staged vectors of the failed ingest")
+    except Exception as e:
+        logger.warning(f"Failed to discard staging collection: {e}")
+
+def load_vectorstore(uploaded_files, progress: Optional[ProgressCallback] = None,
+                     collection_name: str = COLLECTION_NAME, tags: Tuple[str, ...] = ()):
     """
     Load documents into vectorstore with comprehensive error handling and retry logic.
     
     Args:
         uploaded_files: List of uploaded file objects
+        progress: Optional callback receiving per-file stage updates
+        collection_name: Collection of the target workspace
+        tags: Tags stored on every chunk, for scoped retrieval
     
     Returns:
         Chroma vectorstore instance
@@ -176,79 +529,142 @@ def load_vectorstore(uploaded_files):
         Exception: If vectorstore creation fails after retries
     """
     
-    print(f"📁 Processing {len(uploaded_files)} uploaded files")
-    file_paths = []
-
-    # Save uploaded files
+    stored_files = []
     for file in uploaded_files:
-        save_path = Path(UPLOAD_DIR) / file.filename
-        with open(save_path, "wb") as f:
-            f.write(file.file.read())
-        file_paths.append(str(save_path))
-
-    # Load documents from files
-    docs = []
-    for path in file_paths:
-        try:
-            print(f"📖 Loading document: {path}")
-            loader = EnhancedPDFLoader(path)
-            loaded_docs = loader.load()
-            docs.extend(loaded_docs)
-            print(f"✅ Successfully loaded {len(loaded_docs)} document chunks from {path}")
-        except Exception as e:
-            print(f"⚠️ Warning: Failed to load {path}: {e}")
-            continue
-
-    if not docs:
-        raise ValueError("No documents were loaded from the uploaded files. Please check if the files are valid PDFs.")
-
-    print(f"📚 Total documents loaded: {len(docs)}")
-
-    # Split documents into chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    texts = splitter.split_documents(docs)
+        if progress:
+            progress(file.filename, "saving", 0, 0)
+        stored_files.append(save_upload(file))
+    
+    return index_stored_files(stored_files, progress=progress, collection_name=collection_name, tags=tags)
 
-    if not texts:
-        raise ValueError("No text was extracted from the documents after splitting.")
+def index_stored_files(stored_files: List[StoredUpload], progress: Optional[ProgressCallback] = None,
+                       replace: bool = False, collection_name: str = COLLECTION_NAME, tags: Tuple[str, ...] = ()):
+    """
+    Extract, split and embed already saved uploads into the vectorstore, one file at a time.
+    
+    Args:
+        stored_files: Uploads saved with save_upload
+        progress: Optional callback receiving per-file stage updates
+        replace: Re-index files even if already indexed, removing chunks of the same
+            source that the new extraction no longer produces
+        collection_name: Collection of the target workspace
+        tags: Tags stored on every chunk, for scoped retrieval
+    
+    Returns:
+        Chroma vectorstore instance
+    
+    Raises:
+        ValueError: If no documents can be loaded or processed
+        Exception: If vectorstore creation fails after retries
+    """
+    
+    def report(filename: str, stage: str, current: int = 0, total: int = 0):
+        if progress:
+            progress(filename, stage, current, total)
 
-    print(f"📄 Total text chunks created: {len(texts)}")
+    logger.info(f"Processing {len(stored_files)} uploaded files")
 
-    # Create embeddings with retry logic
+    # Reuse the process-wide embedding client of the collection's pinned model
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable is not set")
         
     try:
-        embeddings = create_embeddings_with_retry(
-            api_key=api_key,
-            max_retries=3
-        )
+        embeddings = create_cached_embeddings(get_collection_embeddings(collection_name))
     except Exception as e:
         raise Exception(f"Failed to initialize embeddings: {e}")
 
-    # Check if vectorstore already exists and add documents or create new one
-    try:
-        if os.path.exists(PERSIST_DIR) and os.listdir(PERSIST_DIR):
-            print("📦 Loading existing vectorstore")
-            vectorstore = Chroma(persist_directory=PERSIST_DIR, embedding_function=embeddings)
+    vectorstore = open_vectorstore(collection_name, PERSIST_DIR, embeddings)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    ingest_id = uuid.uuid4().hex
+    discard_orphaned_staging(vectorstore)
+
+    def index_file(file_index: int, stored: StoredUpload) -> bool:
+        """Index one file; returns whether it is now indexed. Raises if committing it fails."""
+        filename, path, file_hash = stored
+        if not replace and is_file_indexed(vectorstore, file_hash):
+            logger.info(f"Skipping {filename}: identical content is already indexed")
+            report(filename, "done")
+            return True
+
+        # Load documents from the file
+        report(filename, "extracting")
+        try:
+            logger.info(f"Loading document: {filename} ({path})")
+            loader = EnhancedPDFLoader(
+                path,
+                progress=lambda stage, current, total, name=filename: report(name, stage, current, total)
+            )
+            with stage_timer("extract"):
+                docs = loader.load()
+            ingested_at = datetime.now(timezone.utc).isoformat()
+            for doc in docs:
+                doc.metadata["source"] = filename
+                doc.metadata["file_hash"] = file_hash
+                doc.metadata["ingest_id"] = ingest_id
+                doc.metadata["ingested_at"] = ingested_at
+                doc.metadata.update(tag_metadata(tags))
+            logger.info(f"Successfully loaded {len(docs)} document chunks from {filename}")
+        except Exception as e:
+            logger.warning(f"Failed to load {filename}: {e}")
+            report(filename, "failed")
+            return False
+
+        # Split documents into chunks
+        report(filename, "splitting")
+        with stage_timer("split"):
+            texts = splitter.split_documents(docs)
+        if not texts:
+            logger.warning(f"No text was extracted from {filename} after splitting")
+            report(filename, "failed")
+            return False
+
+        logger.info(f"Total text chunks created for {filename}: {len(texts)}")
+
+        # Skip chunks that are already indexed for the same source
+        ids = [chunk_id(doc.metadata["source"], doc.page_content) for doc in texts]
+        all_ids = set(ids)
+        texts, ids = filter_indexed_chunks(vectorstore, texts, ids)
+        logger.info(f"{len(texts)} new chunks to embed from {filename}")
+
+        # Embed into a staging collection and publish the whole file at once, so a failure
+        # never leaves a half-indexed document (or touches anything already indexed)
+        staging = open_staging_store(embeddings, f"{ingest_id}-{file_index}")
+        try:
+            add_documents_in_batches(
+                staging, texts, ids,
+                on_batch=lambda current, total, name=filename: report(name, "embedding", current, total)
+            )
+            committed = commit_staging(staging, vectorstore)
+            logger.info(f"Committed {committed} chunks from {filename}")
+            if replace:
+                pruned = prune_source(vectorstore, filename, all_ids)
+                logger.info(f"Removed {pruned} stale chunks of {filename}")
+            notify_commit(collection_name)
             
-            # Add new documents with retry logic
-            add_documents_with_retry(vectorstore, texts, max_retries=3)
-        else:
-            print("🆕 Creating new vectorstore")
-            # Create new vectorstore with retry logic
-            vectorstore = create_vectorstore_with_retry(texts, embeddings, max_retries=3)
-
-        print("🎉 Vectorstore successfully updated!")
-        return vectorstore
-        
-    except Exception as e:
-        # Clean up any partially created vectorstore on failure
-        if os.path.exists(PERSIST_DIR):
-            try:
-                import shutil
-                shutil.rmtree(PERSIST_DIR)
-                print("🧹 Cleaned up partial vectorstore on failure")
-            except:
-                pass
-        raise Exception(f"Failed to create or update vectorstore: {e}")
\ No newline at end of file
+        except Exception as e:
+            report(filename, "failed")
+            discard_staging(staging)
+            raise Exception(f"Failed to create or update vectorstore: {e}")
+
+        report(filename, "done")
+        return True
+
+    def index_group(group: List[Tuple[int, StoredUpload]]) -> int:
+        return sum(index_file(file_index, stored) for file_index, stored in group)
+
+    # Files going to different shards are indexed in parallel; an unsharded collection is one group
+    groups = partition_for_ingest(vectorstore, list(enumerate(stored_files)), key=lambda item: item[1].file_hash)
+    if len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="shard-ingest") as pool:
+            # Each thread runs in a copy of this context so its log records keep the job's request ID
+            futures = [pool.submit(contextvars.copy_context().run, index_group, group) for group in groups]
+            indexed_files = sum(future.result() for future in futures)
+    else:
+        indexed_files = sum(index_group(group) for group in groups)
+
+    if not indexed_files:
+        raise ValueError("No documents were loaded from the uploaded files. Please check if the files are valid PDFs.")
+
+    logger.info("Vectorstore successfully updated!")
+    return vectorstore
@@ -0,0 +1,203 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterator, List, Sequence, Tuple, TypeVar
+from logger import DroppingQueueHandler, record_stage
+
+T = TypeVar("T")
+
+# Seconds; covers sub-millisecond cache and Chroma calls up to multi-minute OCR and ingest runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, one series per label combination."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, such as requests in flight."""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """Count the enclosed block as in progress."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class CounterFunction(_Metric):
+    """Unlabelled counter whose value is read from a callable at render time, for counts kept elsewhere."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._read = read
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_number(self._read())}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over cumulative buckets, plus their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # Bucket counts, then sum and count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe how long the enclosed block takes, whether or not it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="' + _format_number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {values[-2]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {values[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Ingest stages: save, extract, ocr_page, split, embed_batch, chroma_write.
+# Query stages: retrieval, prompt_build, generation.
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Time spent in each ingest and query pipeline stage.", ["stage"])
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "Total time to handle an HTTP request.", ["route", "status"])
+REQUESTS_IN_FLIGHT = Gauge("rag_requests_in_flight", "HTTP requests currently being handled.", ["route"])
+RATE_LIMIT_HITS = Counter("rag_rate_limit_hits_total", "Rate-limit errors returned by the Gemini API.", ["model"])
+MODEL_FALLBACKS = Counter("rag_model_fallbacks_total", "Answers generated by a lower-priority model than the one first tried.", ["from_model", "to_model"])
+CACHE_LOOKUPS = Counter("rag_answer_cache_lookups_total", "Answer cache lookups by outcome.", ["result"])
+LOG_RECORDS_DROPPED = CounterFunction(
+    "rag_log_records_dropped_total", "Log records dropped because the log queue was full.", lambda: DroppingQueueHandler.dropped
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration in rag_stage_duration_seconds and in the current request's log record."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    record_stage(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time one pipeline stage, whether or not it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+async def timed_stream(stream: AsyncIterable[T], stage: str) -> AsyncIterator[T]:
+    """
+    Iterate an async stream, timing it as one stage.
+
+    Only the waits for the stream's next item are counted, not the time the consumer
+    spends between items (e.g. a client reading a streamed response).
+    """
+    iterator = stream.__aiter__()
+    waited = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                waited += time.perf_counter() - start
+            yield item
+    finally:
+        observe_stage(stage, waited)
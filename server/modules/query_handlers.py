@@ -1,17 +1,185 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.prompts import format_document
 from logger import logger
+from .llm import AVAILABLE_MODELS, chain_registry, model_breakers, get_models_to_try
+from .context_packing import DEFAULT_CONTEXT_TOKEN_BUDGET, pack_context
+from .circuit_breaker import is_rate_limit_error
+from .metrics import MODEL_FALLBACKS, RATE_LIMIT_HITS, stage_timer, timed_stream
+from .workspaces import DocumentScope
 
 
 
 def query_chain(chain,user_input:str):
     try:
-        logger.debug(f"Running chain for input: {user_input}")
+        logger.debug("Running chain for input: %s", user_input)
         result=chain.invoke({"query":user_input})
         response={
             "response":result["result"],
             "sources":[doc.metadata.get("source","") for doc in result["source_documents"]]
         }
-        logger.debug(f"Chain response: {response}")
+        logger.debug("Chain response: %s", response)
         return response
     except Exception as e:
         logger.exception("Error in query_chain")
-        raise
\ No newline at end of file
+        raise
+
+
+def build_stuff_prompt(chain, user_input: str, docs: List[Document]) -> str:
+    """Format the same prompt a "stuff" RetrievalQA chain would send for these documents."""
+    stuff_chain = chain.combine_documents_chain
+    context = stuff_chain.document_separator.join(
+        format_document(doc, stuff_chain.document_prompt) for doc in docs
+    )
+    return stuff_chain.llm_chain.prompt.format(**{stuff_chain.document_variable_name: context, "question": user_input})
+
+
+class ModelsUnavailableError(Exception):
+    """Raised when every model's breaker is open or every model failed to generate."""
+
+
+def pack_for_model(docs: List[Document], model_name: str) -> Tuple[List[Document], Dict[str, Any]]:
+    """Pack retrieved chunks into the model's context token budget and log what it saved."""
+    budget = AVAILABLE_MODELS.get(model_name, {}).get("context_token_budget", DEFAULT_CONTEXT_TOKEN_BUDGET)
+    with stage_timer("prompt_build"):
+        packed, stats = pack_context(docs, token_budget=budget)
+    logger.info(
+        f"Packed {stats['chunks_used']}/{stats['chunks_retrieved']} chunks for '{model_name}' "
+        f"(~{stats['context_tokens']} tokens, ~{stats['prompt_tokens_saved']} saved)"
+    )
+    return packed, stats
+
+
+def _count_rate_limit(model_name: str, error: Exception):
+    if is_rate_limit_error(error):
+        RATE_LIMIT_HITS.inc(model=model_name)
+
+
+def _record_model_failure(model_name: str, error: Exception):
+    model_breakers.get(model_name).record_failure(error)
+    _count_rate_limit(model_name, error)
+    kind = "Rate limit" if is_rate_limit_error(error) else "Error"
+    logger.warning(f"{kind} from model '{model_name}' during generation, falling back: {error}")
+
+
+async def aquery_with_fallback(vectorstore, user_input: str, model_name: Optional[str] = None,
+                               temperature: float = 0.1, scope: Optional[DocumentScope] = None,
+                               docs: Optional[List[Document]] = None,
+                               query_embedding: Optional[List[float]] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Retrieve once (unless docs were already retrieved), then generate with the requested
+    model, falling back by priority when generation fails.
+
+    A query_embedding already computed for the question (e.g. by the answer cache)
+    is reused for vector search instead of embedding the question again.
+
+    Models whose circuit breaker is open are skipped without a call. Retrieval is
+    limited to the scope's documents, and the retrieved chunks are packed into
+    each model's context budget before generating.
+
+    Returns:
+        (response dict as returned by query_chain plus "context" packing stats, model used),
+        or (None, None) if every model is unavailable
+    """
+    models_to_try = get_models_to_try(model_name)
+    for candidate in models_to_try:
+        breaker = model_breakers.get(candidate)
+        if not breaker.allow_request():
+            logger.info(f"Skipping model '{candidate}': circuit breaker is {breaker.state}")
+            continue
+
+        try:
+            chain = chain_registry.get_chain(vectorstore, candidate, temperature)
+            if docs is None:
+                with stage_timer("retrieval"):
+                    docs = await chain.retriever.scoped(scope).with_query_embedding(query_embedding).ainvoke(user_input)
+        except BaseException:
+            breaker.release()  # Retrieval failures say nothing about the model
+            raise
+
+        packed, context_stats = pack_for_model(docs, candidate)
+        try:
+            with stage_timer("generation"):
+                result = await chain.combine_documents_chain.ainvoke({"input_documents": packed, "question": user_input})
+        except Exception as e:
+            _record_model_failure(candidate, e)
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+
+        breaker.record_success()
+        if candidate != models_to_try[0]:
+            MODEL_FALLBACKS.inc(from_model=models_to_try[0], to_model=candidate)
+        return {
+            "response": result["output_text"],
+            "sources": [doc.metadata.get("source", "") for doc in packed],
+            "context": context_stats
+        }, candidate
+
+    logger.error(f"No model could answer (requested: {model_name or 'default'})")
+    return None, None
+
+
+async def astream_with_fallback(vectorstore, user_input: str, model_name: Optional[str] = None,
+                                temperature: float = 0.1, scope: Optional[DocumentScope] = None,
+                                query_embedding: Optional[List[float]] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming aquery_with_fallback: yields ("sources", {"sources": [...]}), one
+    ("token", {"text": ...}) per generated chunk of the answer, then
+    ("model", {"model": ..., "context": packing stats}).
+
+    A "sources" event precedes each model attempt, since packing depends on the
+    model's budget. Falls back to the next model only while nothing has been
+    generated yet; a failure after the first token is raised, since the client
+    already has part of the answer.
+
+    Raises:
+        ModelsUnavailableError: If no model produced an answer
+    """
+    docs = None
+    models_to_try = get_models_to_try(model_name)
+    for candidate in models_to_try:
+        breaker = model_breakers.get(candidate)
+        if not breaker.allow_request():
+            logger.info(f"Skipping model '{candidate}': circuit breaker is {breaker.state}")
+            continue
+
+        try:
+            chain = chain_registry.get_chain(vectorstore, candidate, temperature)
+            if docs is None:
+                with stage_timer("retrieval"):
+                    docs = await chain.retriever.scoped(scope).with_query_embedding(query_embedding).ainvoke(user_input)
+            packed, context_stats = pack_for_model(docs, candidate)
+            yield "sources", {"sources": [doc.metadata.get("source", "") for doc in packed]}
+        except BaseException:
+            breaker.release()
+            raise
+
+        with stage_timer("prompt_build"):
+            prompt = build_stuff_prompt(chain, user_input, packed)
+        generated = False
+        try:
+            # Time spent while the client reads each token is not generation time
+            async for chunk in timed_stream(chain.combine_documents_chain.llm_chain.llm.astream(prompt), "generation"):
+                if chunk.content:
+                    generated = True
+                    yield "token", {"text": chunk.content}
+        except Exception as e:
+            if generated:
+                model_breakers.get(candidate).record_failure(e)
+                _count_rate_limit(candidate, e)
+                raise
+            _record_model_failure(candidate, e)
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+
+        breaker.record_success()
+        if candidate != models_to_try[0]:
+            MODEL_FALLBACKS.inc(from_model=models_to_try[0], to_model=candidate)
+        yield "model", {"model": candidate, "context": context_stats}
+        return
+
+    raise ModelsUnavailableError("All AI models are currently unavailable due to high demand or rate limits. Please try again later.")
@@ -0,0 +1,270 @@
+import os
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+import chromadb
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.runnables.config import run_in_executor
+
+SHARD_PERSIST_DIR = "./chroma_store"  # Default when the caller does not say where collections persist
+MAX_SHARDS = 1000  # Shard names end in at most "-shard999", which workspace ID lengths leave room for
+# Shards per collection for new data; existing shard collections are always searched
+VECTOR_SHARDS = min(max(1, int(os.environ.get("VECTOR_SHARDS", "1"))), MAX_SHARDS)
+SHARD_SUFFIX = "-shard"
+GET_RESULT_KEYS = ("ids", "embeddings", "documents", "metadatas", "uris", "data")
+
+T = TypeVar("T")
+
+_fanout_pool: Optional[ThreadPoolExecutor] = None
+_fanout_pool_size = 0
+_fanout_pool_lock = threading.Lock()
+
+
+def _fanout(func: Callable[[Any], T], items: Sequence[Any]) -> List[T]:
+    """
+    Run func over items on a shared thread pool, keeping their order.
+
+    The pool is sized from the largest fan-out seen (two concurrent requests' worth
+    of threads), since collections can have more shards on disk than VECTOR_SHARDS.
+    Work is submitted under the lock, so a pool is only shut down for a bigger one
+    after every search already using it has been queued on it.
+    """
+    global _fanout_pool, _fanout_pool_size
+    if len(items) == 1:
+        return [func(items[0])]
+    with _fanout_pool_lock:
+        wanted = max(4, len(items) * 2)
+        if _fanout_pool is None or _fanout_pool_size < wanted:
+            if _fanout_pool is not None:
+                _fanout_pool.shutdown(wait=False)  # Work already submitted to it still runs
+            _fanout_pool = ThreadPoolExecutor(max_workers=wanted, thread_name_prefix="shard-search")
+            _fanout_pool_size = wanted
+        futures = [_fanout_pool.submit(func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def shard_collection_name(collection_name: str, shard: int) -> str:
+    """Shard 0 is the collection itself, so an unsharded collection is a one-shard collection."""
+    return collection_name if shard == 0 else f"{collection_name}{SHARD_SUFFIX}{shard}"
+
+
+def shard_for_key(key: str, shard_count: int) -> int:
+    """Shard holding a document, chosen by its content hash so a file's chunks stay together."""
+    digest = key if re.fullmatch(r"[0-9a-f]{16,}", key or "") else hashlib.sha256((key or "").encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % shard_count
+
+
+def _shard_key(doc_id: str, metadata: Optional[Dict[str, Any]]) -> str:
+    return (metadata or {}).get("file_hash") or doc_id
+
+
+def _collection_names(client) -> List[str]:
+    return [collection if isinstance(collection, str) else collection.name for collection in client.list_collections()]
+
+
+def existing_shard_count(client, collection_name: str) -> int:
+    """Number of shards a collection already has on disk (1 if it was never sharded)."""
+    pattern = re.compile(re.escape(collection_name + SHARD_SUFFIX) + r"(\d+)$")
+    highest = 0
+    for name in _collection_names(client):
+        match = pattern.match(name)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest + 1
+
+
+def collection_exists(collection_name: str, persist_directory: str = SHARD_PERSIST_DIR) -> bool:
+    """Whether a collection is on disk, checked without creating it (opening a Chroma vectorstore would)."""
+    client = chromadb.PersistentClient(path=persist_directory)
+    return collection_name in _collection_names(client)
+
+
+def _merge_get_results(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {"included": parts[0].get("included") if parts else []}
+    for key in GET_RESULT_KEYS:
+        values = [part.get(key) for part in parts]
+        merged[key] = None if all(value is None for value in values) else [
+            item for value in values if value is not None for item in value
+        ]
+    if merged["ids"] is None:
+        merged["ids"] = []
+    return merged
+
+
+class ShardedCollection:
+    """
+    Fan-out stand-in for a Chroma collection split across shard collections.
+
+    Implements the collection calls the app makes: reads and deletes go to every
+    shard, writes are routed to one shard per document hash, and queries run on
+    all shards concurrently and are merged by distance.
+    """
+
+    def __init__(self, name: str, shards: List[Any]):
+        self.name = name
+        self.shards = shards
+
+    def shard_for(self, doc_id: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        return shard_for_key(_shard_key(doc_id, metadata), len(self.shards))
+
+    def count(self) -> int:
+        return sum(_fanout(lambda shard: shard.count(), self.shards))
+
+    def get(self, ids=None, where=None, limit: Optional[int] = None, offset: Optional[int] = None, **kwargs) -> Dict[str, Any]:
+        """Collection.get over all shards; with limit/offset, shards are paged through in order."""
+        if limit is None and not offset:
+            return _merge_get_results(_fanout(lambda shard: shard.get(ids=ids, where=where, **kwargs), self.shards))
+
+        skip = offset or 0
+        remaining = limit
+        parts = []
+        for shard in self.shards:
+            if skip:
+                size = shard.count() if ids is None and where is None else len(
+                    shard.get(ids=ids, where=where, include=[])["ids"]
+                )
+                if skip >= size:
+                    skip -= size
+                    continue
+            part = shard.get(ids=ids, where=where, limit=remaining, offset=skip or None, **kwargs)
+            parts.append(part)
+            skip = 0
+            if remaining is not None:
+                remaining -= len(part["ids"])
+                if remaining <= 0:
+                    break
+        return _merge_get_results(parts) if parts else _merge_get_results([{"ids": []}])
+
+    def upsert(self, ids: Sequence[str], embeddings=None, documents=None, metadatas=None, **kwargs):
+        """Collection.upsert, routing each record to its document's shard."""
+        groups: Dict[int, List[int]] = {}
+        for position, doc_id in enumerate(ids):
+            metadata = metadatas[position] if metadatas is not None else None
+            groups.setdefault(self.shard_for(doc_id, metadata), []).append(position)
+
+        def pick(values, positions):
+            return None if values is None else [values[i] for i in positions]
+
+        for shard, positions in groups.items():
+            self.shards[shard].upsert(
+                ids=pick(ids, positions),
+                embeddings=pick(embeddings, positions),
+                documents=pick(documents, positions),
+                metadatas=pick(metadatas, positions),
+                **kwargs
+            )
+
+    def delete(self, ids=None, where=None, **kwargs):
+        _fanout(lambda shard: shard.delete(ids=ids, where=where, **kwargs), self.shards)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=("documents", "metadatas"), **kwargs) -> Dict[str, Any]:
+        """Collection.query on every shard at once, keeping the n_results nearest per query."""
+        include = list(dict.fromkeys(list(include) + ["distances"]))
+        parts = _fanout(
+            lambda shard: shard.query(query_embeddings=query_embeddings, n_results=n_results, where=where, include=include, **kwargs),
+            self.shards
+        )
+        keys = ["ids"] + [key for key in include if key != "uris"]
+        merged: Dict[str, List[List[Any]]] = {key: [] for key in keys}
+        for row in range(len(query_embeddings)):
+            hits = []
+            for part in parts:
+                columns = [part[key][row] for key in keys]
+                hits.extend(zip(*columns))
+            hits.sort(key=lambda hit: hit[keys.index("distances")])
+            for position, key in enumerate(keys):
+                merged[key].append([hit[position] for hit in hits[:n_results]])
+        return merged
+
+
+class ShardedChroma:
+    """
+    Chroma vectorstore split into shard collections, exposing the Chroma calls the app makes.
+
+    Ingestion, retrieval and document management use it exactly like a Chroma
+    instance; only open_vectorstore decides whether a collection is sharded.
+    """
+
+    def __init__(self, collection_name: str, persist_directory: str = SHARD_PERSIST_DIR,
+                 embedding_function=None, shard_count: int = VECTOR_SHARDS):
+        first = Chroma(collection_name=collection_name, persist_directory=persist_directory, embedding_function=embedding_function)
+        shard_count = max(shard_count, existing_shard_count(first._client, collection_name))
+        self.stores: List[Chroma] = [first] + [
+            Chroma(collection_name=shard_collection_name(collection_name, shard), persist_directory=persist_directory,
+                   embedding_function=embedding_function)
+            for shard in range(1, shard_count)
+        ]
+        self._persist_directory = persist_directory
+        self._client = first._client
+        self._collection = ShardedCollection(collection_name, [store._collection for store in self.stores])
+
+    @property
+    def embeddings(self):
+        return self.stores[0].embeddings
+
+    def get(self, ids=None, where=None, limit=None, offset=None, where_document=None, include=None) -> Dict[str, Any]:
+        kwargs = {"where_document": where_document} if where_document else {}
+        if include is not None:
+            kwargs["include"] = include
+        return self._collection.get(ids=ids, where=where, limit=limit, offset=offset, **kwargs)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs):
+        self._collection.delete(ids=ids, **kwargs)
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None, **kwargs) -> List[str]:
+        """Embed and add documents, each to its document's shard."""
+        ids = ids or [doc.id or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest() for doc in documents]
+        groups: Dict[int, List[int]] = {}
+        for position, (doc, doc_id) in enumerate(zip(documents, ids)):
+            groups.setdefault(self._collection.shard_for(doc_id, doc.metadata), []).append(position)
+        for shard, positions in groups.items():
+            self.stores[shard].add_documents([documents[i] for i in positions], ids=[ids[i] for i in positions], **kwargs)
+        return list(ids)
+
+    def _search_by_vector(self, embedding: List[float], k: int, filter=None) -> List[Document]:
+        hits: List[Tuple[Document, float]] = []
+        for shard_hits in _fanout(
+            lambda store: store.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter),
+            self.stores
+        ):
+            hits.extend(shard_hits)
+        hits.sort(key=lambda hit: hit[1])  # Chroma returns distances: lower is closer
+        return [doc for doc, _ in hits[:k]]
+
+    def similarity_search(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Document]:
+        """Embed the query once and search every shard concurrently, merging the top k by distance."""
+        return self._search_by_vector(self.embeddings.embed_query(query), k, filter)
+
+    async def asimilarity_search(self, query: str, k: int = 4, filter=None, **kwargs) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        return await run_in_executor(None, self._search_by_vector, embedding, k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return self._search_by_vector(embedding, k, filter)
+
+    async def asimilarity_search_by_vector(self, embedding: List[float], k: int = 4, filter=None, **kwargs) -> List[Document]:
+        return await run_in_executor(None, self._search_by_vector, embedding, k, filter)
+
+    def shard_of(self, key: str) -> int:
+        return shard_for_key(key, len(self.stores))
+
+
+def open_vectorstore(collection_name: str, persist_directory: str = SHARD_PERSIST_DIR, embedding_function=None):
+    """Open a collection as a plain Chroma vectorstore, or as a ShardedChroma when it has (or should have) shards."""
+    store = Chroma(collection_name=collection_name, persist_directory=persist_directory, embedding_function=embedding_function)
+    if VECTOR_SHARDS == 1 and existing_shard_count(store._client, collection_name) == 1:
+        return store
+    return ShardedChroma(collection_name, persist_directory, embedding_function)
+
+
+def partition_for_ingest(vectorstore, items: Sequence[T], key: Callable[[T], str]) -> List[List[T]]:
+    """Group items (e.g. files by content hash) by the shard they are written to; one group when unsharded."""
+    if not isinstance(vectorstore, ShardedChroma):
+        return [list(items)] if items else []
+    groups: Dict[int, List[T]] = {}
+    for item in items:
+        groups.setdefault(vectorstore.shard_of(key(item)), []).append(item)
+    return [groups[shard] for shard in sorted(groups)]
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from .answer_cache import normalize_question, temperature_bucket
+
+
+def answer_key(question: str, model_name: str, temperature: float, corpus_version: int,
+               collection: str = "", scope: str = "") -> Tuple:
+    """Requests with the same key get the same answer; matches the answer cache's exact key."""
+    return (collection, scope, model_name, temperature_bucket(temperature), corpus_version, normalize_question(question))
+
+
+class SingleFlight:
+    """
+    Shares one in-flight computation among concurrent callers with the same key.
+
+    The first caller starts the computation as a task; callers arriving before it
+    finishes await the same task and get its result or its exception. The key is
+    forgotten as soon as the task finishes, so nothing is served after the fact
+    (that is the answer cache's job). Must be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task"] = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await compute() or join a running computation with the same key.
+
+        Returns:
+            (result, whether this caller joined another caller's computation)
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self._coalesced += 1
+        else:
+            self._leaders += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # A caller that disconnects must not cancel the computation the others are waiting on
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: "asyncio.Task"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved; every waiter has already been given it
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "computations": self._leaders,
+            "coalesced_requests": self._coalesced,
+        }
+
+
+answer_flights = SingleFlight()
@@ -0,0 +1,272 @@
+import os
+import json
+import zlib
+import struct
+import hashlib
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import numpy as np
+from logger import logger
+from .lexical_index import lexical_index_for
+from .compact_vectors import compact_index_for
+from .shards import open_vectorstore
+from .load_vectorstore import (
+    PERSIST_DIR, COLLECTION_NAME, COMMIT_BATCH_SIZE, get_pinned_embedding_model, pin_embedding_model, notify_commit
+)
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "./snapshots")
+# Comma-separated snapshot files imported at startup into collections that are still empty
+SNAPSHOT_IMPORT = os.environ.get("SNAPSHOT_IMPORT", "")
+SNAPSHOT_MAGIC = b"RAGSNAP1"
+SNAPSHOT_VERSION = 1
+CHECKSUM_TAG = b"SHA256"
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class SnapshotError(ValueError):
+    """Raised for snapshot files that are corrupt, truncated or incompatible with the target collection."""
+
+
+class _HashingWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sha = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.sha.update(data)
+        self.f.write(data)
+
+
+def _write_block(out: _HashingWriter, data: bytes):
+    out.write(struct.pack("<I", len(data)))
+    out.write(data)
+
+
+def export_snapshot(collection_name: str, path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write a collection's ids, embeddings, documents and metadata to one checksummed file.
+
+    Layout: magic, a JSON header (collection, embedding model, record count),
+    zlib-compressed pages of records (JSON for ids/documents/metadata, raw float32
+    for embeddings), then "SHA256" and the digest of everything before it. The file
+    is written under a temporary name and renamed, so a snapshot is never half written.
+
+    Returns:
+        Summary with the path, record count, size and checksum
+    """
+
+    vectorstore = open_vectorstore(collection_name, PERSIST_DIR)
+    total = vectorstore._collection.count()
+    if path is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(SNAPSHOT_DIR, f"{collection_name}-{stamp}.ragsnap")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    written = 0
+    dimension = None
+    try:
+        with os.fdopen(fd, "wb") as f:
+            out = _HashingWriter(f)
+            out.write(SNAPSHOT_MAGIC)
+            header = {
+                "version": SNAPSHOT_VERSION,
+                "collection": collection_name,
+                "embedding_model": get_pinned_embedding_model(collection_name),
+                "count": total,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            _write_block(out, json.dumps(header).encode("utf-8"))
+
+            offset = 0
+            while True:
+                data = vectorstore._collection.get(
+                    limit=COMMIT_BATCH_SIZE, offset=offset, include=["embeddings", "documents", "metadatas"]
+                )
+                if not len(data["ids"]):
+                    break
+                embeddings = np.asarray(data["embeddings"], dtype="<f4")
+                dimension = dimension or embeddings.shape[1]
+                records = json.dumps({
+                    "ids": list(data["ids"]),
+                    "documents": list(data["documents"]),
+                    "metadatas": list(data["metadatas"]),
+                    "dimension": embeddings.shape[1],
+                }).encode("utf-8")
+                page = struct.pack("<I", len(records)) + records + embeddings.tobytes()
+                _write_block(out, zlib.compress(page, 6))
+                written += len(data["ids"])
+                offset += COMMIT_BATCH_SIZE
+                if len(data["ids"]) < COMMIT_BATCH_SIZE:
+                    break
+
+            _write_block(out, b"")  # End of pages
+            checksum = out.sha.hexdigest()
+            f.write(CHECKSUM_TAG + out.sha.digest())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    summary = {
+        "path": path,
+        "collection": collection_name,
+        "embedding_model": header["embedding_model"],
+        "records": written,
+        "dimension": dimension,
+        "bytes": os.path.getsize(path),
+        "sha256": checksum,
+    }
+    logger.info(f"Exported {written} vectors of {collection_name} to {path}")
+    return summary
+
+
+def verify_snapshot(path: str) -> str:
+    """
+    Check a snapshot's trailing SHA-256 against its contents.
+
+    Returns:
+        The hex checksum
+
+    Raises:
+        SnapshotError: If the file is truncated, not a snapshot or does not match its checksum
+    """
+    size = os.path.getsize(path)
+    trailer_size = len(CHECKSUM_TAG) + 32
+    if size < len(SNAPSHOT_MAGIC) + trailer_size:
+        raise SnapshotError(f"{path} is too small to be a snapshot")
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path} is not a vectorstore snapshot")
+        sha.update(SNAPSHOT_MAGIC)
+        remaining = size - len(SNAPSHOT_MAGIC) - trailer_size
+        while remaining:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                raise SnapshotError(f"{path} is truncated")
+            sha.update(block)
+            remaining -= len(block)
+        trailer = f.read(trailer_size)
+    if trailer[:len(CHECKSUM_TAG)] != CHECKSUM_TAG or trailer[len(CHECKSUM_TAG):] != sha.digest():
+        raise SnapshotError(f"{path} does not match its checksum")
+    return sha.hexdigest()
+
+
+def _read_block(f) -> bytes:
+    length = struct.unpack("<I", f.read(4))[0]
+    return f.read(length)
+
+
+def read_snapshot_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{path} is not a vectorstore snapshot")
+        header = json.loads(_read_block(f))
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {header.get('version')}")
+    return header
+
+
+def import_snapshot(path: str, collection_name: Optional[str] = None, replace: bool = False) -> Dict[str, Any]:
+    """
+    Bulk-load a snapshot into a collection, with no embedding API calls.
+
+    The checksum is verified before anything is written. The collection keeps the
+    snapshot's embedding model (a collection pinned to another model is refused),
+    and its lexical and compact indexes are filled along the way.
+
+    Args:
+        collection_name: Target collection (defaults to the one the snapshot was taken from)
+        replace: Import even if the collection already has vectors (records with the same IDs are overwritten)
+
+    Raises:
+        SnapshotError: If the file is invalid or does not fit the collection
+    """
+
+    checksum = verify_snapshot(path)
+    header = read_snapshot_header(path)
+    collection_name = collection_name or header["collection"]
+    model = header.get("embedding_model")
+    pinned = get_pinned_embedding_model(collection_name)
+    if model and pinned and pinned != model:
+        raise SnapshotError(
+            f"Snapshot vectors come from {model} but collection {collection_name} is pinned to {pinned}"
+        )
+
+    vectorstore = open_vectorstore(collection_name, PERSIST_DIR)
+    if not replace and vectorstore._collection.count() > 0:
+        raise SnapshotError(f"Collection {collection_name} is not empty; pass replace to import anyway")
+    if model and not pinned:
+        pin_embedding_model(model, collection_name)
+
+    lexical_index = lexical_index_for(vectorstore)
+    compact_index = compact_index_for(vectorstore)
+    imported = 0
+    with open(path, "rb") as f:
+        f.read(len(SNAPSHOT_MAGIC))
+        _read_block(f)  # Header
+        while True:
+            page = _read_block(f)
+            if not page:
+                break
+            page = zlib.decompress(page)
+            records_length = struct.unpack("<I", page[:4])[0]
+            records = json.loads(page[4:4 + records_length])
+            ids: List[str] = records["ids"]
+            embeddings = np.frombuffer(page[4 + records_length:], dtype="<f4").reshape(len(ids), records["dimension"])
+            for start in range(0, len(ids), COMMIT_BATCH_SIZE):
+                end = start + COMMIT_BATCH_SIZE
+                vectorstore._collection.upsert(
+                    ids=ids[start:end],
+                    embeddings=embeddings[start:end].tolist(),
+                    documents=records["documents"][start:end],
+                    metadatas=records["metadatas"][start:end]
+                )
+            lexical_index.add(ids, records["documents"], records["metadatas"])
+            if compact_index is not None:
+                compact_index.add(ids, embeddings)
+            imported += len(ids)
+
+    notify_commit(collection_name)
+    logger.info(f"Imported {imported} vectors into {collection_name} from {path}")
+    return {"path": path, "collection": collection_name, "embedding_model": model, "records": imported, "sha256": checksum}
+
+
+def import_startup_snapshots() -> List[Dict[str, Any]]:
+    """Import the SNAPSHOT_IMPORT files whose collections are still empty, so a new replica starts warm."""
+    results = []
+    for path in (p.strip() for p in SNAPSHOT_IMPORT.split(",") if p.strip()):
+        try:
+            header = read_snapshot_header(path)
+            if open_vectorstore(header["collection"], PERSIST_DIR)._collection.count() > 0:
+                logger.info(f"Skipping snapshot {path}: {header['collection']} already has vectors")
+                continue
+            results.append(import_snapshot(path))
+        except (OSError, SnapshotError) as e:
+            logger.warning(f"Could not import snapshot {path}: {e}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Export or import a vectorstore snapshot (run from the server directory as python -m modules.snapshots)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write a collection to a snapshot file")
+    export_parser.add_argument("--collection", default=COLLECTION_NAME)
+    export_parser.add_argument("--output", default=None, help=f"Snapshot path (default: under {SNAPSHOT_DIR})")
+    import_parser = commands.add_parser("import", help="Load a snapshot file into a collection")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--collection", default=None, help="Target collection (default: the snapshot's)")
+    import_parser.add_argument("--replace", action="store_true", help="Import into a non-empty collection")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(export_snapshot(args.collection, args.output), indent=2))
+    else:
+        print(json.dumps(import_snapshot(args.path, args.collection, args.replace), indent=2))
@@ -0,0 +1,161 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+try:
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from .load_vectorstore import UploadWriter, StoredUpload
+
+MAX_FORM_FIELD_BYTES = 64 * 1024  # Plain form fields (workspace, tags) are short
+
+
+class UploadFormError(ValueError):
+    """Raised for upload requests that are not valid multipart forms of PDF files."""
+
+
+class _UploadForm:
+    """
+    MultipartParser callbacks writing each file part straight to an UploadWriter and collecting plain fields.
+
+    Completed files stay as .part files until the whole body has been accepted, so a
+    request rejected at a later part leaves nothing behind in UPLOAD_DIR.
+    """
+
+    def __init__(self, boundary: bytes, check_fields: Optional[Callable[[Dict[str, str]], object]] = None):
+        self.check_fields = check_fields
+        self.fields: Dict[str, str] = {}
+        self.completed: List[UploadWriter] = []
+        self.writer: Optional[UploadWriter] = None
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+        self.parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._field_value = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition"))
+        if b"name" not in options:
+            raise UploadFormError("Form part without a name")
+        if b"filename" not in options:
+            self._field_name = options[b"name"].decode("utf-8", "replace")
+            return
+        filename = options[b"filename"].decode("utf-8", "replace")
+        # Checked before any of the file is written
+        if not filename.lower().endswith(".pdf"):
+            raise UploadFormError(f"Invalid file types detected. Only PDF files are allowed: ['{filename}']")
+        if self.check_fields is not None and not self.completed:
+            self.check_fields(self.fields)
+        self.writer = UploadWriter(filename)
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.writer is not None:
+            self.writer.write(data[start:end])
+            return
+        self._field_value += data[start:end]
+        if len(self._field_value) > MAX_FORM_FIELD_BYTES:
+            raise UploadFormError(f"Form field '{self._field_name}' is too long")
+
+    def _on_part_end(self):
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.close()
+            self.completed.append(writer)
+        elif self._field_name is not None:
+            self.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+
+    def publish(self) -> List[StoredUpload]:
+        """Move every completed file to its content-hash path, once the request has been accepted."""
+        stored = []
+        try:
+            for writer in self.completed:
+                stored.append(writer.finish())
+        except BaseException:
+            self.discard()
+            raise
+        return stored
+
+    def discard(self):
+        """Remove every file of a rejected request that has not been published yet."""
+        writers = self.completed + ([self.writer] if self.writer is not None else [])
+        self.completed, self.writer = [], None
+        for writer in writers:
+            writer.discard()
+
+
+async def receive_uploads(request: Request, check_fields: Optional[Callable[[Dict[str, str]], object]] = None
+                          ) -> Tuple[Dict[str, str], List[StoredUpload]]:
+    """
+    Read a multipart upload from the request body as it streams in.
+
+    Each file part is hashed and written to UPLOAD_DIR while it arrives, so
+    MAX_UPLOAD_MB is enforced without receiving the rest of the body, and nothing
+    is spooled to a temporary file first. Parsing and disk writes run in the
+    threadpool, one received chunk at a time. Files are only moved to their
+    content-hash paths once the whole body is accepted; if any part is rejected,
+    the files already received are removed.
+
+    Args:
+        check_fields: Called with the plain fields sent so far when the first file
+            begins, so a bad workspace or tag list is rejected before any file is written,
+            and again with all fields before the files are published
+
+    Returns:
+        The plain form fields and the saved files, in upload order
+
+    Raises:
+        UploadFormError: If the body is not multipart/form-data or a file is not a PDF
+        UploadTooLargeError: As soon as one file exceeds MAX_UPLOAD_BYTES
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadFormError("Expected a multipart/form-data body")
+
+    form = _UploadForm(options[b"boundary"], check_fields)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(form.parser.write, chunk)
+        await run_in_threadpool(form.parser.finalize)
+        if check_fields is not None:
+            check_fields(form.fields)  # Fields sent after the files were not checked yet
+    except MultipartParseError as e:
+        form.discard()
+        raise UploadFormError(f"Malformed multipart body: {e}") from e
+    except BaseException:
+        # Oversized file, client disconnect or disk error: drop every file of the request
+        form.discard()
+        raise
+    if form.writer is not None:
+        form.discard()
+        raise UploadFormError("Upload ended in the middle of a file")
+    return form.fields, await run_in_threadpool(form.publish)
@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, Optional
+from langchain_chroma import Chroma
+from .lexical_index import ensure_lexical_index
+from .compact_vectors import ensure_compact_index
+from .shards import collection_exists, open_vectorstore
+from .load_vectorstore import PERSIST_DIR, COLLECTION_NAME, get_collection_embeddings, add_commit_listener
+
+
+def workspace_exists(collection_name: str, persist_directory: str = PERSIST_DIR) -> bool:
+    """
+    Whether a workspace collection exists. Only ingestion creates collections, so read
+    paths check this first; the default workspace is opened at startup and always counts.
+    """
+    return collection_name == COLLECTION_NAME or collection_exists(collection_name, persist_directory)
+
+
+class SharedVectorStore:
+    """
+    One long-lived Chroma handle (and embedding client) per collection, shared by all requests.
+
+    The handle is opened at startup or on first use and swapped for a fresh one
+    whenever ingestion commits to the collection, so the query path never pays
+    for constructing clients or reopening the store.
+    """
+
+    def __init__(self, collection_name: str = COLLECTION_NAME, persist_directory: str = PERSIST_DIR):
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.version = 0
+        self._vectorstore: Optional[Chroma] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> Chroma:
+        vectorstore = open_vectorstore(
+            self.collection_name,
+            self.persist_directory,
+            embedding_function=get_collection_embeddings(self.collection_name)
+        )
+        ensure_lexical_index(vectorstore)
+        ensure_compact_index(vectorstore)
+        return vectorstore
+
+    def get(self) -> Chroma:
+        """Return the shared vectorstore, opening it if needed."""
+        vectorstore = self._vectorstore
+        if vectorstore is not None:
+            return vectorstore
+        with self._lock:
+            if self._vectorstore is None:
+                self._vectorstore = self._open()
+            return self._vectorstore
+
+    def refresh(self):
+        """Open a new handle and swap it in; requests already holding the old one finish with it."""
+        vectorstore = self._open()
+        with self._lock:
+            self._vectorstore = vectorstore
+            self.version += 1
+
+    def close(self):
+        with self._lock:
+            self._vectorstore = None
+
+
+class VectorStorePool:
+    """
+    One SharedVectorStore per workspace collection, created on first use.
+
+    Query paths go through existing_store(), so only collections that exist get an entry.
+    """
+
+    def __init__(self, persist_directory: str = PERSIST_DIR):
+        self.persist_directory = persist_directory
+        self._stores: Dict[str, SharedVectorStore] = {}
+        self._lock = threading.Lock()
+
+    def store(self, collection_name: str = COLLECTION_NAME) -> SharedVectorStore:
+        with self._lock:
+            if collection_name not in self._stores:
+                self._stores[collection_name] = SharedVectorStore(collection_name, self.persist_directory)
+            return self._stores[collection_name]
+
+    def existing_store(self, collection_name: str) -> Optional[SharedVectorStore]:
+        """Like store(), but None for a collection that does not exist, so unknown workspaces are never created."""
+        with self._lock:
+            store = self._stores.get(collection_name)
+        if store is None and not workspace_exists(collection_name, self.persist_directory):
+            return None
+        return store or self.store(collection_name)
+
+    def get(self, collection_name: str = COLLECTION_NAME) -> Chroma:
+        """Return the shared vectorstore of a collection, opening it if needed."""
+        return self.store(collection_name).get()
+
+    def on_commit(self, collection_name: str):
+        with self._lock:
+            store = self._stores.get(collection_name)
+        if store is not None:
+            store.refresh()
+
+    def close(self):
+        with self._lock:
+            stores = list(self._stores.values())
+        for store in stores:
+            store.close()
+
+
+vectorstore_pool = VectorStorePool()
+add_commit_listener(vectorstore_pool.on_commit)
@@ -0,0 +1,97 @@
+import re
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+DEFAULT_WORKSPACE = "default"
+DEFAULT_COLLECTION = "langchain"  # langchain_chroma's default collection name, used by the default workspace
+WORKSPACE_COLLECTION_PREFIX = "ws-"
+TAG_PREFIX = "tag:"
+
+# Chroma collection names allow 3-63 characters of [a-zA-Z0-9._-], starting and ending alphanumeric.
+# IDs leave room for the "ws-" prefix and the longest shard suffix ("-shard999", see shards.MAX_SHARDS).
+MAX_WORKSPACE_ID_LENGTH = 63 - len(WORKSPACE_COLLECTION_PREFIX) - len("-shard999")
+WORKSPACE_RE = re.compile(rf"^[A-Za-z0-9](?:[A-Za-z0-9_-]{{0,{MAX_WORKSPACE_ID_LENGTH - 2}}}[A-Za-z0-9])?$")
+TAG_RE = re.compile(r"^[\w .-]{1,64}$")
+# Shard collections are named <collection>-shardN, so a workspace named like one would be read as a shard
+SHARD_NAME_RE = re.compile(r"-shard\d+$")
+
+
+class InvalidWorkspaceError(ValueError):
+    """Raised for workspace IDs or tags that cannot be stored."""
+
+
+def collection_for_workspace(workspace: Optional[str]) -> str:
+    """
+    Name of the Chroma collection holding a workspace's documents.
+
+    Each tenant/workspace gets its own collection, so searches never touch another
+    workspace's vectors; the default workspace keeps the original collection.
+
+    Raises:
+        InvalidWorkspaceError: If the workspace ID is not a valid collection name suffix
+    """
+    if not workspace or workspace == DEFAULT_WORKSPACE:
+        return DEFAULT_COLLECTION
+    if not WORKSPACE_RE.match(workspace):
+        raise InvalidWorkspaceError(
+            f"Invalid workspace ID '{workspace}': use 1-{MAX_WORKSPACE_ID_LENGTH} letters, digits, '-' or '_', "
+            "starting and ending with a letter or digit"
+        )
+    if SHARD_NAME_RE.search(workspace):
+        raise InvalidWorkspaceError(f"Invalid workspace ID '{workspace}': IDs ending in '-shard<number>' are reserved for shards")
+    return f"{WORKSPACE_COLLECTION_PREFIX}{workspace}"
+
+
+def parse_tags(tags: Optional[str]) -> Tuple[str, ...]:
+    """Split a comma-separated tag list, dropping blanks and duplicates."""
+    if not tags:
+        return ()
+    parsed = tuple(dict.fromkeys(tag.strip().lower() for tag in tags.split(",") if tag.strip()))
+    invalid = [tag for tag in parsed if not TAG_RE.match(tag)]
+    if invalid:
+        raise InvalidWorkspaceError(f"Invalid tags: {invalid}")
+    return parsed
+
+
+def tag_metadata(tags: Iterable[str]) -> Dict[str, bool]:
+    """Chunk metadata marking its tags; Chroma metadata cannot hold lists, so each tag is its own key."""
+    return {f"{TAG_PREFIX}{tag}": True for tag in tags}
+
+
+def tags_from_metadata(metadata: Dict[str, Any]) -> Tuple[str, ...]:
+    """Tags recorded on a chunk by tag_metadata."""
+    return tuple(sorted(key[len(TAG_PREFIX):] for key, value in metadata.items() if key.startswith(TAG_PREFIX) and value))
+
+
+class DocumentScope(NamedTuple):
+    """Restricts retrieval to documents with one of the given sources or tags (empty means everything)."""
+    sources: Tuple[str, ...] = ()
+    tags: Tuple[str, ...] = ()
+
+    @classmethod
+    def parse(cls, sources: Optional[str] = None, tags: Optional[str] = None) -> "DocumentScope":
+        """Build a scope from comma-separated form fields."""
+        parsed_sources = tuple(dict.fromkeys(s.strip() for s in (sources or "").split(",") if s.strip()))
+        return cls(parsed_sources, parse_tags(tags))
+
+    def is_empty(self) -> bool:
+        return not self.sources and not self.tags
+
+    def key(self) -> str:
+        """Stable text form, for cache keys and logs."""
+        return "|".join(sorted(self.sources)) + "#" + "|".join(sorted(self.tags))
+
+    def chroma_where(self) -> Optional[Dict[str, Any]]:
+        """Chroma metadata filter for the scope, or None when unrestricted."""
+        clauses = []
+        if self.sources:
+            clauses.append({"source": {"$in": list(self.sources)}})
+        clauses.extend({f"{TAG_PREFIX}{tag}": True} for tag in self.tags)
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Whether a chunk's metadata falls inside the scope."""
+        if self.is_empty():
+            return True
+        return metadata.get("source") in self.sources or any(metadata.get(f"{TAG_PREFIX}{tag}") for tag in self.tags)
@@ -8,7 +8,7 @@ import sys
 import os
 sys.path.append('.')
 
-from modules.llm import get_llm_chain, get_available_models
+from modules.llm import chain_registry, get_available_models, SORTED_MODELS_BY_PRIORITY
 from modules.query_handlers import query_chain
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
@@ -62,7 +62,7 @@ def test_llm_chain(vectorstore, models):
     
     for model_id in list(models.keys())[:2]:  # Test first 2 models
         try:
-            chain, actual_model = get_llm_chain(vectorstore, model_name=model_id, temperature=0.1)
+            chain = chain_registry.get_chain(vectorstore, model_id, 0.1)
             if chain:
                 print(f"✅ {model_id}: Chain created successfully")
             else:
@@ -77,7 +77,8 @@ def test_query(vectorstore):
     
     try:
         # Use the top priority model for testing
-        chain, actual_model = get_llm_chain(vectorstore, model_name=None, temperature=0.1)
+        actual_model = SORTED_MODELS_BY_PRIORITY[0][0]
+        chain = chain_registry.get_chain(vectorstore, actual_model, 0.1)
         
         if not chain:
             print("❌ Failed to create chain for query test")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the server's modules the way main.py does, from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
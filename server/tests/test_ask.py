@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import main
+from modules.circuit_breaker import BreakerRegistry
+from modules.lexical_index import HybridRetriever, LexicalIndex
+from modules.llm import SORTED_MODELS_BY_PRIORITY
+
+MODEL = SORTED_MODELS_BY_PRIORITY[0][0]
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    """Fake embeddings that count question embeddings, i.e. embedding API calls."""
+    query_calls: int = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return super().embed_query(text)
+
+    async def aembed_query(self, text):
+        self.query_calls += 1
+        return super().embed_query(text)
+
+
+class FakeAnswerChain:
+    def __init__(self):
+        self.calls = []
+
+    async def ainvoke(self, inputs):
+        self.calls.append(inputs)
+        return {"output_text": f"Answer from {len(inputs['input_documents'])} chunks"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    embedding = CountingEmbedding(size=16)
+    vectorstore = Chroma(collection_name="test", persist_directory=str(tmp_path), embedding_function=embedding)
+    texts = ["The warranty covers two years of parts.", "Returns are accepted within 30 days.", "Shipping takes five days."]
+    ids = [f"chunk{i}" for i in range(len(texts))]
+    vectorstore.add_documents([Document(text, metadata={"source": "policy.pdf"}) for text in texts], ids=ids)
+    lexical_index = LexicalIndex(str(tmp_path / "lexical.sqlite3"))
+    lexical_index.add(ids, texts, [{"source": "policy.pdf"}] * len(texts))
+    embedding.query_calls = 0
+
+    answer_chain = FakeAnswerChain()
+    chain = SimpleNamespace(
+        retriever=HybridRetriever(vectorstore=vectorstore, lexical_index=lexical_index, k=2),
+        combine_documents_chain=answer_chain,
+    )
+    store = SimpleNamespace(version=1, collection_name="test", get=lambda: vectorstore)
+    monkeypatch.setattr(main, "vectorstore_pool", SimpleNamespace(existing_store=lambda collection_name: store))
+    monkeypatch.setattr(main.chain_registry, "get_chain", lambda vectorstore, model_name, temperature: chain)
+    breakers = BreakerRegistry()
+    monkeypatch.setattr("modules.llm.model_breakers", breakers)
+    monkeypatch.setattr("modules.query_handlers.model_breakers", breakers)
+    main.answer_cache.clear()
+
+    test_client = TestClient(main.app)
+    test_client.embedding = embedding
+    test_client.answer_chain = answer_chain
+    test_client.breakers = breakers
+    yield test_client
+    main.answer_cache.clear()
+
+
+def ask(client, question):
+    return client.post("/ask/", data={"question": question, "model_name": MODEL})
+
+
+def test_uncached_question_is_answered(client):
+    response = ask(client, "How long is the warranty?")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["answer"] == "Answer from 2 chunks"
+    assert body["actual_model_used"] == MODEL
+    assert body["cached"] is False
+    assert body["source_documents"] == ["policy.pdf", "policy.pdf"]
+    assert len(client.answer_chain.calls) == 1
+    assert client.breakers.get(MODEL).state == "closed"
+
+
+def test_uncached_question_embeds_once(client):
+    ask(client, "How long is the warranty?")
+    assert client.embedding.query_calls == 1
+
+    # With a cached neighbour the cache lookup embeds the question; retrieval reuses it
+    client.embedding.query_calls = 0
+    response = ask(client, "What is the return window?")
+    assert response.json()["cached"] is False
+    assert client.embedding.query_calls == 1
+
+
+def test_repeated_question_is_served_from_cache(client):
+    ask(client, "How long is the warranty?")
+    client.embedding.query_calls = 0
+
+    response = ask(client, "how long is the warranty")
+
+    assert response.status_code == 200
+    assert response.json()["cached"] is True
+    assert len(client.answer_chain.calls) == 1
+    assert client.embedding.query_calls == 0
+
+
+def test_open_breakers_return_503(client):
+    for name, _ in SORTED_MODELS_BY_PRIORITY:
+        client.breakers.get(name).record_failure(Exception("429 Resource has been exhausted"))
+
+    response = ask(client, "How long is the warranty?")
+
+    assert response.status_code == 503
+    assert client.answer_chain.calls == []
+
+
+def test_fallback_answer_is_served_from_cache(client, monkeypatch):
+    class FailingChain:
+        async def ainvoke(self, inputs):
+            raise RuntimeError("model overloaded")
+
+    working = main.chain_registry.get_chain(None, MODEL, 0.1)
+    failing = SimpleNamespace(retriever=working.retriever, combine_documents_chain=FailingChain())
+    monkeypatch.setattr(
+        main.chain_registry, "get_chain",
+        lambda vectorstore, model_name, temperature: failing if model_name == MODEL else working
+    )
+
+    first = ask(client, "How long is the warranty?").json()
+    second = ask(client, "How long is the warranty?").json()
+
+    assert first["actual_model_used"] != MODEL and first["cached"] is False
+    assert second["cached"] is True
+    assert second["actual_model_used"] == first["actual_model_used"]
+    assert len(client.answer_chain.calls) == 1
@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+
+import pytest
+
+from modules import circuit_breaker
+from modules.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+RATE_LIMIT = Exception("429 Resource has been exhausted")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=clock))
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 30.0)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MAX_COOLDOWN", 600.0)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_FAILURE_THRESHOLD", 3)
+    return clock
+
+
+def retry_in(breaker, clock):
+    return breaker.open_until - clock.now
+
+
+def test_rate_limit_opens_at_once(clock):
+    breaker = CircuitBreaker("model")
+
+    breaker.record_failure(RATE_LIMIT)
+
+    assert breaker.state == OPEN
+    assert retry_in(breaker, clock) == 30.0
+    assert not breaker.allow_request()
+
+
+def test_other_errors_open_after_threshold(clock):
+    breaker = CircuitBreaker("model")
+
+    breaker.record_failure(ValueError("boom"))
+    breaker.record_failure(ValueError("boom"))
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+    breaker.record_failure(ValueError("boom"))
+    assert breaker.state == OPEN
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("model")
+    breaker.record_failure(ValueError("boom"))
+    breaker.record_failure(ValueError("boom"))
+
+    breaker.record_success()
+    breaker.record_failure(ValueError("boom"))
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker("model")
+    breaker.record_failure(RATE_LIMIT)
+
+    clock.now += 30
+    assert breaker.available()
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()
+    assert not breaker.available()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_trial_reopens_with_longer_cooldown(clock):
+    breaker = CircuitBreaker("model")
+    breaker.record_failure(RATE_LIMIT)
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.record_failure(RATE_LIMIT)
+
+    assert breaker.state == OPEN
+    assert retry_in(breaker, clock) == 60.0
+
+
+def test_released_trial_can_be_claimed_again(clock):
+    breaker = CircuitBreaker("model")
+    breaker.record_failure(RATE_LIMIT)
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.release()
+
+    assert breaker.allow_request()
+
+
+def test_concurrent_failures_count_one_trip(clock):
+    breaker = CircuitBreaker("model")
+
+    # Five in-flight requests hit the same rate limit
+    for _ in range(5):
+        breaker.record_failure(RATE_LIMIT)
+
+    assert breaker.trips == 1
+    assert retry_in(breaker, clock) == 30.0
+
+
+def test_open_breaker_extends_only_for_longer_retry_after(clock):
+    breaker = CircuitBreaker("model")
+    breaker.record_failure(RATE_LIMIT)
+
+    breaker.record_failure(Exception("429 quota exceeded, retry after 10s"))
+    assert retry_in(breaker, clock) == 30.0
+
+    breaker.record_failure(Exception("429 quota exceeded, retry after 90s"))
+    assert retry_in(breaker, clock) == 90.0
+    assert breaker.trips == 1
+
+
+def test_api_retry_delay_sets_cooldown(clock):
+    breaker = CircuitBreaker("model")
+
+    breaker.record_failure(Exception("429 quota exceeded, retry after 12s"))
+
+    assert retry_in(breaker, clock) == 12.0
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from modules.compact_vectors import CompactVectorIndex
+
+
+def assert_matches_reload(index):
+    ids, codes, scales = index._arrays()
+    index._ids = None  # Force a reload from SQLite
+    reloaded_ids, reloaded_codes, reloaded_scales = index._arrays()
+
+    order = [ids.index(doc_id) for doc_id in reloaded_ids]
+    assert sorted(ids) == sorted(reloaded_ids)
+    assert (codes[order] == reloaded_codes).all()
+    assert np.allclose(scales[order], reloaded_scales)
+
+
+@pytest.mark.parametrize("mode", ["int8", "float16"])
+def test_loaded_arrays_follow_adds_and_deletes(tmp_path, mode):
+    rng = np.random.default_rng(0)
+    index = CompactVectorIndex(str(tmp_path / "compact.sqlite3"), mode=mode)
+    index.add([f"doc{i}" for i in range(10)], rng.normal(size=(10, 8)))
+    index.search(rng.normal(size=8))  # Load the scan arrays
+
+    index.add(["doc3", "new", "doc3"], rng.normal(size=(3, 8)))
+    index.delete(["doc0", "doc5", "missing"])
+    index.add(["doc0"], rng.normal(size=(1, 8)))
+
+    assert len(index._arrays()[0]) == 10
+    assert_matches_reload(index)
+
+
+def test_add_after_deleting_everything(tmp_path):
+    rng = np.random.default_rng(1)
+    index = CompactVectorIndex(str(tmp_path / "compact.sqlite3"), mode="int8")
+    index.search(rng.normal(size=8))  # Load while empty
+    index.add(["a", "b"], rng.normal(size=(2, 8)))
+    index.delete(["a", "b"])
+    vector = rng.normal(size=8)
+    index.add(["c"], [vector])
+
+    assert [doc_id for doc_id, _ in index.search(vector, k=1)] == ["c"]
+    assert_matches_reload(index)
+
+
+def test_scoped_search_only_returns_allowed_ids(tmp_path):
+    rng = np.random.default_rng(2)
+    index = CompactVectorIndex(str(tmp_path / "compact.sqlite3"), mode="int8")
+    vectors = rng.normal(size=(20, 8))
+    index.add([f"doc{i}" for i in range(20)], vectors)
+    index.delete(["doc4"])
+
+    hits = index.search(vectors[3], k=3, allowed_ids={"doc3", "doc4", "doc7", "missing"})
+
+    assert [doc_id for doc_id, _ in hits][0] == "doc3"
+    assert {doc_id for doc_id, _ in hits} <= {"doc3", "doc7"}
+    assert index.search(vectors[3], k=3, allowed_ids=set()) == []
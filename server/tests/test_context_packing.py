@@ -0,0 +1,25 @@
+from langchain_core.documents import Document
+
+from modules.context_packing import pack_context
+from modules.lexical_index import reciprocal_rank_fusion
+
+
+def test_default_keeps_chunks_found_by_one_retriever():
+    shared = Document("warranty covers two years of parts " * 3, id="shared")
+    vector_only = [Document(f"vector hit {i} about returns and refunds " * 3, id=f"v{i}") for i in range(3)]
+    lexical_only = [Document(f"lexical hit {i} about shipping times " * 3, id=f"l{i}") for i in range(3)]
+    fused = reciprocal_rank_fusion([[shared] + vector_only, [shared] + lexical_only], 5)
+
+    packed, stats = pack_context(fused)
+
+    assert len(packed) == 5
+    assert stats["dropped"]["low_relevance"] == 0
+
+
+def test_relative_score_threshold_when_enabled():
+    docs = [Document(f"chunk {i} " * 10, metadata={"retrieval_score": score}) for i, score in enumerate([1.0, 0.8, 0.3])]
+
+    packed, stats = pack_context(docs, min_relative_score=0.5)
+
+    assert len(packed) == 2
+    assert stats["dropped"]["low_relevance"] == 1
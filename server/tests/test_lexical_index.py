@@ -0,0 +1,23 @@
+from langchain_core.documents import Document
+
+from modules.lexical_index import HybridRetriever, identifier_terms
+
+
+def test_identifier_terms_keep_codes_and_drop_plain_numbers():
+    assert identifier_terms("What does error E-1042 in clause 4.2.1 mean for model AB12?") == ["e-1042", "4.2.1", "ab12"]
+    assert identifier_terms("What are the 3 main risks?") == []
+    assert identifier_terms("Is the 2.5% fee charged in 2024 for the 3rd or 10x order?") == []
+
+
+def test_exact_matches_require_whole_identifiers():
+    retriever = HybridRetriever(vectorstore=None, lexical_index=None, k=5)
+    hits = [
+        (Document("Error E-1042 means the pump is blocked."), 2.0),
+        (Document("Error E-10420 is reserved."), 1.5),
+        (Document("There are 3 risks."), 1.0),
+    ]
+
+    assert [doc.page_content for doc in retriever._exact_matches("What is E-1042?", hits)] == [
+        "Error E-1042 means the pump is blocked."
+    ]
+    assert retriever._exact_matches("What are the 3 main risks?", hits) == []
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+import queue
+
+from modules import metrics
+
+
+def test_timed_stream_counts_only_waits_on_the_stream(monkeypatch):
+    observed = []
+    monkeypatch.setattr(metrics, "observe_stage", lambda stage, seconds: observed.append((stage, seconds)))
+
+    async def tokens():
+        for token in ("a", "b"):
+            await asyncio.sleep(0.05)
+            yield token
+
+    async def slow_client():
+        received = []
+        async for token in metrics.timed_stream(tokens(), "generation"):
+            received.append(token)
+            await asyncio.sleep(0.3)  # The client reading the stream
+        return received
+
+    assert asyncio.run(slow_client()) == ["a", "b"]
+    [(stage, seconds)] = observed
+    assert stage == "generation"
+    assert 0.09 <= seconds < 0.3
+
+
+def test_dropped_log_records_are_exported(monkeypatch):
+    monkeypatch.setattr(metrics.DroppingQueueHandler, "dropped", 7)
+
+    assert "rag_log_records_dropped_total 7" in metrics.render_metrics().splitlines()
+
+
+def test_full_log_queue_counts_dropped_records(monkeypatch):
+    monkeypatch.setattr(metrics.DroppingQueueHandler, "dropped", 0)
+    handler = metrics.DroppingQueueHandler(queue.Queue(maxsize=1))
+    for message in ("kept", "dropped"):
+        handler.handle(logging.LogRecord("ragbot", logging.INFO, __file__, 0, message, None, None))
+
+    assert metrics.DroppingQueueHandler.dropped == 1
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from modules import shards
+from modules.workspaces import MAX_WORKSPACE_ID_LENGTH, InvalidWorkspaceError, collection_for_workspace
+
+
+def test_workspace_ids_cannot_look_like_shards():
+    assert collection_for_workspace("foo-shards") == "ws-foo-shards"
+    assert collection_for_workspace("shard1") == "ws-shard1"
+    with pytest.raises(InvalidWorkspaceError):
+        collection_for_workspace("foo-shard1")
+
+
+def test_fanout_pool_fits_the_shards_searched(monkeypatch):
+    monkeypatch.setattr(shards, "VECTOR_SHARDS", 1)
+    monkeypatch.setattr(shards, "_fanout_pool", None)
+    monkeypatch.setattr(shards, "_fanout_pool_size", 0)
+    shard_count = 6
+    barrier = threading.Barrier(shard_count, timeout=5)
+
+    # Only completes if every shard runs at the same time
+    assert shards._fanout(lambda shard: barrier.wait() >= 0 and shard, list(range(shard_count))) == list(range(shard_count))
+    assert shards._fanout_pool_size == shard_count * 2
+    shards._fanout_pool.shutdown()
+
+
+def test_fanout_survives_a_concurrent_pool_resize(monkeypatch):
+    monkeypatch.setattr(shards, "_fanout_pool", None)
+    monkeypatch.setattr(shards, "_fanout_pool_size", 0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(item):
+        started.set()
+        release.wait(5)
+        return item
+
+    results = []
+    narrow = threading.Thread(target=lambda: results.append(shards._fanout(slow, [1, 2])))
+    narrow.start()
+    started.wait(5)
+    # A wider fan-out replaces the pool the narrow one is running on
+    assert shards._fanout(lambda item: item, list(range(8))) == list(range(8))
+    release.set()
+    narrow.join(5)
+
+    assert results == [[1, 2]]
+    shards._fanout_pool.shutdown()
+
+
+def test_longest_workspace_fits_every_shard_name():
+    workspace = "a" * MAX_WORKSPACE_ID_LENGTH
+    name = shards.shard_collection_name(collection_for_workspace(workspace), shards.MAX_SHARDS - 1)
+
+    assert len(name) == 63
+    with pytest.raises(InvalidWorkspaceError):
+        collection_for_workspace(workspace + "a")
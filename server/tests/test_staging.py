@@ -0,0 +1,28 @@
+import os
+import socket
+
+import chromadb
+
+from modules import load_vectorstore
+
+
+def test_only_orphaned_staging_collections_are_discarded(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    host = socket.gethostname()
+    owners = {
+        "staging-other-worker": f"{host}:{os.getppid()}",
+        "staging-dead-worker": f"{host}:999999999",
+        "staging-other-host": "elsewhere:1",
+        "staging-ours-active": load_vectorstore.STAGING_OWNER,
+        "staging-ours-finished": load_vectorstore.STAGING_OWNER,
+    }
+    for name, owner in owners.items():
+        client.create_collection(name, metadata={"owner": owner})
+    client.create_collection("staging-legacy")
+    client.create_collection("live")
+    monkeypatch.setattr(load_vectorstore, "_active_staging", {"staging-ours-active"})
+
+    load_vectorstore.discard_orphaned_staging(type("Store", (), {"_client": client})())
+
+    remaining = {getattr(collection, "name", collection) for collection in client.list_collections()}
+    assert remaining == {"staging-other-worker", "staging-other-host", "staging-ours-active", "live"}
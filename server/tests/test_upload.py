@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from modules import load_vectorstore
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(load_vectorstore, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(load_vectorstore, "MAX_UPLOAD_BYTES", 1024)
+    submitted = []
+    monkeypatch.setattr(main, "submit_job", lambda job_id, stored_files, **kwargs: submitted.append(stored_files))
+    return tmp_path
+
+
+def upload(files, data=None):
+    return TestClient(main.app).post("/upload_pdfs/", files=[("files", file) for file in files], data=data or {})
+
+
+def test_upload_stores_files_by_hash(upload_dir):
+    response = upload([("a.pdf", b"%PDF-1 first"), ("b.pdf", b"%PDF-1 second")])
+
+    assert response.status_code == 202
+    assert sorted(path.suffix for path in upload_dir.iterdir()) == [".pdf", ".pdf"]
+
+
+@pytest.mark.parametrize("second, status", [
+    (("b.txt", b"not a pdf"), 400),
+    (("b.pdf", b"x" * 2048), 413),
+])
+def test_rejected_later_file_leaves_no_uploads(upload_dir, second, status):
+    response = upload([("a.pdf", b"%PDF-1 first"), second])
+
+    assert response.status_code == status
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_workspace_sent_after_the_files_is_checked_before_storing(upload_dir):
+    body = (
+        b'--xyz\r\nContent-Disposition: form-data; name="files"; filename="a.pdf"\r\n\r\n%PDF-1 first\r\n'
+        b'--xyz\r\nContent-Disposition: form-data; name="workspace"\r\n\r\nbad workspace!\r\n'
+        b'--xyz--\r\n'
+    )
+    response = TestClient(main.app).post("/upload_pdfs/", content=body, headers={"Content-Type": "multipart/form-data; boundary=xyz"})
+
+    assert response.status_code == 400
+    assert list(upload_dir.iterdir()) == []
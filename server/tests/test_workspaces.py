@@ -0,0 +1,43 @@
+import chromadb
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from modules.vectorstore import VectorStorePool, workspace_exists
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "vectorstore_pool", VectorStorePool(str(tmp_path)))
+    monkeypatch.setattr(main, "workspace_exists", lambda collection_name: workspace_exists(collection_name, str(tmp_path)))
+
+    def never_open(collection_name):
+        raise AssertionError(f"opened {collection_name}")
+
+    monkeypatch.setattr(main, "open_metadata_store", never_open)
+    return TestClient(main.app)
+
+
+def collections(path):
+    return [getattr(c, "name", c) for c in chromadb.PersistentClient(path=str(path)).list_collections()]
+
+
+def test_unknown_workspace_is_not_created_by_reads(client, tmp_path):
+    assert client.post("/ask/", data={"question": "Hi?", "workspace": "nosuch"}).status_code == 404
+    assert client.post("/ask/stream", data={"question": "Hi?", "workspace": "nosuch"}).status_code == 404
+    assert client.post("/ask/batch", json={"questions": [{"question": "Hi?"}], "workspace": "nosuch"}).status_code == 404
+    assert client.get("/documents", params={"workspace": "nosuch"}).json() == {"documents": [], "total": 0}
+    assert client.delete("/documents/a.pdf", params={"workspace": "nosuch"}).status_code == 404
+    assert client.post("/documents/a.pdf/reindex", params={"workspace": "nosuch"}).status_code == 404
+    assert client.post("/snapshots", params={"workspace": "nosuch"}).status_code == 404
+
+    assert collections(tmp_path) == []
+    assert main.vectorstore_pool._stores == {}
+
+
+def test_existing_workspace_is_found(tmp_path):
+    chromadb.PersistentClient(path=str(tmp_path)).create_collection("ws-team")
+
+    assert workspace_exists("ws-team", str(tmp_path))
+    assert not workspace_exists("ws-other", str(tmp_path))
+    assert workspace_exists("langchain", str(tmp_path))  # The default workspace always exists